@@ -6,6 +6,8 @@ from flask import Flask
 
 from .config import config
 from .extensions import cors, csrf, db, flask_admin, login_manager, migrate
+from .utils import db_stats, request_metrics
+from .utils.fast_json import FastJSONProvider
 
 
 def create_app(config_name=None):
@@ -14,6 +16,7 @@ def create_app(config_name=None):
         config_name = os.environ.get('FLASK_ENV', 'development')
 
     app = Flask(__name__)
+    app.json = FastJSONProvider(app)
     app.config.from_object(config[config_name])
 
     # Initialize extensions
@@ -21,6 +24,8 @@ def create_app(config_name=None):
     migrate.init_app(app, db)
     login_manager.init_app(app)
     csrf.init_app(app)
+    db_stats.init_app(app)
+    request_metrics.init_app(app)
     if not app.config.get('TESTING'):
         flask_admin.init_app(app)
 
@@ -62,6 +67,36 @@ def create_app(config_name=None):
             traces_sample_rate=0.1,
         )
 
+    # Shared LLM provider registry, caches, password hashing, job pools and metrics
+    from .services import (
+        admission,
+        deferred,
+        generation_queue,
+        identity_cache,
+        llm_scheduler,
+        login_throttle,
+        password_hasher,
+        provider_registry,
+        rate_limiter,
+        response_cache,
+        single_flight,
+        stream_jobs,
+    )
+    from .utils.metrics import exporter as metrics_exporter
+    provider_registry.init_app(app)
+    response_cache.init_app(app)
+    single_flight.init_app(app)
+    llm_scheduler.init_app(app)
+    rate_limiter.init_app(app)
+    identity_cache.init_app(app)
+    password_hasher.init_app(app)
+    login_throttle.init_app(app)
+    stream_jobs.init_app(app)
+    generation_queue.init_app(app)
+    deferred.init_app(app)
+    admission.init_app(app)
+    metrics_exporter.init_app(app)
+
     # Register blueprints
     from .routes import register_blueprints
     register_blueprints(app)
@@ -71,11 +106,9 @@ def create_app(config_name=None):
         from .admin import setup_admin
         setup_admin(flask_admin, db)
 
-    # User loader for Flask-Login
-    from .models import User
-
+    # User loader for Flask-Login (cached per worker, inactive users rejected)
     @login_manager.user_loader
     def load_user(user_id):
-        return db.session.get(User, int(user_id))
+        return identity_cache.load(int(user_id))
 
     return app
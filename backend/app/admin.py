@@ -3,6 +3,7 @@ from flask_admin.contrib.sqla import ModelView
 from flask_login import current_user
 
 from .models import Conversation, Message, User
+from .services import rate_limiter
 
 
 class SecureModelView(ModelView):
@@ -16,11 +17,20 @@ class SecureModelView(ModelView):
         return redirect(url_for('auth.login'))
 
 
+def _format_quota(view, context, model, name):
+    # Usage as seen by this worker (all workers with RATE_LIMIT_BACKEND=sqlite)
+    usage = rate_limiter.usage(model)
+    limit = usage['daily_tokens'] or '∞'
+    return f"{usage['tokens_used']} / {limit}"
+
+
 class UserAdmin(SecureModelView):
     """User admin view."""
-    column_list = ['id', 'username', 'email', 'is_active', 'is_superuser', 'created_at']
+    column_list = ['id', 'username', 'email', 'is_active', 'is_staff', 'is_superuser', 'token_quota', 'created_at']
+    column_labels = {'token_quota': 'Tokens (24h)'}
+    column_formatters = {'token_quota': _format_quota}
     column_searchable_list = ['username', 'email']
-    column_filters = ['is_active', 'is_superuser']
+    column_filters = ['is_active', 'is_staff', 'is_superuser']
     form_excluded_columns = ['password_hash', 'conversations']
 
     def on_model_change(self, form, model, is_created):
@@ -37,8 +37,149 @@ class Config:
     CELERY_RESULT_BACKEND = os.environ.get('CELERY_RESULT_BACKEND', 'redis://localhost:6379/0')
     USE_CELERY = os.environ.get('USE_CELERY', 'False') == 'True'
 
+    # Queued generation: send_message returns 202 and a job id (also per request
+    # with ``Prefer: respond-async``); thread pool size when Celery is off, and
+    # how many jobs may wait for it before new ones get 503
+    ASYNC_GENERATION = os.environ.get('ASYNC_GENERATION', 'False') == 'True'
+    GENERATION_WORKERS = int(os.environ.get('GENERATION_WORKERS', '4'))
+    GENERATION_QUEUE_MAX = int(os.environ.get('GENERATION_QUEUE_MAX', '32'))
+    GENERATION_POLL_INTERVAL = float(os.environ.get('GENERATION_POLL_INTERVAL', '0.25'))  # SSE job watcher
+
+    # LLM provider HTTP pool (shared per worker)
+    LLM_TIMEOUT = float(os.environ.get('LLM_TIMEOUT', '120'))
+    LLM_POOL_MAX_CONNECTIONS = int(os.environ.get('LLM_POOL_MAX_CONNECTIONS', '20'))
+    LLM_POOL_MAX_KEEPALIVE = int(os.environ.get('LLM_POOL_MAX_KEEPALIVE', '10'))
+    LLM_POOL_KEEPALIVE_EXPIRY = float(os.environ.get('LLM_POOL_KEEPALIVE_EXPIRY', '30'))
+    LLM_HTTP2 = os.environ.get('LLM_HTTP2', 'False') == 'True'
+
+    # Provider failover: ordered 'name[:first-token timeout]' list, e.g. 'ollama:8,groq'
+    LLM_PROVIDERS = os.environ.get('LLM_PROVIDERS', '')
+    LLM_PROVIDER_TIMEOUT = float(os.environ.get('LLM_PROVIDER_TIMEOUT', '20'))
+    # Hedge to the next provider past this quantile of first-token times (0 = off)
+    LLM_HEDGE_QUANTILE = float(os.environ.get('LLM_HEDGE_QUANTILE', '0'))
+    LLM_HEDGE_MIN_SAMPLES = int(os.environ.get('LLM_HEDGE_MIN_SAMPLES', '20'))
+    LLM_HEDGE_MIN_DELAY = float(os.environ.get('LLM_HEDGE_MIN_DELAY', '0.5'))
+
+    # Ollama nodes (OLLAMA_HOST may be a comma-separated list): route by least
+    # outstanding requests, keep a conversation on one node unless it is more than
+    # OLLAMA_AFFINITY_SLACK requests busier, eject nodes slower than OLLAMA_PROBE_SLOW
+    OLLAMA_AFFINITY = os.environ.get('OLLAMA_AFFINITY', 'True') == 'True'
+    OLLAMA_AFFINITY_SLACK = int(os.environ.get('OLLAMA_AFFINITY_SLACK', '2'))
+    OLLAMA_PROBE_INTERVAL = float(os.environ.get('OLLAMA_PROBE_INTERVAL', '10'))  # 0 = no probes
+    OLLAMA_PROBE_SLOW = float(os.environ.get('OLLAMA_PROBE_SLOW', '2'))
+    OLLAMA_WARMUP = os.environ.get('OLLAMA_WARMUP', 'True') == 'True'  # load the model when a worker starts
+
+    # Fair-share LLM scheduler: slots per provider per worker ('name:limit' list,
+    # e.g. 'ollama:2,groq:16'; with LLM_PROVIDERS, 'failover' caps whole requests
+    # and each member's cap applies to its attempts); waiting requests are served
+    # staff first, then round-robin per user, and get 429 past these queue limits
+    LLM_SCHEDULER = os.environ.get('LLM_SCHEDULER', 'True') == 'True'
+    LLM_CONCURRENCY = os.environ.get('LLM_CONCURRENCY', '')
+    LLM_CONCURRENCY_DEFAULT = int(os.environ.get('LLM_CONCURRENCY_DEFAULT', '8'))
+    LLM_QUEUE_MAX = int(os.environ.get('LLM_QUEUE_MAX', '64'))
+    LLM_QUEUE_PER_USER = int(os.environ.get('LLM_QUEUE_PER_USER', '2'))
+    LLM_QUEUE_TIMEOUT = float(os.environ.get('LLM_QUEUE_TIMEOUT', '15'))  # seconds
+
+    # Admission control: new message requests get 503 once a worker crosses one
+    # of these (0 = off); /api/health/ready/ reports the same saturation
+    ADMISSION_MAX_INFLIGHT = int(os.environ.get('ADMISSION_MAX_INFLIGHT', '64'))
+    ADMISSION_MAX_STREAMS = int(os.environ.get('ADMISSION_MAX_STREAMS', '32'))
+    ADMISSION_MAX_DB_POOL = float(os.environ.get('ADMISSION_MAX_DB_POOL', '0.9'))  # checked-out share
+    ADMISSION_MAX_LLM_LATENCY = float(os.environ.get('ADMISSION_MAX_LLM_LATENCY', '60'))  # seconds per call
+    ADMISSION_RETRY_AFTER = int(os.environ.get('ADMISSION_RETRY_AFTER', '5'))
+    READINESS_CACHE_TTL = float(os.environ.get('READINESS_CACHE_TTL', '2'))
+
+    # Per-user limits on message requests: a token bucket per user and a rolling
+    # 24 h quota of LLM tokens (0 = unlimited); staff have their own limits.
+    # memory: per worker, sqlite: shared by the workers of a host
+    RATE_LIMIT_ENABLED = os.environ.get('RATE_LIMIT_ENABLED', 'True') == 'True'
+    RATE_LIMIT_BACKEND = os.environ.get('RATE_LIMIT_BACKEND', 'memory')
+    RATE_LIMIT_PATH = os.environ.get('RATE_LIMIT_PATH', str(BASE_DIR / 'rate_limits.sqlite3'))
+    RATE_LIMIT_PER_MINUTE = float(os.environ.get('RATE_LIMIT_PER_MINUTE', '10'))
+    RATE_LIMIT_BURST = int(os.environ.get('RATE_LIMIT_BURST', '5'))
+    RATE_LIMIT_STAFF_PER_MINUTE = float(os.environ.get('RATE_LIMIT_STAFF_PER_MINUTE', '60'))
+    RATE_LIMIT_STAFF_BURST = int(os.environ.get('RATE_LIMIT_STAFF_BURST', '20'))
+    TOKEN_QUOTA_DAILY = int(os.environ.get('TOKEN_QUOTA_DAILY', '200000'))
+    TOKEN_QUOTA_STAFF_DAILY = int(os.environ.get('TOKEN_QUOTA_STAFF_DAILY', '0'))
+
+    # /api/metrics/ (Prometheus text format). With METRICS_DIR set, every gunicorn
+    # worker writes its metrics there and a scrape of any worker sums them all
+    # (gunicorn.conf.py picks a temporary one when it runs several workers);
+    # METRICS_TOKEN, if set, is required as a Bearer token
+    METRICS_DIR = os.environ.get('METRICS_DIR', '')
+    METRICS_FLUSH_INTERVAL = float(os.environ.get('METRICS_FLUSH_INTERVAL', '5'))
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+
+    # LLM generation parameters
+    LLM_TEMPERATURE = float(os.environ.get('LLM_TEMPERATURE', '0.7'))
+    LLM_MAX_TOKENS = int(os.environ.get('LLM_MAX_TOKENS', '500'))
+
+    # SSE chunk coalescing: flush at this many bytes or after this window (0 = per chunk)
+    SSE_COALESCE_BYTES = int(os.environ.get('SSE_COALESCE_BYTES', '512'))
+    SSE_COALESCE_WINDOW = float(os.environ.get('SSE_COALESCE_WINDOW', '0.03'))
+
+    # Resumable SSE generation jobs (memory: per worker, sqlite: shared per host)
+    STREAM_JOBS_BACKEND = os.environ.get('STREAM_JOBS_BACKEND', 'memory')
+    STREAM_JOBS_PATH = os.environ.get('STREAM_JOBS_PATH', str(BASE_DIR / 'stream_jobs.sqlite3'))
+    STREAM_JOB_BUFFER = int(os.environ.get('STREAM_JOB_BUFFER', '256'))  # events kept per job
+    STREAM_JOB_TTL = float(os.environ.get('STREAM_JOB_TTL', '120'))  # finished jobs stay attachable
+    STREAM_KEEPALIVE = float(os.environ.get('STREAM_KEEPALIVE', '15'))
+    # Cancel the upstream generation when no reader has been attached for this long
+    STREAM_CANCEL_GRACE = float(os.environ.get('STREAM_CANCEL_GRACE', '5'))
+
+    # Deferred post-response work (per-worker threads; 0 = inline)
+    DEFERRED_WORKERS = int(os.environ.get('DEFERRED_WORKERS', '2'))
+    DEFERRED_MAX_QUEUE = int(os.environ.get('DEFERRED_MAX_QUEUE', '1000'))
+    DEFERRED_MAX_RETRIES = int(os.environ.get('DEFERRED_MAX_RETRIES', '2'))
+    DEFERRED_RETRY_DELAY = float(os.environ.get('DEFERRED_RETRY_DELAY', '0.5'))  # doubled per retry
+    DEFERRED_DRAIN_TIMEOUT = float(os.environ.get('DEFERRED_DRAIN_TIMEOUT', '10'))  # on worker exit
+
+    # Prompt context: recent turns fill the budget, older ones are summarized
+    CONTEXT_TOKEN_BUDGET = int(os.environ.get('CONTEXT_TOKEN_BUDGET', '3000'))
+    CONTEXT_SUMMARY_MAX_TOKENS = int(os.environ.get('CONTEXT_SUMMARY_MAX_TOKENS', '300'))
+    CONTEXT_MAX_MESSAGES = int(os.environ.get('CONTEXT_MAX_MESSAGES', '50'))
+
+    # LLM response cache (memory, sqlite or none)
+    LLM_CACHE_BACKEND = os.environ.get('LLM_CACHE_BACKEND', 'memory')
+    LLM_CACHE_PATH = os.environ.get('LLM_CACHE_PATH', str(BASE_DIR / 'llm_cache.sqlite3'))
+    LLM_CACHE_TTL = float(os.environ.get('LLM_CACHE_TTL', '3600'))
+    LLM_CACHE_MAX_ENTRIES = int(os.environ.get('LLM_CACHE_MAX_ENTRIES', '1024'))
+    # Sampling above this temperature is not repeatable, so it is never cached.
+    # With the default LLM_TEMPERATURE (0.7) chat replies are therefore NOT
+    # cached: the cache only serves deployments that set LLM_TEMPERATURE=0
+    # (or raise this limit); llm_cache_lookups_total{result="skipped"} counts them
+    LLM_CACHE_MAX_TEMPERATURE = float(os.environ.get('LLM_CACHE_MAX_TEMPERATURE', '0.0'))
+
+    # Share one upstream call between identical concurrent requests (per worker)
+    LLM_SINGLE_FLIGHT = os.environ.get('LLM_SINGLE_FLIGHT', 'True') == 'True'
+
+    # Authenticated user cache for the Flask-Login loader (memory, sqlite or none)
+    IDENTITY_CACHE_BACKEND = os.environ.get('IDENTITY_CACHE_BACKEND', 'memory')
+    IDENTITY_CACHE_PATH = os.environ.get('IDENTITY_CACHE_PATH', str(BASE_DIR / 'identity_cache.sqlite3'))
+    IDENTITY_CACHE_TTL = float(os.environ.get('IDENTITY_CACHE_TTL', '30'))
+    IDENTITY_CACHE_MAX_ENTRIES = int(os.environ.get('IDENTITY_CACHE_MAX_ENTRIES', '10000'))
+
+    # Password hashing (bounded per-worker process pool; 0 workers = inline)
+    PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD', 'pbkdf2:sha256:600000')
+    PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', '2'))
+    PASSWORD_HASH_MAX_PENDING = int(os.environ.get('PASSWORD_HASH_MAX_PENDING', '32'))
+    PASSWORD_HASH_QUEUE_TIMEOUT = float(os.environ.get('PASSWORD_HASH_QUEUE_TIMEOUT', '2'))
+
+    # Failed-login throttling (sliding window, per worker). Every failure counts
+    # per username and per client IP; the IP limit is high enough for a
+    # classroom behind one NAT while bounding the hashing one address can cause
+    LOGIN_THROTTLE_WINDOW = float(os.environ.get('LOGIN_THROTTLE_WINDOW', '300'))
+    LOGIN_THROTTLE_MAX_PER_USER = int(os.environ.get('LOGIN_THROTTLE_MAX_PER_USER', '5'))
+    LOGIN_THROTTLE_MAX_PER_IP = int(os.environ.get('LOGIN_THROTTLE_MAX_PER_IP', '50'))
+
+    # Full-text search (PostgreSQL text search configuration, e.g. 'portuguese');
+    # the migration builds the indexes with it, run reindex-search after changing it
+    SEARCH_LANGUAGE = os.environ.get('SEARCH_LANGUAGE', 'simple')
+
     # Pagination
     PAGE_SIZE = 20
+    MESSAGES_MAX_PAGE_SIZE = 200
+    MESSAGES_STREAM_BATCH = 100  # rows fetched per round trip in NDJSON mode
 
 
 class DevelopmentConfig(Config):
@@ -66,6 +207,9 @@ class TestingConfig(Config):
     TESTING = True
     SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
     WTF_CSRF_ENABLED = False
+    PASSWORD_HASH_METHOD = 'pbkdf2:sha256:1000'
+    PASSWORD_HASH_WORKERS = 0
+    DEFERRED_WORKERS = 0
 
 
 config = {
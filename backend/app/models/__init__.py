@@ -1,9 +1,11 @@
 """SQLAlchemy models."""
 from .conversation import Conversation, Message
+from .generation_job import GenerationJob
 from .user import User
 
 __all__ = [
     'User',
     'Conversation',
     'Message',
+    'GenerationJob',
 ]
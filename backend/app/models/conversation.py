@@ -1,18 +1,33 @@
 """Conversation and Message models."""
 from datetime import datetime
 
+from sqlalchemy import event, func, select, update
+from sqlalchemy.orm import Session
+
 from ..extensions import db
 
+PREVIEW_LENGTH = 120
+
 
 class Conversation(db.Model):
     """Chat conversation/session."""
     __tablename__ = 'conversations'
+    __table_args__ = (
+        db.Index('ix_conversations_user_updated', 'user_id', 'updated_at', 'id'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     title = db.Column(db.String(255), default='')
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    # Rolling summary of turns that no longer fit the context budget
+    summary = db.Column(db.Text, default='')
+    summary_message_id = db.Column(db.Integer, nullable=True)  # last message folded into summary
+    # Denormalized from messages, maintained by the Message mapper events below
+    message_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    last_message_preview = db.Column(db.String(PREVIEW_LENGTH), nullable=False, default='', server_default='')
+    last_message_at = db.Column(db.DateTime, nullable=True)
 
     # Relationships
     messages = db.relationship(
@@ -22,6 +37,12 @@ class Conversation(db.Model):
         cascade='all, delete-orphan',
         order_by='Message.created_at'
     )
+    generation_jobs = db.relationship(
+        'GenerationJob',
+        backref='conversation',
+        lazy='dynamic',
+        cascade='all, delete-orphan'
+    )
 
     def __repr__(self):
         return f'<Conversation {self.id}: {self.title}>'
@@ -30,6 +51,9 @@ class Conversation(db.Model):
 class Message(db.Model):
     """Individual message in a conversation."""
     __tablename__ = 'messages'
+    __table_args__ = (
+        db.Index('ix_messages_conversation_created', 'conversation_id', 'created_at', 'id'),
+    )
 
     ROLE_USER = 'user'
     ROLE_ASSISTANT = 'assistant'
@@ -42,6 +66,8 @@ class Message(db.Model):
     attachments = db.Column(db.JSON, default=list)
     # Schema: [{"filename": str, "file_type": str, "file_path": str, "category": "image"|"document"}]
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # Generation was stopped before the model finished (client left or stop)
+    is_truncated = db.Column(db.Boolean, nullable=False, default=False, server_default=db.false())
 
     # TODO: Add citations relationship when Citation model is created
     # citations = db.relationship(
@@ -54,3 +80,62 @@ class Message(db.Model):
 
     def __repr__(self):
         return f'<Message {self.role}: {self.content[:50]}>'
+
+
+COUNTER_ATTRIBUTES = ['message_count', 'last_message_preview', 'last_message_at']
+
+
+def _touched_conversations(connection):
+    return connection.info.setdefault('touched_conversations', set())
+
+
+@event.listens_for(Message, 'after_insert')
+def _message_inserted(mapper, connection, target):
+    conversations = Conversation.__table__
+    connection.execute(
+        update(conversations)
+        .where(conversations.c.id == target.conversation_id)
+        .values(
+            message_count=conversations.c.message_count + 1,
+            last_message_preview=(target.content or '')[:PREVIEW_LENGTH],
+            last_message_at=target.created_at,
+        )
+    )
+    _touched_conversations(connection).add(target.conversation_id)
+
+
+@event.listens_for(Message, 'after_delete')
+def _message_deleted(mapper, connection, target):
+    conversations = Conversation.__table__
+    messages = Message.__table__
+    latest = (
+        select(messages.c.content, messages.c.created_at)
+        .where(messages.c.conversation_id == target.conversation_id)
+        .order_by(messages.c.created_at.desc(), messages.c.id.desc())
+        .limit(1)
+    ).subquery()
+    connection.execute(
+        update(conversations)
+        .where(conversations.c.id == target.conversation_id)
+        .values(
+            message_count=conversations.c.message_count - 1,
+            last_message_preview=func.coalesce(
+                select(func.substr(latest.c.content, 1, PREVIEW_LENGTH)).scalar_subquery(), ''
+            ),
+            last_message_at=select(latest.c.created_at).scalar_subquery(),
+        )
+    )
+    _touched_conversations(connection).add(target.conversation_id)
+
+
+@event.listens_for(Session, 'after_flush_postexec')
+def _expire_counters(session, flush_context):
+    """Reload counters updated behind the ORM's back on next access."""
+    connection = session.connection()
+    touched = connection.info.pop('touched_conversations', None)
+    if not touched:
+        return
+    for conversation_id in touched:
+        conversation = session.identity_map.get(session.identity_key(Conversation, conversation_id))
+        if conversation is not None:
+            session.expire(conversation, COUNTER_ATTRIBUTES)
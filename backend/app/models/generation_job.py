@@ -0,0 +1,33 @@
+"""Queued LLM generation job model."""
+from datetime import datetime
+
+from ..extensions import db
+
+
+class GenerationJob(db.Model):
+    """Reply generated off the request (thread pool or Celery worker)."""
+    __tablename__ = 'generation_jobs'
+
+    STATUS_QUEUED = 'queued'
+    STATUS_RUNNING = 'running'
+    STATUS_SUCCEEDED = 'succeeded'
+    STATUS_FAILED = 'failed'
+    FINAL_STATUSES = (STATUS_SUCCEEDED, STATUS_FAILED)
+
+    id = db.Column(db.String(32), primary_key=True)  # uuid4 hex, also the Celery task id
+    conversation_id = db.Column(db.Integer, db.ForeignKey('conversations.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    status = db.Column(db.String(10), nullable=False, default=STATUS_QUEUED)
+    message_id = db.Column(db.Integer, db.ForeignKey('messages.id'), nullable=True)  # assistant reply
+    error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    message = db.relationship('Message', foreign_keys=[message_id])
+
+    @property
+    def finished(self):
+        return self.status in self.FINAL_STATUSES
+
+    def __repr__(self):
+        return f'<GenerationJob {self.id}: {self.status}>'
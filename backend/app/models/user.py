@@ -1,6 +1,7 @@
 """User model."""
 from datetime import datetime
 
+from flask import current_app, has_app_context
 from flask_login import UserMixin
 from werkzeug.security import check_password_hash, generate_password_hash
 
@@ -29,8 +30,11 @@ class User(UserMixin, db.Model):
     # documents = db.relationship('Document', backref='user', lazy='dynamic', cascade='all, delete-orphan')
 
     def set_password(self, password):
-        """Hash and set password."""
-        self.password_hash = generate_password_hash(password)
+        """Hash and set password with the configured method."""
+        if has_app_context():
+            self.password_hash = generate_password_hash(password, method=current_app.config['PASSWORD_HASH_METHOD'])
+        else:
+            self.password_hash = generate_password_hash(password)
 
     def check_password(self, password):
         """Check password against hash."""
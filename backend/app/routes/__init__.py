@@ -7,7 +7,11 @@ def register_blueprints(app: Flask):
     from .auth import bp as auth_bp
     from .conversations import bp as conversations_bp
     from .health import bp as health_bp
+    from .jobs import bp as jobs_bp
+    from .metrics import bp as metrics_bp
 
     app.register_blueprint(health_bp)
     app.register_blueprint(auth_bp)
     app.register_blueprint(conversations_bp)
+    app.register_blueprint(jobs_bp)
+    app.register_blueprint(metrics_bp)
@@ -1,13 +1,21 @@
 """Authentication endpoints."""
+import time
+
 from flask import Blueprint, jsonify, request
 from flask_login import current_user, login_required, login_user, logout_user
 
-from ..extensions import csrf
+from ..extensions import csrf, db
 from ..models import User
-from ..schemas import UserSchema
+from ..schemas import user_serializer
+from ..services import PasswordHasherBusy, login_throttle, password_hasher
+from ..utils.metrics import registry
 
 bp = Blueprint('auth', __name__, url_prefix='/api/auth')
 
+login_duration = registry.histogram(
+    'login_duration_seconds', 'Time spent handling POST /api/auth/login/', ['outcome']
+)
+
 
 @bp.route('/login/', methods=['GET', 'POST'])
 @csrf.exempt
@@ -36,28 +44,62 @@ def login():
         description: Missing credentials
       401:
         description: Invalid credentials
+      429:
+        description: Too many failed attempts
+      503:
+        description: Password hashing queue full
     """
     if request.method == 'GET':
         # Return empty response for CSRF token fetch
         return jsonify({'status': 'ready'})
 
+    start = time.perf_counter()
+    response, outcome = _login()
+    login_duration.labels(outcome=outcome).observe(time.perf_counter() - start)
+    return response
+
+
+def _login():
+    """Authenticate the posted credentials; returns (response, outcome)."""
     data = request.get_json() or {}
     username = data.get('username')
     password = data.get('password')
 
     if not username or not password:
-        return jsonify({'error': 'Username and password required'}), 400
+        return (jsonify({'error': 'Username and password required'}), 400), 'invalid_request'
+
+    # Failures are limited per username and per client IP (the last hop,
+    # appended by our proxy, nginx/ALB), known accounts or not
+    client_ip = request.access_route[-1]
+    retry_after = login_throttle.retry_after(username, client_ip)
+    if retry_after:
+        return (
+            jsonify({'error': 'Too many failed attempts'}), 429, {'Retry-After': str(retry_after)}
+        ), 'throttled'
 
     user = User.query.filter_by(username=username).first()
+    try:
+        valid = user is not None and password_hasher.verify(user.password_hash, password)
+    except PasswordHasherBusy:
+        return (jsonify({'error': 'Server busy, try again'}), 503, {'Retry-After': '1'}), 'busy'
+
+    if not valid:
+        login_throttle.record_failure(username, client_ip)
+        return (jsonify({'error': 'Invalid credentials'}), 401), 'failure'
 
-    if user and user.check_password(password):
-        login_user(user)
-        return jsonify({
-            'user': UserSchema().dump(user),
-            'message': 'Login successful'
-        })
+    login_throttle.clear_user(username)
+    if password_hasher.needs_rehash(user.password_hash):
+        try:
+            user.password_hash = password_hasher.hash(password)
+            db.session.commit()
+        except PasswordHasherBusy:
+            pass  # Upgrade on a later login
 
-    return jsonify({'error': 'Invalid credentials'}), 401
+    login_user(user)
+    return jsonify({
+        'user': user_serializer.dump(user),
+        'message': 'Login successful'
+    }), 'success'
 
 
 @bp.route('/logout/', methods=['POST'])
@@ -104,4 +146,4 @@ def current_user_view():
       401:
         description: Not authenticated
     """
-    return jsonify(UserSchema().dump(current_user))
+    return jsonify(user_serializer.dump(current_user))
@@ -1,13 +1,45 @@
 """Conversation API endpoints."""
-import json
-
-from flask import Blueprint, Response, jsonify, request, stream_with_context
+import time
+from contextlib import nullcontext
+
+from flask import (
+    Blueprint,
+    Response,
+    current_app,
+    jsonify,
+    request,
+    stream_with_context,
+    url_for,
+)
 from flask_login import current_user, login_required
 
 from ..extensions import csrf, db
 from ..models import Conversation, Message
-from ..schemas import ConversationDetailSchema, ConversationSchema, MessageSchema
-from ..services import get_llm_provider
+from ..schemas import (
+    conversation_detail_serializer,
+    conversation_serializer,
+    generation_job_serializer,
+    message_serializer,
+)
+from ..services import (
+    JobConflict,
+    RateLimited,
+    SchedulerFull,
+    begin_turn,
+    complete_turn,
+    deferred,
+    generation_queue,
+    get_llm_provider,
+    llm_scheduler,
+    rate_limiter,
+    response_cache,
+    search_conversations,
+    stream_jobs,
+    summarize_turn,
+    track_stream,
+)
+from ..utils.fast_json import dumps
+from ..utils.pagination import InvalidCursor, decode_cursor, encode_cursor
 
 bp = Blueprint('conversations', __name__, url_prefix='/api/conversations')
 
@@ -16,20 +48,56 @@ bp = Blueprint('conversations', __name__, url_prefix='/api/conversations')
 @login_required
 def list_conversations():
     """List user's conversations."""
-    query = Conversation.query.filter_by(user_id=current_user.id)
-
-    # Search filter
-    search = request.args.get('q')
+    try:
+        cursor = decode_cursor(request.args.get('cursor'))
+    except InvalidCursor:
+        return jsonify({'error': 'Invalid cursor'}), 400
+    per_page = current_app.config['PAGE_SIZE']
+
+    # Full-text search: ranked and highlighted; results are ordered by rank,
+    # so the cursor carries the offset of the next page
+    search = request.args.get('q', '').strip()
     if search:
-        query = query.filter(
-            db.or_(
-                Conversation.title.ilike(f'%{search}%'),
-                Conversation.messages.any(Message.content.ilike(f'%{search}%'))
+        offset = max(cursor[1], 0) if cursor else 0
+        hits = search_conversations(current_user.id, search, limit=per_page + 1, offset=offset)
+        next_cursor = encode_cursor(None, offset + per_page) if len(hits) > per_page else None
+        hits = hits[:per_page]
+
+        conversations = {
+            c.id: c for c in Conversation.query.filter(
+                Conversation.id.in_([hit.conversation_id for hit in hits])
             )
-        )
-
-    conversations = query.order_by(Conversation.updated_at.desc()).all()
-    return jsonify({'results': ConversationSchema(many=True).dump(conversations)})
+        }
+        results = []
+        for hit in hits:
+            data = conversation_serializer.dump(conversations[hit.conversation_id])
+            data['snippet'] = hit.snippet
+            data['rank'] = hit.rank
+            results.append(data)
+        return jsonify({'results': results, 'next_cursor': next_cursor})
+
+    # Keyset pagination over (updated_at, id), newest first
+    query = Conversation.query.filter_by(user_id=current_user.id)
+    if cursor:
+        updated_at, last_id = cursor
+        query = query.filter(db.or_(
+            Conversation.updated_at < updated_at,
+            db.and_(Conversation.updated_at == updated_at, Conversation.id < last_id)
+        ))
+    conversations = query.order_by(
+        Conversation.updated_at.desc(), Conversation.id.desc()
+    ).limit(per_page + 1).all()
+
+    next_cursor = None
+    if len(conversations) > per_page:
+        conversations = conversations[:per_page]
+        last = conversations[-1]
+        next_cursor = encode_cursor(last.updated_at, last.id)
+
+    return jsonify({
+        'results': conversation_serializer.dump(conversations, many=True),
+        'next_cursor': next_cursor,
+    })
 
 
 @bp.route('/', methods=['POST'])
@@ -47,7 +115,7 @@ def create_conversation():
     db.session.add(conversation)
     db.session.commit()
 
-    return jsonify(ConversationSchema().dump(conversation)), 201
+    return jsonify(conversation_serializer.dump(conversation)), 201
 
 
 @bp.route('/<int:id>/', methods=['GET'])
@@ -57,7 +125,85 @@ def get_conversation(id):
     conversation = Conversation.query.filter_by(
         id=id, user_id=current_user.id
     ).first_or_404()
-    return jsonify(ConversationDetailSchema().dump(conversation))
+    return jsonify(conversation_detail_serializer.dump(conversation))
+
+
+@bp.route('/<int:id>/messages/', methods=['GET'])
+@login_required
+def list_messages(id):
+    """Page through a conversation's messages, newest first.
+
+    ``before``/``after`` take cursors from a previous page: ``before`` walks
+    back into older history, ``after`` fetches messages newer than a cursor.
+    With ``?format=ndjson`` rows are streamed one JSON object per line
+    instead of being materialized (``limit`` is then optional).
+    """
+    conversation = Conversation.query.filter_by(
+        id=id, user_id=current_user.id
+    ).first_or_404()
+
+    try:
+        before = decode_cursor(request.args.get('before'))
+        after = decode_cursor(request.args.get('after'))
+    except InvalidCursor:
+        return jsonify({'error': 'Invalid cursor'}), 400
+
+    query = Message.query.filter(Message.conversation_id == conversation.id)
+    if before:
+        created_at, last_id = before
+        query = query.filter(db.or_(
+            Message.created_at < created_at,
+            db.and_(Message.created_at == created_at, Message.id < last_id)
+        ))
+    if after:
+        created_at, last_id = after
+        query = query.filter(db.or_(
+            Message.created_at > created_at,
+            db.and_(Message.created_at == created_at, Message.id > last_id)
+        ))
+
+    # 'after' pages are read oldest-first so the page starts next to the cursor
+    forward = bool(after) and not before
+    if forward:
+        query = query.order_by(Message.created_at.asc(), Message.id.asc())
+    else:
+        query = query.order_by(Message.created_at.desc(), Message.id.desc())
+
+    max_limit = current_app.config['MESSAGES_MAX_PAGE_SIZE']
+    limit = request.args.get('limit', type=int)
+
+    if request.args.get('format') == 'ndjson':
+        if limit:
+            query = query.limit(min(limit, max_limit))
+        def generate_ndjson():
+            for msg in query.yield_per(current_app.config['MESSAGES_STREAM_BATCH']):
+                yield dumps(message_serializer.dump(msg)) + '\n'
+
+        return Response(
+            stream_with_context(generate_ndjson()),
+            content_type='application/x-ndjson'
+        )
+
+    limit = min(max(limit or current_app.config['PAGE_SIZE'], 1), max_limit)
+    messages = query.limit(limit + 1).all()
+    has_more = len(messages) > limit
+    messages = messages[:limit]
+    if forward:
+        messages.reverse()
+
+    older_cursor = newer_cursor = None
+    if messages:
+        oldest, newest = messages[-1], messages[0]
+        if has_more or forward:
+            older_cursor = encode_cursor(oldest.created_at, oldest.id)
+        newer_cursor = encode_cursor(newest.created_at, newest.id)
+
+    return jsonify({
+        'results': message_serializer.dump(messages, many=True),
+        'before': older_cursor,
+        'after': newer_cursor,
+        'has_more': has_more,
+    })
 
 
 @bp.route('/<int:id>/', methods=['PATCH'])
@@ -74,7 +220,7 @@ def update_conversation(id):
         conversation.title = data['title']
 
     db.session.commit()
-    return jsonify(ConversationSchema().dump(conversation))
+    return jsonify(conversation_serializer.dump(conversation))
 
 
 @bp.route('/<int:id>/', methods=['DELETE'])
@@ -92,11 +238,48 @@ def delete_conversation(id):
     return '', 204
 
 
+def _respond_async():
+    if current_app.config['ASYNC_GENERATION']:
+        return True
+    prefer = request.headers.get('Prefer', '')
+    return 'respond-async' in [p.strip().lower() for p in prefer.split(',')]
+
+
+def _check_rate_limit():
+    """Take a request from the user's rate limit and quota; returns an error response or None."""
+    try:
+        rate_limiter.check(current_user)
+    except RateLimited as e:
+        message = 'Daily token quota exceeded' if e.reason == 'token_quota' else 'Too many messages, slow down'
+        return jsonify({'error': message, 'reason': e.reason}), 429, {'Retry-After': str(e.retry_after)}
+    return None
+
+
+def _acquire_slot():
+    """Wait for a fair-share LLM slot; returns (ticket, error response)."""
+    try:
+        return llm_scheduler.acquire(current_user.id, llm_scheduler.priority_for(current_user)), None
+    except SchedulerFull as e:
+        # Not the user's rate: give back what _check_rate_limit took
+        rate_limiter.refund(current_user)
+        response = jsonify({'error': 'Too many requests, try again later', 'reason': e.reason})
+        return None, (response, 429, {'Retry-After': str(e.retry_after)})
+
+
 @bp.route('/<int:id>/messages/', methods=['POST'])
 @login_required
 @csrf.exempt
 def send_message(id):
-    """Send a message and get AI response."""
+    """Send a message and get AI response.
+
+    With ``ASYNC_GENERATION`` (or a ``Prefer: respond-async`` header) the reply
+    is generated by the job queue: returns 202 with the user message and the
+    job, to be followed at ``/api/jobs/<job_id>/`` or its ``events/`` stream,
+    or 503 with ``Retry-After`` when the queue is full.
+    Otherwise the request waits for a fair-share LLM slot first and gets 429
+    with ``Retry-After`` when the queue is full. Per-user rate limits and the
+    daily token quota are checked before anything is stored (also 429).
+    """
     conversation = Conversation.query.filter_by(
         id=id, user_id=current_user.id
     ).first_or_404()
@@ -107,67 +290,99 @@ def send_message(id):
     if not user_message_content:
         return jsonify({'error': 'Message content required'}), 400
 
+    limited = _check_rate_limit()
+    if limited:
+        return limited
+
+    respond_async = _respond_async()
+    ticket = None
+    reserved = False
+    if respond_async:
+        if not generation_queue.reserve():
+            rate_limiter.refund(current_user)
+            response = jsonify({'error': 'Generation queue full, try again later'})
+            return response, 503, {'Retry-After': str(current_app.config['ADMISSION_RETRY_AFTER'])}
+        reserved = True
+    else:
+        ticket, busy = _acquire_slot()
+        if busy:
+            return busy
+
     try:
-        # Create user message
-        user_message = Message(
-            conversation=conversation,
-            role='user',
-            content=user_message_content
-        )
-        db.session.add(user_message)
-        db.session.commit()
-
-        # Auto-title conversation if first message
-        if conversation.messages.count() == 1 and not conversation.title:
-            conversation.title = user_message_content[:50]
-            db.session.commit()
-
-        # Get conversation history
-        conversation_history = []
-        previous_messages = conversation.messages.filter(
-            Message.id != user_message.id
-        ).order_by(Message.created_at).limit(10).all()
-
-        for msg in previous_messages:
-            conversation_history.append({
-                'role': msg.role,
-                'content': msg.content
-            })
-
-        # Build messages for LLM
-        system_prompt = "You are ChatGepeto, a helpful AI assistant. Be concise and accurate."
-        messages = [{"role": "system", "content": system_prompt}]
-        messages.extend(conversation_history)
-        messages.append({"role": "user", "content": user_message_content})
-
-        # Generate AI response
-        llm = get_llm_provider()
-        ai_response_content = llm.chat(messages, temperature=0.7, max_tokens=500)
-
-        # Create assistant message
-        assistant_message = Message(
-            conversation=conversation,
-            role='assistant',
-            content=ai_response_content
-        )
-        db.session.add(assistant_message)
-        db.session.commit()
+        # The LLM slot (sync only) is given back on leaving this block,
+        # before the reply is stored
+        with ticket or nullcontext():
+            # Phase 1 (DB): store the user message and read history
+            turn = begin_turn(conversation, user_message_content)
+
+            if respond_async:
+                job = generation_queue.enqueue(turn, current_user.id)
+                reserved = False
+                response = jsonify({
+                    'user_message': turn.user_message,
+                    'job': generation_job_serializer.dump(job)
+                })
+                response.headers['Location'] = url_for('jobs.get_job', id=job.id)
+                if 'respond-async' in request.headers.get('Prefer', ''):
+                    response.headers['Preference-Applied'] = 'respond-async'
+                return response, 202
+
+            # Phase 2 (no DB connection held): generate the reply
+            llm = get_llm_provider()
+            ai_response_content = response_cache.chat(
+                llm,
+                turn.llm_messages,
+                temperature=current_app.config['LLM_TEMPERATURE'],
+                max_tokens=current_app.config['LLM_MAX_TOKENS']
+            )
+
+        # Phase 3 (DB): store the reply; older turns are summarized afterwards
+        assistant_message = complete_turn(turn, ai_response_content)
+        if turn.overflow:
+            deferred.after_response(summarize_turn, turn)
 
         return jsonify({
-            'user_message': MessageSchema().dump(user_message),
-            'assistant_message': MessageSchema().dump(assistant_message)
+            'user_message': turn.user_message,
+            'assistant_message': assistant_message
         }), 201
 
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': f'Failed to process message: {str(e)}'}), 500
+    finally:
+        if reserved:
+            generation_queue.release()
+
+
+def _event_stream(job_id, last_event_id=0):
+    # The generation job runs on its own thread; this response only reads
+    # its buffer, so it needs no request context once started. Closing it
+    # (client gone) lets the job cancel itself once no reader is left.
+    stream_jobs.attach(job_id)
+    response = Response(
+        track_stream('reply', stream_jobs.subscribe(job_id, last_event_id)),
+        content_type='text/event-stream'
+    )
+    response.call_on_close(lambda: stream_jobs.detach(job_id))
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    response.headers['X-Stream-Job'] = job_id
+    return response
 
 
 @bp.route('/<int:id>/messages/stream/', methods=['POST'])
 @login_required
 @csrf.exempt
 def send_message_stream(id):
-    """Send a message and stream the AI response via SSE."""
+    """Send a message and stream the AI response via SSE.
+
+    Events carry ids; a dropped client resumes with ``GET`` on the same URL
+    and ``Last-Event-ID``. Returns 409 with the running ``job_id`` if a reply
+    is already being generated for the conversation, and 429 with
+    ``Retry-After`` when the user is over a rate limit or quota, or no
+    fair-share LLM slot frees up in time.
+    """
+    started_at = time.monotonic()
     conversation = Conversation.query.filter_by(
         id=id, user_id=current_user.id
     ).first_or_404()
@@ -178,72 +393,72 @@ def send_message_stream(id):
     if not user_message_content:
         return jsonify({'error': 'Message content required'}), 400
 
-    def generate_sse():
-        try:
-            # Create user message
-            user_message = Message(
-                conversation=conversation,
-                role='user',
-                content=user_message_content
-            )
-            db.session.add(user_message)
-            db.session.commit()
-
-            # Send user message event
-            user_msg_data = MessageSchema().dump(user_message)
-            yield f"event: user_message\ndata: {json.dumps(user_msg_data)}\n\n"
-
-            # Auto-title if first message
-            if conversation.messages.count() == 1 and not conversation.title:
-                conversation.title = user_message_content[:50]
-                db.session.commit()
-
-            # Get conversation history
-            conversation_history = []
-            previous_messages = conversation.messages.filter(
-                Message.id != user_message.id
-            ).order_by(Message.created_at).limit(10).all()
-
-            for msg in previous_messages:
-                conversation_history.append({
-                    'role': msg.role,
-                    'content': msg.content
-                })
+    try:
+        job_id = stream_jobs.reserve(conversation.id, current_user.id)
+    except JobConflict as e:
+        return jsonify({'error': 'A reply is already being generated', 'job_id': e.job_id}), 409
 
-            # Build messages for LLM
-            system_prompt = "You are ChatGepeto, a helpful AI assistant. Be concise and accurate."
-            messages = [{"role": "system", "content": system_prompt}]
-            messages.extend(conversation_history)
-            messages.append({"role": "user", "content": user_message_content})
+    # After the conflict check, so a duplicate submit does not use up the rate
+    limited = _check_rate_limit()
+    if limited:
+        stream_jobs.fail(job_id, 'Too many requests')
+        return limited
 
-            # Stream response
-            llm = get_llm_provider()
-            full_response = ""
-            for chunk in llm.chat_stream(messages, temperature=0.7, max_tokens=500):
-                full_response += chunk
-                yield f"event: chunk\ndata: {json.dumps({'content': chunk})}\n\n"
-
-            # Create assistant message
-            assistant_message = Message(
-                conversation=conversation,
-                role='assistant',
-                content=full_response
-            )
-            db.session.add(assistant_message)
-            db.session.commit()
+    ticket, busy = _acquire_slot()
+    if busy:
+        stream_jobs.fail(job_id, 'Too many requests')
+        return busy
 
-            # Send final message
-            assistant_msg_data = MessageSchema().dump(assistant_message)
-            yield f"event: assistant_message\ndata: {json.dumps(assistant_msg_data)}\n\n"
-            yield f"event: done\ndata: {json.dumps({'status': 'complete'})}\n\n"
+    try:
+        # Phase 1 (DB): store the user message and read history
+        turn = begin_turn(conversation, user_message_content)
+    except Exception as e:
+        ticket.release()
+        db.session.rollback()
+        stream_jobs.fail(job_id, str(e))
+        return jsonify({'error': f'Failed to process message: {str(e)}'}), 500
 
-        except Exception as e:
-            yield f"event: error\ndata: {json.dumps({'error': str(e)})}\n\n"
+    # Phases 2 and 3 run in the job (which releases the slot), independent of this connection
+    stream_jobs.start(job_id, turn, started_at=started_at, ticket=ticket)
+    return _event_stream(job_id)
 
-    response = Response(
-        stream_with_context(generate_sse()),
-        content_type='text/event-stream'
-    )
-    response.headers['Cache-Control'] = 'no-cache'
-    response.headers['X-Accel-Buffering'] = 'no'
-    return response
+
+@bp.route('/<int:id>/messages/stream/', methods=['GET'])
+@login_required
+def attach_message_stream(id):
+    """Attach to (or resume) the conversation's current reply stream.
+
+    Replays events after ``Last-Event-ID`` (header or ``last_event_id``
+    query parameter); 404 if there is no running or recent job.
+    """
+    conversation = Conversation.query.filter_by(
+        id=id, user_id=current_user.id
+    ).first_or_404()
+
+    job_id = request.args.get('job') or stream_jobs.backend.conversation_job(conversation.id)
+    info = stream_jobs.backend.info(job_id) if job_id else None
+    if info is None or info.conversation_id != conversation.id:
+        return jsonify({'error': 'No active stream'}), 404
+
+    last_event_id = request.headers.get('Last-Event-ID', type=int)
+    if last_event_id is None:
+        last_event_id = request.args.get('last_event_id', 0, type=int)
+    return _event_stream(job_id, last_event_id)
+
+
+@bp.route('/<int:id>/messages/stream/', methods=['DELETE'])
+@login_required
+@csrf.exempt
+def stop_message_stream(id):
+    """Stop the conversation's running reply; the partial text is kept."""
+    conversation = Conversation.query.filter_by(
+        id=id, user_id=current_user.id
+    ).first_or_404()
+
+    job_id = stream_jobs.backend.conversation_job(conversation.id)
+    info = stream_jobs.backend.info(job_id) if job_id else None
+    if info is None or info.done:
+        return jsonify({'error': 'No active stream'}), 404
+
+    stream_jobs.stop(job_id)
+    return jsonify({'job_id': job_id, 'status': 'cancelling'}), 202
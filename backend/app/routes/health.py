@@ -1,12 +1,14 @@
-"""Health check endpoint."""
+"""Health check endpoints."""
 from flask import Blueprint, jsonify
 
+from ..services import admission
+
 bp = Blueprint('health', __name__, url_prefix='/api')
 
 
 @bp.route('/health/', methods=['GET'])
 def health_check():
-    """Health check endpoint.
+    """Liveness: the process is up and serving (no dependency checks).
     ---
     tags:
       - Health
@@ -21,3 +23,19 @@ def health_check():
               example: ok
     """
     return jsonify({'status': 'ok'})
+
+
+@bp.route('/health/ready/', methods=['GET'])
+def readiness_check():
+    """Readiness: 503 while the worker is saturated or the database is down.
+    ---
+    tags:
+      - Health
+    responses:
+      200:
+        description: Worker can take new requests
+      503:
+        description: Worker is saturated; the body lists the crossed thresholds
+    """
+    report = admission.readiness()
+    return jsonify(report), 200 if report['status'] == 'ready' else 503
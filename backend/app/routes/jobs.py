@@ -0,0 +1,80 @@
+"""Queued generation job endpoints."""
+import time
+
+from flask import Blueprint, Response, current_app, jsonify, stream_with_context
+from flask_login import current_user, login_required
+
+from ..extensions import db
+from ..models import GenerationJob
+from ..schemas import generation_job_serializer
+from ..services import StreamEvent, track_stream
+
+bp = Blueprint('jobs', __name__, url_prefix='/api/jobs')
+
+
+def _get_job(id):
+    db.session.expire_all()  # status and reply change under us; never serve them from the identity map
+    job = db.session.get(GenerationJob, id)
+    if job is None or job.user_id != current_user.id:
+        return None
+    return job
+
+
+@bp.route('/<id>/', methods=['GET'])
+@login_required
+def get_job(id):
+    """Poll a queued generation; ``message`` is set once it succeeded."""
+    job = _get_job(id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(generation_job_serializer.dump(job))
+
+
+@bp.route('/<id>/events/', methods=['GET'])
+@login_required
+def job_events(id):
+    """Follow a queued generation via SSE.
+
+    Sends a ``job`` event whenever the status changes and ``done`` after the
+    final one, or ``done`` with status ``deleted`` if the job row disappears
+    (its conversation was deleted). The job row is polled every
+    ``GENERATION_POLL_INTERVAL`` seconds without holding a connection in
+    between.
+    """
+    job = _get_job(id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+
+    interval = current_app.config['GENERATION_POLL_INTERVAL']
+    keepalive = current_app.config['STREAM_KEEPALIVE']
+
+    def generate():
+        event_id = 0
+        status = None
+        last_write = time.monotonic()
+        while True:
+            current = _get_job(id)
+            if current is None:
+                db.session.rollback()
+                yield StreamEvent(event_id + 1, 'done', {'status': 'deleted'}).encode()
+                return
+            data = generation_job_serializer.dump(current)
+            finished = current.finished
+            db.session.rollback()  # end the read transaction, release the connection
+            if data['status'] != status:
+                status = data['status']
+                event_id += 1
+                yield StreamEvent(event_id, 'job', data).encode()
+                last_write = time.monotonic()
+            if finished:
+                yield StreamEvent(event_id + 1, 'done', {'status': status}).encode()
+                return
+            if time.monotonic() - last_write >= keepalive:
+                yield ': keepalive\n\n'
+                last_write = time.monotonic()
+            time.sleep(interval)
+
+    response = Response(stream_with_context(track_stream('job', generate())), content_type='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
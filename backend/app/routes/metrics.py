@@ -0,0 +1,28 @@
+"""Prometheus metrics endpoint."""
+import hmac
+
+from flask import Blueprint, Response, current_app, jsonify, request
+
+from ..utils.metrics import exporter, render
+
+bp = Blueprint('metrics', __name__, url_prefix='/api')
+
+
+@bp.route('/metrics/', methods=['GET'])
+def metrics():
+    """Metrics of every worker in the Prometheus text format.
+    ---
+    tags:
+      - Health
+    responses:
+      200:
+        description: Prometheus exposition (text/plain; version=0.0.4)
+      401:
+        description: METRICS_TOKEN is set and the Bearer token does not match
+    """
+    token = current_app.config['METRICS_TOKEN']
+    if token:
+        supplied = request.headers.get('Authorization', '').removeprefix('Bearer ')
+        if not hmac.compare_digest(supplied.encode(), token.encode()):
+            return jsonify({'error': 'Unauthorized'}), 401
+    return Response(render(exporter.collect()), content_type='text/plain; version=0.0.4; charset=utf-8')
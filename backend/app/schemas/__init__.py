@@ -1,5 +1,15 @@
 """Marshmallow schemas for serialization."""
 from .conversation import ConversationDetailSchema, ConversationSchema
+from .fast import (
+    CompiledSchema,
+    compile_schema,
+    conversation_detail_serializer,
+    conversation_serializer,
+    generation_job_serializer,
+    message_serializer,
+    user_serializer,
+)
+from .generation_job import GenerationJobSchema
 from .message import MessageSchema
 from .user import UserSchema
 
@@ -8,4 +18,12 @@ __all__ = [
     'ConversationSchema',
     'ConversationDetailSchema',
     'MessageSchema',
+    'GenerationJobSchema',
+    'CompiledSchema',
+    'compile_schema',
+    'user_serializer',
+    'conversation_serializer',
+    'conversation_detail_serializer',
+    'message_serializer',
+    'generation_job_serializer',
 ]
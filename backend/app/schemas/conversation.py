@@ -10,12 +10,9 @@ class ConversationSchema(Schema):
     title = fields.Str()
     created_at = fields.DateTime(dump_only=True)
     updated_at = fields.DateTime(dump_only=True)
-    message_count = fields.Method('get_message_count')
-
-    def get_message_count(self, obj):
-        if hasattr(obj, 'messages'):
-            return obj.messages.count() if hasattr(obj.messages, 'count') else len(obj.messages)
-        return 0
+    message_count = fields.Int(dump_only=True)
+    last_message_preview = fields.Str(dump_only=True)
+    last_message_at = fields.DateTime(dump_only=True)
 
 
 class ConversationDetailSchema(ConversationSchema):
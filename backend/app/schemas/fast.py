@@ -0,0 +1,141 @@
+"""Precompiled serializers generated from the marshmallow schemas.
+
+``compile_schema`` reads a schema's dump fields once and generates a plain
+Python function that produces exactly what ``Schema.dump`` would, without
+marshmallow's per-field dispatch. Fields it has no fast path for, schemas
+with dump hooks and mapping inputs fall back to marshmallow itself.
+"""
+from typing import Any, Callable, Dict, Optional
+
+from marshmallow import Schema, fields
+from marshmallow.utils import ensure_text_type, missing
+
+from .conversation import ConversationDetailSchema, ConversationSchema
+from .generation_job import GenerationJobSchema
+from .message import MessageSchema
+from .user import UserSchema
+
+
+class CompiledSchema:
+    """``dump``-compatible wrapper around a generated function."""
+
+    def __init__(self, schema: Schema, func: Callable[[Any], dict], source: str):
+        self.schema = schema
+        self.func = func
+        self.source = source
+
+    def dump(self, obj, many: bool = False):
+        if many:
+            return [self._dump_one(item) for item in obj]
+        return self._dump_one(obj)
+
+    def _dump_one(self, obj):
+        if hasattr(obj, '__getitem__'):
+            # Mappings (and sequences) go through marshmallow's key lookup
+            return self.schema.dump(obj)
+        return self.func(obj)
+
+
+def _field_expression(field: fields.Field, ns: Dict[str, Any], index: int) -> Optional[str]:
+    """Expression serializing ``v`` (not None), or None if unsupported."""
+    if type(field) is fields.Integer and not field.as_string:
+        return 'int(v)'
+    if type(field) is fields.Float and not field.as_string:
+        return 'float(v)'
+    if type(field) in (fields.String, fields.Email, fields.Url):
+        return 'v if type(v) is str else _text(v)'
+    if isinstance(field, fields.Boolean):
+        ns[f'_f{index}'] = field
+        return f'_f{index}._serialize(v, None, None)'
+    if type(field) is fields.DateTime:
+        fmt = field.format or field.DEFAULT_FORMAT
+        format_func = field.SERIALIZATION_FUNCS.get(fmt)
+        if format_func is None:
+            return None
+        ns[f'_fmt{index}'] = format_func
+        return f'_fmt{index}(v)'
+    if type(field) is fields.Dict and field.key_field is None and field.value_field is None:
+        return 'dict(v)'
+    if type(field) is fields.List:
+        inner = _field_expression(field.inner, ns, index)
+        if inner is None:
+            return None
+        return f'[None if v is None else {inner} for v in v]'
+    return None
+
+
+def compile_schema(schema_cls, methods: Optional[Dict[str, Callable[[Any], Any]]] = None) -> CompiledSchema:
+    """Generate a serializer equivalent to ``schema_cls().dump``.
+
+    ``methods`` replaces the callables behind ``fields.Method`` fields, e.g. to
+    dump nested collections with another compiled serializer.
+    """
+    schema = schema_cls()
+    methods = methods or {}
+    if any(schema._hooks.values()):
+        return CompiledSchema(schema, schema.dump, '')
+
+    ns: Dict[str, Any] = {'_missing': missing, '_text': ensure_text_type, '_getattr': getattr}
+    lines = ['def dump(obj):', '    out = {}']
+    for index, (name, field) in enumerate(schema.dump_fields.items()):
+        key = field.data_key if field.data_key is not None else name
+        attribute = field.attribute or name
+
+        if isinstance(field, fields.Method):
+            ns[f'_m{index}'] = methods.get(name) or getattr(schema, field.serialize_method_name)
+            lines += [
+                f'    v = _m{index}(obj)',
+                '    if v is not _missing:',
+                f'        out[{key!r}] = v',
+            ]
+            continue
+
+        expression = _field_expression(field, ns, index)
+        if expression is None or '.' in attribute or callable(field.dump_default):
+            # Let marshmallow handle it, field by field
+            ns[f'_f{index}'] = field
+            ns['_accessor'] = schema.get_attribute
+            lines += [
+                f'    v = _f{index}.serialize({name!r}, obj, accessor=_accessor)',
+                '    if v is not _missing:',
+                f'        out[{key!r}] = v',
+            ]
+            continue
+
+        lines.append(f'    v = _getattr(obj, {attribute!r}, _missing)')
+        if field.dump_default is missing:
+            lines += [
+                '    if v is not _missing:',
+                f'        out[{key!r}] = None if v is None else {expression}',
+            ]
+        else:
+            ns[f'_default{index}'] = field.dump_default
+            lines += [
+                '    if v is _missing:',
+                f'        v = _default{index}',
+                f'    out[{key!r}] = None if v is None else {expression}',
+            ]
+    lines.append('    return out')
+
+    source = '\n'.join(lines)
+    exec(compile(source, f'<compiled {schema_cls.__name__}>', 'exec'), ns)
+    return CompiledSchema(schema, ns['dump'], source)
+
+
+def _detail_messages(obj):
+    # Same as ConversationDetailSchema.get_messages with the compiled schema
+    if hasattr(obj, 'messages'):
+        messages = obj.messages.all() if hasattr(obj.messages, 'all') else obj.messages
+        return message_serializer.dump(messages, many=True)
+    return []
+
+
+def _job_message(obj):
+    return message_serializer.dump(obj.message) if obj.message is not None else None
+
+
+user_serializer = compile_schema(UserSchema)
+message_serializer = compile_schema(MessageSchema)
+conversation_serializer = compile_schema(ConversationSchema)
+conversation_detail_serializer = compile_schema(ConversationDetailSchema, methods={'messages': _detail_messages})
+generation_job_serializer = compile_schema(GenerationJobSchema, methods={'message': _job_message})
@@ -0,0 +1,18 @@
+"""Generation job schema."""
+from marshmallow import Schema, fields
+
+from .message import MessageSchema
+
+
+class GenerationJobSchema(Schema):
+    """Queued generation status; ``message`` is the reply once it succeeded."""
+    id = fields.Str(dump_only=True)
+    conversation_id = fields.Int(dump_only=True)
+    status = fields.Str(dump_only=True)
+    error = fields.Str(dump_only=True, allow_none=True)
+    created_at = fields.DateTime(dump_only=True)
+    updated_at = fields.DateTime(dump_only=True)
+    message = fields.Method('get_message')
+
+    def get_message(self, obj):
+        return MessageSchema().dump(obj.message) if obj.message is not None else None
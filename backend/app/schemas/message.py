@@ -9,3 +9,4 @@ class MessageSchema(Schema):
     content = fields.Str(required=True)
     attachments = fields.List(fields.Dict(), dump_default=[])
     created_at = fields.DateTime(dump_only=True)
+    is_truncated = fields.Bool(dump_only=True)
@@ -1,9 +1,138 @@
 """Business logic services."""
-from .llm_providers import GroqProvider, LLMProvider, OllamaProvider, get_llm_provider
+from .admission import AdmissionControl, admission
+from .context_builder import (
+    SYSTEM_PROMPT,
+    ContextBuilder,
+    PromptContext,
+    estimate_tokens,
+)
+from .deferred import DeferredExecutor, deferred
+from .failover import FailoverProvider, ProvidersExhausted, ProviderSlot
+from .generation_queue import GenerationQueue, generation_queue, run_generation
+from .identity_cache import IdentityCache, identity_cache
+from .llm_providers import (
+    CancelToken,
+    GroqProvider,
+    LLMProvider,
+    OllamaProvider,
+)
+from .messages import (
+    Turn,
+    begin_turn,
+    complete_turn,
+    save_summary,
+    summarize_overflow,
+    summarize_turn,
+)
+from .ollama_pool import OllamaNode, OllamaPool
+from .passwords import (
+    LoginThrottle,
+    PasswordHasher,
+    PasswordHasherBusy,
+    login_throttle,
+    password_hasher,
+)
+from .provider_registry import ProviderRegistry, get_llm_provider, provider_registry
+from .rate_limits import (
+    MemoryRateLimitBackend,
+    RateLimited,
+    RateLimiter,
+    SQLiteRateLimitBackend,
+    rate_limiter,
+)
+from .response_cache import (
+    MemoryCacheBackend,
+    ResponseCache,
+    SQLiteCacheBackend,
+    make_cache_key,
+    response_cache,
+)
+from .scheduler import FairScheduler, SchedulerFull, llm_scheduler
+from .search import (
+    PostgresSearchBackend,
+    SearchBackend,
+    SearchHit,
+    SQLiteSearchBackend,
+    get_search_backend,
+    rebuild_search_index,
+    search_conversations,
+)
+from .single_flight import SingleFlight, single_flight
+from .stream_jobs import (
+    JobConflict,
+    MemoryStreamBackend,
+    SQLiteStreamBackend,
+    StreamEvent,
+    StreamJobs,
+    stream_jobs,
+)
+from .streaming import ChunkCoalescer, track_stream
 
 __all__ = [
     'LLMProvider',
+    'CancelToken',
     'GroqProvider',
     'OllamaProvider',
+    'OllamaPool',
+    'OllamaNode',
+    'FailoverProvider',
+    'ProviderSlot',
+    'ProvidersExhausted',
+    'ProviderRegistry',
+    'provider_registry',
     'get_llm_provider',
+    'ResponseCache',
+    'MemoryCacheBackend',
+    'SQLiteCacheBackend',
+    'make_cache_key',
+    'response_cache',
+    'SingleFlight',
+    'single_flight',
+    'FairScheduler',
+    'SchedulerFull',
+    'llm_scheduler',
+    'AdmissionControl',
+    'admission',
+    'RateLimiter',
+    'RateLimited',
+    'MemoryRateLimitBackend',
+    'SQLiteRateLimitBackend',
+    'rate_limiter',
+    'PasswordHasher',
+    'PasswordHasherBusy',
+    'password_hasher',
+    'LoginThrottle',
+    'login_throttle',
+    'IdentityCache',
+    'identity_cache',
+    'ContextBuilder',
+    'PromptContext',
+    'SYSTEM_PROMPT',
+    'estimate_tokens',
+    'ChunkCoalescer',
+    'track_stream',
+    'StreamJobs',
+    'StreamEvent',
+    'JobConflict',
+    'MemoryStreamBackend',
+    'SQLiteStreamBackend',
+    'stream_jobs',
+    'DeferredExecutor',
+    'deferred',
+    'GenerationQueue',
+    'generation_queue',
+    'run_generation',
+    'Turn',
+    'begin_turn',
+    'complete_turn',
+    'summarize_overflow',
+    'summarize_turn',
+    'save_summary',
+    'SearchBackend',
+    'SearchHit',
+    'SQLiteSearchBackend',
+    'PostgresSearchBackend',
+    'get_search_backend',
+    'rebuild_search_index',
+    'search_conversations',
 ]
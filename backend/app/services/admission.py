@@ -0,0 +1,159 @@
+"""Worker saturation: readiness reporting and load shedding.
+
+Tracks the requests in flight in this worker and reads the other load
+signals it already has: running stream jobs, the database connection pool
+and how long LLM calls hold a scheduler slot (the recent average, or the
+mean age of the calls still running if that is higher, so hanging calls
+count before they finish). When one of them
+crosses its ``ADMISSION_*`` threshold, new message requests are refused
+with ``503`` and the readiness endpoint reports the worker as saturated,
+so the load balancer sends traffic elsewhere. Liveness
+(``/api/health/``) does not look at any of this.
+"""
+import logging
+import threading
+import time
+from typing import List, Optional
+
+from flask import g, jsonify, request
+from sqlalchemy import text
+
+from ..extensions import db
+from ..utils.metrics import registry
+from .scheduler import llm_scheduler
+from .stream_jobs import stream_jobs
+
+logger = logging.getLogger(__name__)
+
+# Endpoints that start an LLM generation and are shed under load
+SHED_ENDPOINTS = frozenset({
+    'conversations.send_message',
+    'conversations.send_message_stream',
+})
+
+inflight_requests = registry.gauge('http_requests_inflight', 'Requests being handled by this worker')
+shed_requests = registry.counter('admission_shed_total', 'Requests refused with 503 by reason', ['reason'])
+
+
+class AdmissionControl:
+    """Per-worker load signals, a cached readiness report and 503 shedding."""
+
+    def __init__(self):
+        self.max_inflight = 64
+        self.max_streams = 32
+        self.max_db_pool = 0.9
+        self.max_llm_latency = 60.0
+        self.retry_after = 5
+        self.cache_ttl = 2.0
+        self._inflight = 0
+        self._lock = threading.Lock()
+        self._report: Optional[dict] = None
+        self._report_at = 0.0
+
+    def init_app(self, app):
+        self.max_inflight = app.config['ADMISSION_MAX_INFLIGHT']
+        self.max_streams = app.config['ADMISSION_MAX_STREAMS']
+        self.max_db_pool = app.config['ADMISSION_MAX_DB_POOL']
+        self.max_llm_latency = app.config['ADMISSION_MAX_LLM_LATENCY']
+        self.retry_after = app.config['ADMISSION_RETRY_AFTER']
+        self.cache_ttl = app.config['READINESS_CACHE_TTL']
+        self._report = None
+        app.before_request(self._before_request)
+        app.teardown_request(self._teardown_request)
+        app.extensions['admission'] = self
+
+    @property
+    def inflight(self) -> int:
+        return self._inflight
+
+    def _before_request(self):
+        with self._lock:
+            self._inflight += 1
+        g._admission_counted = True
+        inflight_requests.inc()
+        if request.endpoint in SHED_ENDPOINTS:
+            reasons = self.saturation()
+            if reasons:
+                for reason in reasons:
+                    shed_requests.labels(reason=reason).inc()
+                response = jsonify({'error': 'Server overloaded, try again later', 'reasons': reasons})
+                return response, 503, {'Retry-After': str(self.retry_after)}
+
+    def _teardown_request(self, exc=None):
+        if g.pop('_admission_counted', False):
+            with self._lock:
+                self._inflight -= 1
+            inflight_requests.dec()
+
+    @staticmethod
+    def db_pool() -> dict:
+        """Checked-out connections of the engine's pool (size is None if unbounded)."""
+        pool = db.engine.pool
+        if not callable(getattr(pool, 'checkedout', None)) or not callable(getattr(pool, 'size', None)):
+            return {'size': None, 'checked_out': None, 'utilization': 0.0}
+        capacity = pool.size() + max(getattr(pool, '_max_overflow', 0), 0)
+        checked_out = pool.checkedout()
+        return {
+            'size': capacity,
+            'checked_out': checked_out,
+            'utilization': round(checked_out / capacity, 3) if capacity else 0.0,
+        }
+
+    def llm_latency(self) -> float:
+        """Slowest LLM call time across providers, in seconds, counting running calls."""
+        return max(
+            (max(lane['avg_hold'], lane['inflight_hold']) for lane in llm_scheduler.stats().values()),
+            default=0.0
+        )
+
+    def saturation(self, pool: Optional[dict] = None, latency: Optional[float] = None) -> List[str]:
+        """Names of the thresholds currently crossed (each 0 disables it)."""
+        pool = pool if pool is not None else self.db_pool()
+        latency = latency if latency is not None else self.llm_latency()
+        reasons = []
+        # The request asking counts itself
+        if self.max_inflight and self._inflight > self.max_inflight:
+            reasons.append('inflight')
+        if self.max_streams and stream_jobs.running() >= self.max_streams:
+            reasons.append('streams')
+        if self.max_db_pool and pool['utilization'] >= self.max_db_pool:
+            reasons.append('db_pool')
+        if self.max_llm_latency and latency >= self.max_llm_latency:
+            reasons.append('llm_latency')
+        return reasons
+
+    def readiness(self) -> dict:
+        """Saturation report, recomputed at most every ``READINESS_CACHE_TTL`` seconds."""
+        now = time.monotonic()
+        report = self._report
+        if report is not None and now - self._report_at < self.cache_ttl:
+            return report
+
+        # Pool usage is read before the ping checks out a connection itself
+        pool = self.db_pool()
+        try:
+            db.session.execute(text('SELECT 1'))
+            database = True
+        except Exception as e:
+            logger.warning("Readiness database check failed: %s", e)
+            db.session.rollback()
+            database = False
+
+        latency = self.llm_latency()
+        reasons = self.saturation(pool, latency)
+        if not database:
+            reasons.append('database')
+        report = {
+            'status': 'saturated' if reasons else 'ready',
+            'reasons': reasons,
+            'inflight': self._inflight,
+            'streams': stream_jobs.running(),
+            'db_pool': pool,
+            'llm': llm_scheduler.stats(),
+            'llm_latency': round(latency, 3),
+        }
+        self._report, self._report_at = report, now
+        return report
+
+
+admission = AdmissionControl()
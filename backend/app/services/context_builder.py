@@ -0,0 +1,148 @@
+"""Token-budgeted prompt construction with rolling conversation summaries."""
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+from ..models import Conversation, Message
+from .llm_providers import LLMProvider
+
+SYSTEM_PROMPT = "You are ChatGepeto, a helpful AI assistant. Be concise and accurate."
+
+SUMMARY_PROMPT = (
+    "You maintain a running summary of a tutoring conversation. Merge the new "
+    "turns into the existing summary. Keep facts, definitions, the student's "
+    "goals and open questions; drop greetings and repetition. Reply with the "
+    "updated summary only."
+)
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (~4 characters per token), tokenizer-free."""
+    return len(text) // 4 + 1
+
+
+@dataclass
+class PromptContext:
+    """Prompt for one turn plus the turns that did not fit the budget."""
+    messages: List[dict]
+    summary: str = ''
+    overflow: List[dict] = field(default_factory=list)
+    overflow_last_id: Optional[int] = None
+
+
+class ContextBuilder:
+    """Fills a token budget with the most recent turns of a conversation.
+
+    Turns that fall outside the budget are folded into ``Conversation.summary``
+    (see ``summarize``) and never read again, so each request loads at most
+    ``max_messages`` rows regardless of conversation length. Folding always
+    continues from ``Conversation.summary_message_id``: when more unsummarized
+    rows exist than the window holds, the oldest of them are folded first
+    (``max_messages`` per turn) so none are skipped.
+    """
+
+    def __init__(
+        self,
+        token_budget: int = 3000,
+        summary_max_tokens: int = 300,
+        max_messages: int = 50,
+        system_prompt: str = SYSTEM_PROMPT
+    ):
+        self.token_budget = token_budget
+        self.summary_max_tokens = summary_max_tokens
+        self.max_messages = max_messages
+        self.system_prompt = system_prompt
+
+    @classmethod
+    def from_config(cls, config) -> 'ContextBuilder':
+        return cls(
+            token_budget=config['CONTEXT_TOKEN_BUDGET'],
+            summary_max_tokens=config['CONTEXT_SUMMARY_MAX_TOKENS'],
+            max_messages=config['CONTEXT_MAX_MESSAGES'],
+        )
+
+    def recent_messages(self, conversation: Conversation, exclude_id: Optional[int]) -> List[Message]:
+        """Newest-first messages not yet folded into the summary."""
+        query = conversation.messages.order_by(None)
+        if conversation.summary_message_id:
+            query = query.filter(Message.id > conversation.summary_message_id)
+        if exclude_id is not None:
+            query = query.filter(Message.id != exclude_id)
+        return query.order_by(
+            Message.created_at.desc(), Message.id.desc()
+        ).limit(self.max_messages).all()
+
+    def oldest_unsummarized(self, conversation: Conversation, before_id: int) -> List[Message]:
+        """Oldest-first messages after the summary and before ``before_id``."""
+        query = conversation.messages.order_by(None).filter(Message.id < before_id)
+        if conversation.summary_message_id:
+            query = query.filter(Message.id > conversation.summary_message_id)
+        return query.order_by(
+            Message.created_at, Message.id
+        ).limit(self.max_messages).all()
+
+    def build(
+        self,
+        conversation: Conversation,
+        user_content: str,
+        exclude_id: Optional[int] = None
+    ) -> PromptContext:
+        """Return the LLM message list for the next turn.
+
+        Turns that overflow the budget are returned as plain dicts so they can
+        be summarized later without holding a database session.
+        """
+        summary = conversation.summary or ''
+        remaining = (
+            self.token_budget
+            - estimate_tokens(self.system_prompt)
+            - estimate_tokens(summary)
+            - estimate_tokens(user_content)
+        )
+
+        history = []
+        overflow = []
+        recent = self.recent_messages(conversation, exclude_id)
+        for msg in recent:
+            cost = estimate_tokens(msg.content)
+            if overflow or cost > remaining:
+                overflow.append(msg)
+                continue
+            remaining -= cost
+            history.append(msg)
+        overflow.reverse()
+
+        if len(recent) == self.max_messages:
+            # A full window may hide older unsummarized rows; fold those first
+            # so the summary moves forward without gaps
+            older = self.oldest_unsummarized(conversation, recent[-1].id)
+            if older:
+                overflow = older
+
+        messages = [{"role": "system", "content": self.system_prompt}]
+        if summary:
+            messages.append({
+                "role": "system",
+                "content": f"Summary of the earlier conversation:\n{summary}"
+            })
+        messages.extend({'role': msg.role, 'content': msg.content} for msg in reversed(history))
+        messages.append({"role": "user", "content": user_content})
+
+        return PromptContext(
+            messages=messages,
+            summary=summary,
+            overflow=[{'role': msg.role, 'content': msg.content} for msg in overflow],
+            overflow_last_id=overflow[-1].id if overflow else None,
+        )
+
+    def summarize(self, previous: str, turns: List[dict], llm: LLMProvider) -> str:
+        """Merge ``turns`` (oldest first) into ``previous``; provider errors propagate."""
+        transcript = "\n".join(f"{msg['role']}: {msg['content']}" for msg in turns)
+        summary = llm.chat(
+            [
+                {"role": "system", "content": SUMMARY_PROMPT},
+                {"role": "user", "content": f"Summary so far:\n{previous or '(empty)'}\n\nNew turns:\n{transcript}"},
+            ],
+            temperature=0.0,
+            max_tokens=self.summary_max_tokens,
+        )
+        return summary.strip()[:self.summary_max_tokens * 4]
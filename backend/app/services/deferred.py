@@ -0,0 +1,202 @@
+"""Deferred (post-response) work on a bounded per-worker thread pool.
+
+Routes call ``deferred.after_response(fn, ...)`` for work the client does not
+need to wait for; it is submitted when the request ends without an error.
+Each task runs in its own app context (and so its own DB session), is
+retried with backoff when it raises, and is drained on worker shutdown.
+Tasks must take plain data, not ORM objects bound to the request session.
+"""
+import logging
+import queue
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from flask import g
+
+from ..utils.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+deferred_depth = registry.gauge('deferred_queue_depth', 'Deferred tasks waiting for a thread')
+deferred_wait = registry.histogram(
+    'deferred_task_wait_seconds', 'Time a deferred task spent queued', ['task']
+)
+deferred_duration = registry.histogram(
+    'deferred_task_duration_seconds', 'Run time of deferred tasks, retries included', ['task']
+)
+deferred_tasks = registry.counter('deferred_tasks_total', 'Deferred tasks by outcome', ['task', 'outcome'])
+
+
+@dataclass
+class DeferredTask:
+    func: Callable
+    args: Tuple = ()
+    kwargs: Dict[str, Any] = field(default_factory=dict)
+    queued_at: float = field(default_factory=time.monotonic)
+
+    @property
+    def name(self) -> str:
+        return getattr(self.func, '__qualname__', repr(self.func))
+
+
+_STOP = object()
+
+
+class DeferredExecutor:
+    """Bounded queue drained by ``DEFERRED_WORKERS`` daemon threads.
+
+    When ``DEFERRED_MAX_QUEUE`` tasks are already waiting, new ones are
+    dropped (and counted): deferred work is by definition not essential to
+    the response. ``DEFERRED_WORKERS = 0`` runs tasks inline at submit time
+    (tests, one-off scripts).
+    """
+
+    def __init__(self):
+        self.app = None
+        self.workers = 0
+        self.max_retries = 0
+        self.retry_delay = 0.0
+        self.drain_timeout = 0.0
+        self._queue: Optional[queue.Queue] = None
+        self._threads: List[threading.Thread] = []
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def init_app(self, app):
+        self.close()
+        self.app = app
+        self.workers = app.config['DEFERRED_WORKERS']
+        self.max_retries = app.config['DEFERRED_MAX_RETRIES']
+        self.retry_delay = app.config['DEFERRED_RETRY_DELAY']
+        self.drain_timeout = app.config['DEFERRED_DRAIN_TIMEOUT']
+        self._queue = queue.Queue(maxsize=app.config['DEFERRED_MAX_QUEUE'])
+        self._threads = []
+        self._closed = False
+        app.teardown_request(self._submit_pending)
+        app.extensions['deferred'] = self
+
+    def after_response(self, func: Callable, *args, **kwargs):
+        """Run ``func(*args, **kwargs)`` once the current request has finished."""
+        pending = g.setdefault('_deferred_tasks', [])
+        pending.append(DeferredTask(func, args, kwargs))
+
+    def submit(self, func: Callable, *args, **kwargs) -> bool:
+        """Queue ``func(*args, **kwargs)`` now; False if it was dropped."""
+        return self._put(DeferredTask(func, args, kwargs))
+
+    def _submit_pending(self, exc):
+        pending = g.pop('_deferred_tasks', [])
+        if exc is not None:
+            return
+        for task in pending:
+            self._put(task)
+
+    def _put(self, task: DeferredTask) -> bool:
+        if self._closed or self._queue is None:
+            deferred_tasks.labels(task=task.name, outcome='rejected').inc()
+            logger.warning("Deferred task %s dropped: executor closed", task.name)
+            return False
+        if self.workers <= 0:
+            self._run(task)
+            return True
+        try:
+            self._queue.put_nowait(task)
+        except queue.Full:
+            deferred_tasks.labels(task=task.name, outcome='rejected').inc()
+            logger.warning("Deferred task %s dropped: queue full", task.name)
+            return False
+        deferred_depth.set(self._queue.qsize())
+        self._ensure_threads()
+        return True
+
+    def _ensure_threads(self):
+        # Started lazily so forked workers (gunicorn preload) own their threads
+        with self._lock:
+            self._threads = [t for t in self._threads if t.is_alive()]
+            for i in range(len(self._threads), self.workers):
+                thread = threading.Thread(target=self._worker, name=f'deferred-{i}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def _worker(self):
+        while True:
+            task = self._queue.get()
+            deferred_depth.set(self._queue.qsize())
+            try:
+                if task is _STOP:
+                    return
+                self._run(task)
+            finally:
+                self._queue.task_done()
+
+    def _run(self, task: DeferredTask):
+        name = task.name
+        deferred_wait.labels(task=name).observe(time.monotonic() - task.queued_at)
+        start = time.monotonic()
+        outcome = 'failed'
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                time.sleep(self.retry_delay * 2 ** (attempt - 1))
+            try:
+                with self.app.app_context():
+                    task.func(*task.args, **task.kwargs)
+            except Exception:
+                logger.exception("Deferred task %s failed (attempt %s)", name, attempt + 1)
+                continue
+            outcome = 'succeeded' if not attempt else 'retried'
+            break
+        deferred_duration.labels(task=name).observe(time.monotonic() - start)
+        deferred_tasks.labels(task=name, outcome=outcome).inc()
+
+    @property
+    def depth(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def close(self, timeout: Optional[float] = None):
+        """Stop accepting tasks and wait up to ``timeout`` (default
+        ``DEFERRED_DRAIN_TIMEOUT``) for the queued ones to finish."""
+        self._closed = True
+        if self._queue is None:
+            return
+        deadline = time.monotonic() + (self.drain_timeout if timeout is None else timeout)
+        with self._lock:
+            threads, self._threads = self._threads, []
+        try:
+            for _ in threads:
+                # After the queued tasks, so they drain first; a full queue
+                # must not hold shutdown past the deadline
+                self._queue.put(_STOP, timeout=max(deadline - time.monotonic(), 0))
+        except queue.Full:
+            pass
+        for thread in threads:
+            thread.join(max(deadline - time.monotonic(), 0))
+        if any(thread.is_alive() for thread in threads):
+            self._drop_pending(len(threads))
+
+    def _drop_pending(self, stops: int):
+        """Discard the tasks still queued at the deadline and let the threads stop."""
+        dropped = []
+        while True:
+            try:
+                task = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            self._queue.task_done()
+            if task is not _STOP:
+                dropped.append(task.name)
+                deferred_tasks.labels(task=task.name, outcome='dropped').inc()
+        deferred_depth.set(0)
+        for _ in range(stops):
+            try:
+                self._queue.put_nowait(_STOP)
+            except queue.Full:
+                break
+        if dropped:
+            logger.warning("Deferred executor closed, %s tasks dropped: %s", len(dropped), ', '.join(dropped))
+        else:
+            logger.warning("Deferred executor closed with tasks still running")
+
+
+deferred = DeferredExecutor()
@@ -0,0 +1,227 @@
+"""Composite LLM provider with failover and hedged requests.
+
+Providers are tried in order. Each one must produce its first token within
+its own timeout, otherwise (or on an error before that token) the request
+moves on to the next provider. When hedging is on, a request whose first
+token is slower than the ``LLM_HEDGE_QUANTILE`` of recent first-token times
+also starts the next provider in parallel; whichever streams first wins and
+the other is cancelled. Once a token has been sent, errors are not retried
+(the caller already has part of the answer).
+
+With a ``scheduler``, every attempt (hedges included) holds a slot of its
+provider's lane, keyed by the slot name, for as long as it streams; an
+attempt that gets no slot in time counts as failed and the next provider
+is tried.
+"""
+import logging
+import queue
+import threading
+import time
+from contextlib import nullcontext
+from dataclasses import dataclass
+from typing import Generator, List, Optional
+
+from ..utils.metrics import registry
+from .llm_providers import CancelToken, LLMProvider, llm_first_token
+
+logger = logging.getLogger(__name__)
+
+failovers = registry.counter(
+    'llm_failovers_total', 'Provider attempts abandoned before the first token', ['provider', 'reason']
+)
+hedges = registry.counter('llm_hedged_requests_total', 'Hedge requests sent to a provider', ['provider'])
+hedge_wins = registry.counter('llm_hedge_wins_total', 'Hedge requests that streamed first', ['provider'])
+
+
+class ProvidersExhausted(Exception):
+    """Every provider failed or timed out before its first token."""
+
+
+@dataclass
+class ProviderSlot:
+    """A provider in the failover order."""
+    name: str
+    provider: LLMProvider
+    timeout: float  # seconds to the first token
+
+
+class _Attempt:
+    """One provider call streaming into the shared event queue on a thread."""
+
+    def __init__(self, slot: ProviderSlot, events: queue.Queue, hedge: bool, call_kwargs: dict, scheduler=None):
+        self.slot = slot
+        self.hedge = hedge
+        self.scheduler = scheduler
+        self.token = CancelToken()
+        self.started_at = time.monotonic()
+        self.deadline = self.started_at + slot.timeout
+        self._events = events
+        threading.Thread(
+            target=self._run, args=(call_kwargs,), name=f'llm-{slot.name}', daemon=True
+        ).start()
+
+    def _run(self, call_kwargs: dict):
+        try:
+            # Each attempt queues on its own, so it is its own "user" in the lane
+            ticket = nullcontext() if self.scheduler is None else self.scheduler.acquire(
+                self, provider=self.slot.name
+            )
+            with ticket:
+                if self.token.cancelled:
+                    return
+                for chunk in self.slot.provider.chat_stream(cancel=self.token, **call_kwargs):
+                    if self.token.cancelled:
+                        return
+                    if chunk:
+                        self._events.put((self, 'chunk', chunk))
+            # After the slot is given back, so a finished call holds none
+            self._events.put((self, 'end', None))
+        except Exception as e:
+            self._events.put((self, 'error', e))
+
+
+class FailoverProvider(LLMProvider):
+    """Tries ``slots`` in order, with optional hedging; see the module docstring.
+
+    ``hedge_quantile = 0`` disables hedging. The hedge threshold is the
+    quantile of the primary's recent first-token times, never below
+    ``hedge_min_delay`` and only once ``hedge_min_samples`` were observed
+    (``llm_time_to_first_token_seconds`` of the primary's provider class,
+    recorded by the provider itself). ``scheduler`` (a ``FairScheduler``)
+    caps each slot's concurrent calls.
+    """
+
+    def __init__(
+        self,
+        slots: List[ProviderSlot],
+        hedge_quantile: float = 0.0,
+        hedge_min_samples: int = 20,
+        hedge_min_delay: float = 0.5,
+        scheduler=None
+    ):
+        if not slots:
+            raise ValueError("FailoverProvider needs at least one provider")
+        self.slots = slots
+        self.hedge_quantile = hedge_quantile
+        self.hedge_min_samples = hedge_min_samples
+        self.hedge_min_delay = hedge_min_delay
+        self.scheduler = scheduler
+        self.model = '|'.join(getattr(s.provider, 'model', s.name) for s in slots)
+
+    def hedge_delay(self, slot: ProviderSlot) -> Optional[float]:
+        """Seconds without a first token after which a hedge is sent, or None."""
+        if self.hedge_quantile <= 0:
+            return None
+        observed = llm_first_token.labels(provider=type(slot.provider).__name__)
+        if observed.count < self.hedge_min_samples:
+            return None
+        threshold = observed.quantile(self.hedge_quantile)
+        if threshold is None:
+            threshold = 0.0
+        if threshold == float('inf') or threshold >= slot.timeout:
+            return None
+        return max(threshold, self.hedge_min_delay)
+
+    def chat(
+        self,
+        messages: List[dict],
+        temperature: float = 0.7,
+        max_tokens: int = 500,
+        images: Optional[List[str]] = None
+    ) -> str:
+        return ''.join(self.chat_stream(messages, temperature, max_tokens, images))
+
+    def chat_stream(
+        self,
+        messages: List[dict],
+        temperature: float = 0.7,
+        max_tokens: int = 500,
+        images: Optional[List[str]] = None,
+        cancel: Optional[CancelToken] = None
+    ) -> Generator[str, None, None]:
+        call_kwargs = {
+            'messages': messages, 'temperature': temperature, 'max_tokens': max_tokens, 'images': images
+        }
+        events: queue.Queue = queue.Queue()
+        pending = list(self.slots)
+        running: List[_Attempt] = []
+        errors: List[str] = []
+
+        def launch(hedge: bool = False) -> _Attempt:
+            attempt = _Attempt(pending.pop(0), events, hedge, call_kwargs, self.scheduler)
+            running.append(attempt)
+            if hedge:
+                hedges.labels(provider=attempt.slot.name).inc()
+            return attempt
+
+        def abandon(attempt: _Attempt, reason: str):
+            attempt.token.cancel(reason)
+            running.remove(attempt)
+            failovers.labels(provider=attempt.slot.name, reason=reason).inc()
+            errors.append(f'{attempt.slot.name}: {reason}')
+
+        if cancel is not None:
+            cancel.on_cancel(lambda: events.put((None, 'cancel', None)))
+
+        primary = launch()
+        delay = self.hedge_delay(primary.slot) if pending else None
+        hedge_at = None if delay is None else primary.started_at + delay
+        winner: Optional[_Attempt] = None
+        try:
+            # Race until one attempt produces its first token
+            while winner is None:
+                if cancel is not None and cancel.cancelled:
+                    return
+                now = time.monotonic()
+                wake = min([a.deadline for a in running] + ([hedge_at] if hedge_at else []))
+                try:
+                    attempt, kind, payload = events.get(timeout=max(wake - now, 0))
+                except queue.Empty:
+                    now = time.monotonic()
+                    for attempt in [a for a in running if a.deadline <= now]:
+                        logger.warning("LLM provider '%s' timed out before the first token", attempt.slot.name)
+                        abandon(attempt, 'timeout')
+                    if hedge_at is not None and now >= hedge_at and pending:
+                        logger.info("Hedging slow LLM request to '%s'", pending[0].name)
+                        launch(hedge=True)
+                        hedge_at = None
+                    attempt = None
+                # attempt is None on wake-ups, or stale if it was abandoned already
+                if attempt is not None and attempt in running:
+                    if kind == 'error':
+                        logger.warning("LLM provider '%s' failed: %s", attempt.slot.name, payload)
+                        abandon(attempt, 'error')
+                    else:
+                        winner = attempt
+                if winner is None and not running:
+                    if not pending:
+                        raise ProvidersExhausted('; '.join(errors))
+                    launch()
+                    hedge_at = None
+
+            if winner.hedge:
+                hedge_wins.labels(provider=winner.slot.name).inc()
+            for attempt in running:
+                if attempt is not winner:
+                    attempt.token.cancel('hedge_lost')
+            if kind == 'end':
+                return
+            yield payload
+
+            # Stream the winner
+            while True:
+                if cancel is not None and cancel.cancelled:
+                    return
+                attempt, kind, payload = events.get()
+                if attempt is not winner:
+                    continue
+                if kind == 'chunk':
+                    yield payload
+                elif kind == 'end':
+                    return
+                else:
+                    raise payload
+        finally:
+            reason = cancel.reason if cancel is not None and cancel.cancelled else 'closed'
+            for attempt in running:
+                attempt.token.cancel(reason)
@@ -0,0 +1,171 @@
+"""Queued reply generation (``202 Accepted`` mode).
+
+The request stores the user message, records a ``GenerationJob`` and returns
+at once. The reply is produced by Celery when ``USE_CELERY`` is set,
+otherwise by an in-process thread pool. Both run ``run_generation``, and
+clients read the outcome from the job row by polling or SSE.
+"""
+import logging
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict
+from typing import Optional
+
+from flask import current_app
+from sqlalchemy import update
+
+from ..extensions import db
+from ..models import GenerationJob, User
+from .deferred import deferred
+from .messages import Turn, complete_turn, summarize_turn
+from .provider_registry import get_llm_provider
+from .response_cache import response_cache
+from .scheduler import SchedulerFull, llm_scheduler
+
+logger = logging.getLogger(__name__)
+
+CELERY_TASK_NAME = 'chatgepeto.generate_reply'
+
+
+def _set_status(job_id: str, status: str, **values):
+    db.session.execute(
+        update(GenerationJob).where(GenerationJob.id == job_id).values(status=status, **values)
+    )
+    db.session.commit()
+
+
+def run_generation(job_id: str, payload: dict):
+    """Generate and store the reply of a queued turn (inside an app context).
+
+    The job waits for a fair-share scheduler slot like a direct request and
+    fails if it cannot get one. A job deleted while queued (with its
+    conversation) is skipped.
+    """
+    turn = Turn(**payload)
+    job = db.session.get(GenerationJob, job_id)
+    if job is None:
+        logger.info("Generation job %s was deleted before it ran", job_id)
+        return
+    user = db.session.get(User, job.user_id)
+    try:
+        ticket = llm_scheduler.acquire(user.id, llm_scheduler.priority_for(user))
+    except SchedulerFull as e:
+        _set_status(job_id, GenerationJob.STATUS_FAILED, error=f'Server busy ({e.reason}), try again')
+        return
+    _set_status(job_id, GenerationJob.STATUS_RUNNING)
+    try:
+        with ticket:
+            llm = get_llm_provider()
+            content = response_cache.chat(
+                llm,
+                turn.llm_messages,
+                temperature=current_app.config['LLM_TEMPERATURE'],
+                max_tokens=current_app.config['LLM_MAX_TOKENS']
+            )
+        assistant_message = complete_turn(turn, content)
+    except Exception as e:
+        logger.exception("Generation job %s failed", job_id)
+        db.session.rollback()
+        _set_status(job_id, GenerationJob.STATUS_FAILED, error=str(e))
+        return
+    _set_status(job_id, GenerationJob.STATUS_SUCCEEDED, message_id=assistant_message['id'])
+    if turn.overflow:
+        deferred.submit(summarize_turn, turn)
+
+
+class ThreadExecutor:
+    """Runs jobs on a bounded pool of threads in this worker.
+
+    At most ``max_queue`` jobs wait for a thread; a caller ``reserve``s room
+    before storing anything, so a full queue is refused up front.
+    """
+
+    def __init__(self, app, max_workers: int, max_queue: int):
+        self.app = app
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='generation')
+        self._room = threading.BoundedSemaphore(max_workers + max_queue)
+
+    def reserve(self) -> bool:
+        return self._room.acquire(blocking=False)
+
+    def release(self):
+        self._room.release()
+
+    def submit(self, job_id: str, payload: dict):
+        # The caller holds a reservation, given back when the job ends
+        self._pool.submit(self._run, job_id, payload)
+
+    def _run(self, job_id: str, payload: dict):
+        try:
+            with self.app.app_context():
+                run_generation(job_id, payload)
+        finally:
+            self.release()
+
+    def close(self, wait: bool = True):
+        self._pool.shutdown(wait=wait)
+
+
+class CeleryExecutor:
+    """Sends jobs to Celery workers; the job id doubles as the task id."""
+
+    def __init__(self, celery):
+        self.task = celery.tasks[CELERY_TASK_NAME]
+
+    def reserve(self) -> bool:
+        return True  # the broker queues and bounds the work
+
+    def release(self):
+        pass
+
+    def submit(self, job_id: str, payload: dict):
+        self.task.apply_async(args=(job_id, payload), task_id=job_id)
+
+    def close(self, wait: bool = True):
+        pass
+
+
+class GenerationQueue:
+    """Creates job rows and hands them to the configured executor."""
+
+    def __init__(self):
+        self.executor = None
+
+    def init_app(self, app):
+        self.close(wait=False)
+        if app.config['USE_CELERY']:
+            from ..tasks import init_celery
+            self.executor = CeleryExecutor(init_celery(app))
+        else:
+            self.executor = ThreadExecutor(
+                app, app.config['GENERATION_WORKERS'], app.config['GENERATION_QUEUE_MAX']
+            )
+        app.extensions['generation_queue'] = self
+
+    def reserve(self) -> bool:
+        """Claim room for one job; False when the thread pool's queue is full."""
+        return self.executor.reserve()
+
+    def release(self):
+        """Give back a reservation that was not enqueued."""
+        self.executor.release()
+
+    def enqueue(self, turn: Turn, user_id: int) -> GenerationJob:
+        """Record a queued job for ``turn`` and submit it (needs a reservation)."""
+        job = GenerationJob(id=uuid.uuid4().hex, conversation_id=turn.conversation_id, user_id=user_id)
+        db.session.add(job)
+        db.session.commit()
+        self.executor.submit(job.id, asdict(turn))
+        return job
+
+    def get(self, job_id: str, user_id: int) -> Optional[GenerationJob]:
+        return GenerationJob.query.filter_by(id=job_id, user_id=user_id).first()
+
+    def close(self, wait: bool = True):
+        if self.executor is not None:
+            self.executor.close(wait=wait)
+            self.executor = None
+
+
+generation_queue = GenerationQueue()
@@ -0,0 +1,150 @@
+"""Per-worker cache of authenticated users for the Flask-Login loader."""
+import json
+import logging
+import threading
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session, make_transient_to_detached, object_session
+
+from ..extensions import db
+from ..models import User
+from ..utils.metrics import registry
+from .response_cache import MemoryCacheBackend, SQLiteCacheBackend
+
+logger = logging.getLogger(__name__)
+
+identity_lookups = registry.counter(
+    'identity_cache_lookups_total', 'Flask-Login user loads served from the identity cache or the DB', ['result']
+)
+
+# Never cached; loaded on access by the rare code paths that need it
+EXCLUDED_COLUMNS = {'password_hash'}
+
+
+class IdentityCache:
+    """Serves ``load_user`` without a users query on every request.
+
+    Entries are column snapshots, not ORM instances, re-attached to the
+    request's session with ``merge(load=False)``. Any flush that updates or
+    deletes a ``User`` (Flask-Admin, the CLI, the API) invalidates its entry,
+    and entries expire after ``IDENTITY_CACHE_TTL`` seconds so changes made by
+    other workers with the memory backend are still picked up promptly. The
+    SQLite backend is shared by all workers on the host, so invalidation is
+    immediate there.
+    """
+
+    def __init__(self):
+        self.backend = None
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()  # counters are bumped from every request thread
+        self._columns = [c for c in User.__table__.columns if c.key not in EXCLUDED_COLUMNS]
+
+    def init_app(self, app):
+        """Build the configured backend."""
+        kind = app.config['IDENTITY_CACHE_BACKEND']
+        ttl = app.config['IDENTITY_CACHE_TTL']
+        max_entries = app.config['IDENTITY_CACHE_MAX_ENTRIES']
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+
+        if self.backend is not None:
+            self.backend.close()
+        if kind == 'memory':
+            self.backend = MemoryCacheBackend(max_entries=max_entries, ttl=ttl)
+        elif kind == 'sqlite':
+            self.backend = SQLiteCacheBackend(
+                app.config['IDENTITY_CACHE_PATH'], max_entries=max_entries, ttl=ttl,
+                table='identity_cache'
+            )
+        elif kind == 'none':
+            self.backend = None
+        else:
+            raise ValueError(f"Unknown IDENTITY_CACHE_BACKEND: {kind}")
+        app.extensions['identity_cache'] = self
+
+    def _dump(self, user: User) -> str:
+        data = {}
+        for column in self._columns:
+            value = getattr(user, column.key)
+            data[column.key] = value.isoformat() if isinstance(value, datetime) else value
+        return json.dumps(data)
+
+    def _load(self, raw: str) -> User:
+        data = json.loads(raw)
+        for column in self._columns:
+            if isinstance(column.type, db.DateTime) and data.get(column.key):
+                data[column.key] = datetime.fromisoformat(data[column.key])
+        user = User(**data)
+        make_transient_to_detached(user)
+        return db.session.merge(user, load=False)
+
+    def _count(self, hit: bool):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+        identity_lookups.labels(result='hit' if hit else 'miss').inc()
+
+    def load(self, user_id: int) -> Optional[User]:
+        """Active user for ``user_id``, from the cache when possible."""
+        if self.backend is None:
+            user = db.session.get(User, user_id)
+        else:
+            raw = self.backend.get(str(user_id))
+            self._count(hit=raw is not None)
+            if raw is not None:
+                user = self._load(raw)
+            else:
+                user = db.session.get(User, user_id)
+                if user is not None:
+                    self.backend.set(str(user_id), self._dump(user))
+
+        if user is None or not user.is_active:
+            return None
+        return user
+
+    def invalidate(self, user_id: int):
+        if self.backend is not None:
+            self.backend.delete(str(user_id))
+
+    def stats(self) -> dict:
+        """Hit/miss counters for this worker."""
+        with self._lock:
+            hits, misses = self.hits, self.misses
+        lookups = hits + misses
+        return {
+            'backend': type(self.backend).__name__ if self.backend else None,
+            'hits': hits,
+            'misses': misses,
+            'hit_ratio': round(hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+identity_cache = IdentityCache()
+
+
+@event.listens_for(User, 'after_update')
+@event.listens_for(User, 'after_delete')
+def _user_changed(mapper, connection, target):
+    identity_cache.invalidate(target.id)
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault('changed_users', set()).add(target.id)
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_committed_users(session):
+    # Drop again after commit: a concurrent request may have re-cached the
+    # pre-commit row between the flush and the commit.
+    for user_id in session.info.pop('changed_users', ()):
+        identity_cache.invalidate(user_id)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _forget_changed_users(session):
+    session.info.pop('changed_users', None)
@@ -1,14 +1,152 @@
 """LLM provider abstraction for chat completions."""
+import functools
 import json
 import logging
 import os
+import threading
+import time
 from abc import ABC, abstractmethod
 from typing import Generator, List, Optional
 
 import httpx
 
+from ..utils.metrics import registry
+from .ollama_pool import OllamaPool
+
 logger = logging.getLogger(__name__)
 
+# Ollama reports these (durations in nanoseconds) on its final response
+OLLAMA_TIMING_FIELDS = (
+    'total_duration', 'load_duration',
+    'prompt_eval_count', 'prompt_eval_duration',
+    'eval_count', 'eval_duration',
+)
+
+ollama_load_seconds = registry.histogram('ollama_load_seconds', 'Time Ollama spent loading the model')
+ollama_eval_seconds = registry.histogram(
+    'ollama_eval_seconds', 'Ollama evaluation time (prompt = prefill, completion = decode)', ['phase']
+)
+ollama_tokens = registry.counter(
+    'ollama_tokens_total', 'Tokens evaluated by Ollama (prompt tokens exclude reused KV cache)', ['phase']
+)
+
+TTFT_BUCKETS = (0.1, 0.25, 0.5, 0.75, 1.0, 1.5, 2.0, 3.0, 5.0, 8.0, 13.0, 20.0, 30.0, 60.0)
+GENERATION_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.0, 3.0, 5.0, 8.0, 13.0, 20.0, 30.0, 60.0, 120.0)
+THROUGHPUT_BUCKETS = (1, 2, 5, 10, 15, 20, 30, 50, 75, 100, 150, 250, 500)
+
+llm_requests = registry.counter('llm_requests_total', 'Calls to LLM providers', ['provider', 'mode'])
+llm_errors = registry.counter('llm_errors_total', 'LLM provider calls that raised', ['provider', 'error'])
+# Also the basis of FailoverProvider's hedge delay
+llm_first_token = registry.histogram(
+    'llm_time_to_first_token_seconds', 'Streaming call to first token', ['provider'], buckets=TTFT_BUCKETS
+)
+llm_generation = registry.histogram(
+    'llm_generation_seconds', 'Call to last token', ['provider'], buckets=GENERATION_BUCKETS
+)
+llm_throughput = registry.histogram(
+    'llm_tokens_per_second', 'Completion tokens per second (after the first token when streaming)',
+    ['provider'], buckets=THROUGHPUT_BUCKETS
+)
+llm_completion_tokens = registry.counter(
+    'llm_completion_tokens_total', 'Completion tokens received (estimated from text)', ['provider']
+)
+
+
+def _completion_tokens(chars: int) -> int:
+    # ~4 characters per token, as ``context_builder.estimate_tokens``
+    return chars // 4 + 1
+
+
+def instrumented_chat(method):
+    """Count, time and measure the throughput of a provider's ``chat``."""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        provider = type(self).__name__
+        llm_requests.labels(provider=provider, mode='chat').inc()
+        started = time.perf_counter()
+        try:
+            content = method(self, *args, **kwargs)
+        except Exception as e:
+            llm_errors.labels(provider=provider, error=type(e).__name__).inc()
+            raise
+        elapsed = time.perf_counter() - started
+        tokens = _completion_tokens(len(content or ''))
+        llm_generation.labels(provider=provider).observe(elapsed)
+        llm_completion_tokens.labels(provider=provider).inc(tokens)
+        if elapsed > 0:
+            llm_throughput.labels(provider=provider).observe(tokens / elapsed)
+        return content
+    return wrapper
+
+
+def instrumented_stream(method):
+    """Like ``instrumented_chat`` for ``chat_stream``, plus time to first token."""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        provider = type(self).__name__
+        llm_requests.labels(provider=provider, mode='stream').inc()
+        started = time.perf_counter()
+        first_at = None
+        chars = 0
+        try:
+            for chunk in method(self, *args, **kwargs):
+                if first_at is None:
+                    first_at = time.perf_counter()
+                    llm_first_token.labels(provider=provider).observe(first_at - started)
+                chars += len(chunk)
+                yield chunk
+        except Exception as e:
+            llm_errors.labels(provider=provider, error=type(e).__name__).inc()
+            raise
+        finished = time.perf_counter()
+        llm_generation.labels(provider=provider).observe(finished - started)
+        if first_at is not None:
+            tokens = _completion_tokens(chars)
+            llm_completion_tokens.labels(provider=provider).inc(tokens)
+            if finished > first_at:
+                llm_throughput.labels(provider=provider).observe(tokens / (finished - first_at))
+    return wrapper
+
+
+class CancelToken:
+    """Cooperative cancellation for a streaming call.
+
+    ``cancel`` may be called from any thread. Callbacks registered by the
+    provider (e.g. closing the upstream response) run at once, so a blocked
+    read is interrupted instead of waiting for the next chunk.
+    """
+
+    def __init__(self):
+        self.reason: Optional[str] = None
+        self._event = threading.Event()
+        self._callbacks = []
+        self._lock = threading.Lock()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def cancel(self, reason: str = 'cancelled'):
+        with self._lock:
+            if self._event.is_set():
+                return
+            self.reason = reason
+            self._event.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception:
+                logger.debug("Cancel callback failed", exc_info=True)
+
+    def on_cancel(self, callback):
+        """Run ``callback`` on cancellation (immediately if already cancelled)."""
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(callback)
+                return
+        callback()
+
 
 class LLMProvider(ABC):
     """Abstract base for LLM providers."""
@@ -29,23 +167,29 @@ class LLMProvider(ABC):
         messages: List[dict],
         temperature: float = 0.7,
         max_tokens: int = 500,
-        images: Optional[List[str]] = None
+        images: Optional[List[str]] = None,
+        cancel: Optional[CancelToken] = None
     ) -> Generator[str, None, None]:
-        """Stream chat completion. Override for streaming support."""
+        """Stream chat completion. Override for streaming support.
+
+        Implementations stop and close the upstream stream once ``cancel`` is
+        cancelled.
+        """
         yield self.chat(messages, temperature, max_tokens, images)
 
 
 class GroqProvider(LLMProvider):
     """Groq API provider (free tier - Gemma 2 9B). Text-only, no multimodal."""
 
-    def __init__(self):
+    def __init__(self, http_client: Optional[httpx.Client] = None):
         from groq import Groq
         api_key = os.environ.get('GROQ_API_KEY')
         if not api_key:
             raise ValueError("GROQ_API_KEY not set")
-        self.client = Groq(api_key=api_key)
+        self.client = Groq(api_key=api_key, http_client=http_client)
         self.model = "gemma2-9b-it"
 
+    @instrumented_chat
     def chat(
         self,
         messages: List[dict],
@@ -63,12 +207,14 @@ class GroqProvider(LLMProvider):
         )
         return response.choices[0].message.content
 
+    @instrumented_stream
     def chat_stream(
         self,
         messages: List[dict],
         temperature: float = 0.7,
         max_tokens: int = 500,
-        images: Optional[List[str]] = None
+        images: Optional[List[str]] = None,
+        cancel: Optional[CancelToken] = None
     ) -> Generator[str, None, None]:
         """Stream chat completion from Groq."""
         if images:
@@ -81,35 +227,80 @@ class GroqProvider(LLMProvider):
             max_tokens=max_tokens,
             stream=True,
         )
+        if cancel is not None:
+            cancel.on_cancel(stream.close)
 
-        for chunk in stream:
-            if chunk.choices and chunk.choices[0].delta.content:
-                yield chunk.choices[0].delta.content
+        try:
+            for chunk in stream:
+                if cancel is not None and cancel.cancelled:
+                    return
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+        except Exception:
+            # Closing the response from another thread aborts the read
+            if cancel is None or not cancel.cancelled:
+                raise
+        finally:
+            stream.close()
 
 
 class OllamaProvider(LLMProvider):
-    """Ollama provider using /api/generate endpoint."""
+    """Ollama provider using the native /api/chat endpoint.
 
-    def __init__(self):
-        self.base_url = os.environ.get('OLLAMA_HOST', 'http://localhost:11434')
-        self.client = httpx.Client(timeout=120.0)
+    Ollama applies the model's own chat template and keeps the model loaded
+    for ``OLLAMA_KEEP_ALIVE``. While it stays loaded, a request whose
+    messages extend the previous request's messages reuses the evaluated KV
+    cache for the shared prefix and only evaluates the new suffix. The
+    ``prompt_eval_*`` metrics show how much prefill that saves.
+
+    ``OLLAMA_HOST`` may list several nodes; requests are routed by ``pool``.
+    """
+
+    def __init__(self, client: Optional[httpx.Client] = None, pool: Optional[OllamaPool] = None):
+        self.pool = pool or OllamaPool.from_hosts(os.environ.get('OLLAMA_HOST', 'http://localhost:11434'))
+        self.base_url = self.pool.nodes[0].url
         self.model = os.environ.get('OLLAMA_MODEL', 'gemma3:4b')
+        self.keep_alive = os.environ.get('OLLAMA_KEEP_ALIVE', '30m')
+        self.last_timings: Optional[dict] = None
+        self.client = client or httpx.Client(timeout=120.0)
+
+    def _chat_messages(self, messages: List[dict], images: Optional[List[str]]) -> List[dict]:
+        chat = [{'role': m['role'], 'content': m['content']} for m in messages]
+        if images:
+            # Attachments belong to the turn being answered
+            for message in reversed(chat):
+                if message['role'] == 'user':
+                    message['images'] = list(images)
+                    break
+        return chat
 
-    def _messages_to_prompt(self, messages: List[dict]) -> str:
-        """Convert chat messages to single prompt for /api/generate."""
-        parts = []
-        for msg in messages:
-            role = msg['role']
-            content = msg['content']
-            if role == 'system':
-                parts.append(f"System: {content}")
-            elif role == 'user':
-                parts.append(f"User: {content}")
-            elif role == 'assistant':
-                parts.append(f"Assistant: {content}")
-        parts.append("Assistant:")
-        return "\n\n".join(parts)
+    def _chat_payload(
+        self,
+        messages: List[dict],
+        temperature: float,
+        max_tokens: int,
+        stream: bool,
+        images: Optional[List[str]] = None
+    ) -> dict:
+        return {
+            "model": self.model,
+            "messages": self._chat_messages(messages, images),
+            "stream": stream,
+            "keep_alive": self.keep_alive,
+            "options": {"temperature": temperature, "num_predict": max_tokens}
+        }
 
+    def _record_timings(self, data: dict):
+        """Record Ollama's prefill/decode counters from a final (``done``) response."""
+        timings = {key: data.get(key, 0) for key in OLLAMA_TIMING_FIELDS}
+        self.last_timings = timings
+        ollama_load_seconds.observe(timings['load_duration'] / 1e9)
+        ollama_eval_seconds.labels(phase='prompt').observe(timings['prompt_eval_duration'] / 1e9)
+        ollama_eval_seconds.labels(phase='completion').observe(timings['eval_duration'] / 1e9)
+        ollama_tokens.labels(phase='prompt').inc(timings['prompt_eval_count'])
+        ollama_tokens.labels(phase='completion').inc(timings['eval_count'])
+
+    @instrumented_chat
     def chat(
         self,
         messages: List[dict],
@@ -117,59 +308,47 @@ class OllamaProvider(LLMProvider):
         max_tokens: int = 500,
         images: Optional[List[str]] = None
     ) -> str:
-        if images:
-            logger.warning("Ollama /api/generate does not support images, ignoring")
-
-        prompt = self._messages_to_prompt(messages)
-        response = self.client.post(
-            f"{self.base_url}/api/generate",
-            json={
-                "model": self.model,
-                "prompt": prompt,
-                "stream": False,
-                "options": {"temperature": temperature, "num_predict": max_tokens}
-            }
-        )
+        with self.pool.acquire(messages) as node:
+            response = self.client.post(
+                f"{node.url}/api/chat",
+                json=self._chat_payload(messages, temperature, max_tokens, stream=False, images=images)
+            )
         response.raise_for_status()
-        return response.json()["response"]
+        data = response.json()
+        self._record_timings(data)
+        return data["message"]["content"]
 
+    @instrumented_stream
     def chat_stream(
         self,
         messages: List[dict],
         temperature: float = 0.7,
         max_tokens: int = 500,
-        images: Optional[List[str]] = None
+        images: Optional[List[str]] = None,
+        cancel: Optional[CancelToken] = None
     ) -> Generator[str, None, None]:
         """Stream chat completion from Ollama."""
-        if images:
-            logger.warning("Ollama /api/generate does not support images, ignoring")
-
-        prompt = self._messages_to_prompt(messages)
-
-        with httpx.Client(timeout=120.0) as client:
-            with client.stream(
-                'POST',
-                f"{self.base_url}/api/generate",
-                json={
-                    "model": self.model,
-                    "prompt": prompt,
-                    "stream": True,
-                    "options": {"temperature": temperature, "num_predict": max_tokens}
-                }
-            ) as response:
-                response.raise_for_status()
+        with self.pool.acquire(messages) as node, self.client.stream(
+            'POST',
+            f"{node.url}/api/chat",
+            json=self._chat_payload(messages, temperature, max_tokens, stream=True, images=images)
+        ) as response:
+            response.raise_for_status()
+            if cancel is not None:
+                cancel.on_cancel(response.close)
+            try:
                 for line in response.iter_lines():
+                    if cancel is not None and cancel.cancelled:
+                        return
                     if line:
                         data = json.loads(line)
-                        if 'response' in data:
-                            yield data['response']
-
-
-def get_llm_provider() -> LLMProvider:
-    """Returns Ollama if configured, else Groq."""
-    ollama_host = os.environ.get('OLLAMA_HOST')
-    if ollama_host:
-        logger.info(f"Using Ollama at {ollama_host}")
-        return OllamaProvider()
-    logger.info("Using Groq API")
-    return GroqProvider()
+                        content = data.get('message', {}).get('content')
+                        if content:
+                            yield content
+                        if data.get('done'):
+                            self._record_timings(data)
+            except (httpx.HTTPError, httpx.StreamError):
+                # Closing the response from another thread aborts the read
+                if cancel is None or not cancel.cancelled:
+                    raise
+
@@ -0,0 +1,158 @@
+"""Chat turn write path.
+
+A turn runs in three phases so no pooled connection is held while the LLM
+generates:
+
+1. ``begin_turn`` (DB): read the prompt history, store the user message,
+   auto-title and touch the conversation in one commit. The commit returns
+   the connection to the pool.
+2. Generation (no DB): the caller talks to the provider using only the plain
+   data carried in ``Turn``, so nothing lazy-loads and re-checks out a
+   connection.
+3. ``complete_turn`` (DB): store the reply in one commit and count the
+   turn's LLM tokens against the user's quota.
+
+Turns that fell out of the prompt budget are summarized afterwards, off the
+response path: every caller hands ``summarize_turn`` to ``deferred``, which
+retries it when the provider fails, and ``save_summary`` only moves the
+summary forward, never back to older turns.
+"""
+import logging
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import List, Optional
+
+from flask import current_app
+from sqlalchemy import or_, update
+
+from ..extensions import db
+from ..models import Conversation, Message
+from ..schemas import message_serializer
+from ..utils import db_stats
+from .context_builder import ContextBuilder, estimate_tokens
+from .llm_providers import LLMProvider
+from .provider_registry import get_llm_provider
+from .rate_limits import rate_limiter
+
+logger = logging.getLogger(__name__)
+
+TITLE_LENGTH = 50
+
+
+@dataclass
+class Turn:
+    """Session-free state carried from ``begin_turn`` to ``complete_turn``."""
+    conversation_id: int
+    user_message: dict
+    llm_messages: List[dict]
+    summary: str = ''
+    overflow: List[dict] = field(default_factory=list)
+    overflow_last_id: Optional[int] = None
+    user_id: Optional[int] = None
+
+
+def begin_turn(conversation: Conversation, content: str) -> Turn:
+    """Persist the user message and build the LLM prompt in one transaction."""
+    now = datetime.utcnow()
+
+    # History is read before the insert, so the new message needs no exclusion
+    context = ContextBuilder.from_config(current_app.config).build(conversation, content)
+
+    user_message = Message(
+        conversation=conversation,
+        role=Message.ROLE_USER,
+        content=content,
+        created_at=now
+    )
+    db.session.add(user_message)
+
+    # Auto-title on the first message (counter avoids a COUNT query)
+    if not conversation.message_count and not conversation.title:
+        conversation.title = content[:TITLE_LENGTH]
+    conversation.updated_at = now
+
+    db.session.flush()
+    turn = Turn(
+        conversation_id=conversation.id,
+        user_message=message_serializer.dump(user_message),
+        llm_messages=context.messages,
+        summary=context.summary,
+        overflow=context.overflow,
+        overflow_last_id=context.overflow_last_id,
+        user_id=conversation.user_id,
+    )
+    db.session.commit()
+    return turn
+
+
+def summarize_overflow(turn: Turn, llm: LLMProvider) -> Optional[str]:
+    """Fold turns that fell out of the budget into a new summary (no DB).
+
+    Returns None when there is nothing to fold; provider errors propagate.
+    """
+    if not turn.overflow:
+        return None
+    return ContextBuilder.from_config(current_app.config).summarize(
+        turn.summary, turn.overflow, llm
+    )
+
+
+def save_summary(turn: Turn, summary: str) -> bool:
+    """Store a summary computed off the request, unless a newer one is already stored."""
+    result = db.session.execute(
+        update(Conversation)
+        .where(
+            Conversation.id == turn.conversation_id,
+            or_(
+                Conversation.summary_message_id.is_(None),
+                Conversation.summary_message_id < turn.overflow_last_id
+            )
+        )
+        .values(summary=summary, summary_message_id=turn.overflow_last_id)
+    )
+    db.session.commit()
+    return result.rowcount > 0
+
+
+def summarize_turn(turn: Turn):
+    """Deferred task: summarize the turn's overflow and store it.
+
+    A failing provider raises, so the executor retries the task.
+    """
+    summary = summarize_overflow(turn, get_llm_provider())
+    if summary is not None:
+        save_summary(turn, summary)
+
+
+def complete_turn(turn: Turn, content: str, truncated: bool = False) -> dict:
+    """Persist the assistant reply and touch the conversation."""
+    now = datetime.utcnow()
+    assistant_message = Message(
+        conversation_id=turn.conversation_id,
+        role=Message.ROLE_ASSISTANT,
+        content=content,
+        created_at=now,
+        is_truncated=truncated
+    )
+    db.session.add(assistant_message)
+
+    db.session.execute(
+        update(Conversation).where(Conversation.id == turn.conversation_id).values(updated_at=now)
+    )
+
+    db.session.flush()
+    data = message_serializer.dump(assistant_message)
+    db.session.commit()
+
+    prompt_tokens = sum(estimate_tokens(m['content']) for m in turn.llm_messages)
+    rate_limiter.record(turn.user_id, prompt_tokens + estimate_tokens(content))
+
+    stats = db_stats.current()
+    if stats is not None:
+        logger.info(
+            "Turn persisted: conversation=%s queries=%s commits=%s checkouts=%s "
+            "db_ms=%.1f held_ms=%.1f",
+            turn.conversation_id, stats.queries, stats.commits, stats.checkouts,
+            stats.duration * 1000, stats.held * 1000
+        )
+    return data
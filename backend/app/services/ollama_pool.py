@@ -0,0 +1,189 @@
+"""Routing across several Ollama nodes (``OLLAMA_HOST=http://a:11434,http://b:11434``).
+
+Each request goes to the healthy node with the fewest outstanding requests
+from this worker. With affinity on, requests that share a prompt prefix (the
+system prompt and first user turn, i.e. the same conversation; the rolling
+summary, a later system message that changes on every refresh, is left out
+of the key) prefer the same node, chosen by rendezvous hashing, so its KV cache is reused. The
+preference is dropped when that node is more than ``affinity_slack``
+requests busier than the least loaded one. A background probe ejects nodes
+that fail or answer slower than ``slow_after`` and re-admits them once they
+recover. A transport error on a request ejects its node until the next good
+probe. If every node is ejected, all of them are used again.
+"""
+import hashlib
+import json
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterator, List, Optional
+
+import httpx
+
+from ..utils.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+node_outstanding = registry.gauge('ollama_node_outstanding', 'In-flight requests per Ollama node', ['node'])
+node_healthy = registry.gauge(
+    'ollama_node_healthy', '1 if the Ollama node is routable (0 if any worker ejected it)', ['node'], aggregate='min'
+)
+node_requests = registry.counter('ollama_node_requests_total', 'Requests routed per Ollama node', ['node'])
+node_ejections = registry.counter(
+    'ollama_node_ejections_total', 'Times an Ollama node was taken out of rotation', ['node', 'reason']
+)
+
+
+class OllamaNode:
+    """One Ollama server and its routing state in this worker."""
+
+    def __init__(self, url: str):
+        self.url = url.rstrip('/')
+        self.outstanding = 0
+        self.healthy = True
+        self.probe_latency: Optional[float] = None
+        node_healthy.labels(node=self.url).set(1)
+
+    def eject(self, reason: str):
+        if self.healthy:
+            logger.warning("Ejecting Ollama node %s (%s)", self.url, reason)
+            node_ejections.labels(node=self.url, reason=reason).inc()
+        self.healthy = False
+        node_healthy.labels(node=self.url).set(0)
+
+    def admit(self):
+        if not self.healthy:
+            logger.info("Ollama node %s is back in rotation", self.url)
+        self.healthy = True
+        node_healthy.labels(node=self.url).set(1)
+
+    def __repr__(self):
+        return f'<OllamaNode {self.url} outstanding={self.outstanding} healthy={self.healthy}>'
+
+
+class OllamaPool:
+    """Least-outstanding-requests router with prefix affinity and health probes."""
+
+    def __init__(
+        self,
+        urls: List[str],
+        affinity: bool = True,
+        affinity_slack: int = 2,
+        probe_interval: float = 10.0,
+        slow_after: float = 2.0
+    ):
+        if not urls:
+            raise ValueError("OllamaPool needs at least one node")
+        self.nodes = [OllamaNode(url) for url in urls]
+        self.affinity = affinity and len(self.nodes) > 1
+        self.affinity_slack = affinity_slack
+        self.probe_interval = probe_interval
+        self.slow_after = slow_after
+        self._lock = threading.Lock()
+        self._prober: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    @classmethod
+    def from_hosts(cls, hosts: str, **kwargs) -> 'OllamaPool':
+        """Build from a comma-separated ``OLLAMA_HOST`` value."""
+        return cls([h.strip() for h in hosts.split(',') if h.strip()], **kwargs)
+
+    def affinity_key(self, messages: List[dict]) -> Optional[str]:
+        """Key shared by requests of one conversation: system prompt and first user turn."""
+        if not self.affinity:
+            return None
+        prefix = []
+        if messages[0]['role'] == 'system':
+            prefix.append(messages[0]['content'])
+        first_user = next((m['content'] for m in messages if m['role'] == 'user'), None)
+        if first_user is not None:
+            prefix.append(first_user)
+        return json.dumps(prefix, ensure_ascii=False)
+
+    def _rank(self, node: OllamaNode, key: str) -> bytes:
+        return hashlib.blake2b(f'{node.url}|{key}'.encode('utf-8'), digest_size=8).digest()
+
+    def pick(self, key: Optional[str] = None) -> OllamaNode:
+        """Choose a node (caller holds the lock)."""
+        candidates = [n for n in self.nodes if n.healthy] or self.nodes
+        least = min(candidates, key=lambda n: n.outstanding)
+        if key is None:
+            return least
+        preferred = max(candidates, key=lambda n: self._rank(n, key))
+        if preferred.outstanding <= least.outstanding + self.affinity_slack:
+            return preferred
+        return least
+
+    @contextmanager
+    def acquire(self, messages: Optional[List[dict]] = None) -> Iterator[OllamaNode]:
+        """Reserve a node for one request; transport errors eject it."""
+        key = self.affinity_key(messages) if messages else None
+        with self._lock:
+            node = self.pick(key)
+            node.outstanding += 1
+        node_requests.labels(node=node.url).inc()
+        node_outstanding.labels(node=node.url).inc()
+        try:
+            yield node
+        except httpx.TransportError:
+            node.eject('error')
+            raise
+        finally:
+            with self._lock:
+                node.outstanding -= 1
+            node_outstanding.labels(node=node.url).dec()
+
+    def probe(self, client: httpx.Client):
+        """Check every node once; slow or failing nodes are ejected."""
+        for node in self.nodes:
+            start = time.monotonic()
+            try:
+                response = client.get(f'{node.url}/api/version', timeout=max(self.slow_after * 2, 1.0))
+                response.raise_for_status()
+            except httpx.HTTPError as e:
+                node.eject('probe_failed')
+                logger.debug("Ollama probe of %s failed: %s", node.url, e)
+                continue
+            node.probe_latency = time.monotonic() - start
+            if node.probe_latency > self.slow_after:
+                node.eject('slow')
+            else:
+                node.admit()
+
+    def start_probes(self, client: httpx.Client):
+        """Probe in a daemon thread every ``probe_interval`` seconds (idempotent)."""
+        if self.probe_interval <= 0 or (self._prober is not None and self._prober.is_alive()):
+            return
+        self._stop.clear()
+
+        def run():
+            while not self._stop.is_set():
+                try:
+                    self.probe(client)
+                except Exception:
+                    logger.exception("Ollama health probe failed")
+                self._stop.wait(self.probe_interval)
+
+        self._prober = threading.Thread(target=run, name='ollama-probe', daemon=True)
+        self._prober.start()
+
+    def warmup(self, client: httpx.Client, model: str, keep_alive: str):
+        """Load ``model`` on every healthy node (an empty chat only loads it)."""
+        for node in self.nodes:
+            if not node.healthy:
+                continue
+            start = time.monotonic()
+            try:
+                response = client.post(
+                    f'{node.url}/api/chat',
+                    json={'model': model, 'messages': [], 'keep_alive': keep_alive}
+                )
+                response.raise_for_status()
+            except httpx.HTTPError as e:
+                logger.warning("Warmup of %s on %s failed: %s", model, node.url, e)
+                continue
+            logger.info("Warmed up %s on %s in %.1fs", model, node.url, time.monotonic() - start)
+
+    def stop(self):
+        self._stop.set()
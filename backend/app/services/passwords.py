@@ -0,0 +1,181 @@
+"""Password hashing off the request path, plus failed-login throttling."""
+import logging
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional, Tuple
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+from ..utils.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+HASH_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+hash_duration = registry.histogram(
+    'password_hash_duration_seconds', 'CPU time spent hashing passwords', ['op'], buckets=HASH_BUCKETS
+)
+hash_queue_wait = registry.histogram(
+    'password_hash_queue_wait_seconds', 'Time a hash waited for a pool process', buckets=HASH_BUCKETS
+)
+hash_pending = registry.gauge('password_hash_pending', 'Hashes queued or running in this worker')
+hash_rejected = registry.counter('password_hash_rejected_total', 'Hashes refused because the pool was full')
+
+
+class PasswordHasherBusy(Exception):
+    """Raised when the hashing queue is full; the caller should retry later."""
+
+
+def _timed_check(password_hash: str, password: str) -> Tuple[bool, float]:
+    start = time.perf_counter()
+    return check_password_hash(password_hash, password), time.perf_counter() - start
+
+
+def _timed_generate(password: str, method: str) -> Tuple[str, float]:
+    start = time.perf_counter()
+    return generate_password_hash(password, method=method), time.perf_counter() - start
+
+
+class PasswordHasher:
+    """Runs password hashing on a bounded per-worker process pool.
+
+    At most ``PASSWORD_HASH_MAX_PENDING`` hashes may be queued or running;
+    beyond that callers wait up to ``PASSWORD_HASH_QUEUE_TIMEOUT`` seconds for a
+    slot and then get ``PasswordHasherBusy``. With ``PASSWORD_HASH_WORKERS = 0``
+    hashing runs inline (tests, one-off scripts).
+    """
+
+    def __init__(self):
+        self.method = 'pbkdf2:sha256:600000'
+        self.workers = 0
+        self.queue_timeout = 1.0
+        self._slots = threading.BoundedSemaphore(1)
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.close()
+        self.method = app.config['PASSWORD_HASH_METHOD']
+        self.workers = app.config['PASSWORD_HASH_WORKERS']
+        self.queue_timeout = app.config['PASSWORD_HASH_QUEUE_TIMEOUT']
+        self._slots = threading.BoundedSemaphore(app.config['PASSWORD_HASH_MAX_PENDING'])
+        app.extensions['password_hasher'] = self
+
+    def _pool(self) -> ProcessPoolExecutor:
+        # Created lazily so each gunicorn worker forks its own pool
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        return self._executor
+
+    def _run(self, op: str, fn, *args):
+        if not self._slots.acquire(timeout=self.queue_timeout):
+            hash_rejected.inc()
+            raise PasswordHasherBusy()
+        hash_pending.inc()
+        start = time.perf_counter()
+        try:
+            if self.workers:
+                result, elapsed = self._pool().submit(fn, *args).result()
+            else:
+                result, elapsed = fn(*args)
+        finally:
+            hash_pending.dec()
+            self._slots.release()
+        hash_duration.labels(op=op).observe(elapsed)
+        hash_queue_wait.observe(max(time.perf_counter() - start - elapsed, 0.0))
+        return result
+
+    def verify(self, password_hash: str, password: str) -> bool:
+        """``check_password_hash`` on the pool."""
+        return self._run('verify', _timed_check, password_hash, password)
+
+    def hash(self, password: str) -> str:
+        """``generate_password_hash`` with the configured method, on the pool."""
+        return self._run('hash', _timed_generate, password, self.method)
+
+    def needs_rehash(self, password_hash: str) -> bool:
+        """True if the hash was made with other parameters than configured."""
+        return password_hash.split('$', 1)[0] != self.method
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+class LoginThrottle:
+    """Sliding-window limit on failed logins per username and per client IP.
+
+    Every failure counts against both, so one address cannot make the
+    hashing pool verify an unbounded number of passwords by spreading them
+    over many usernames. The per-IP limit is set well above the per-user
+    one for classrooms behind a single NAT. Counters live in the worker
+    process, so the effective limit scales with the number of gunicorn
+    workers.
+    """
+
+    def __init__(self):
+        self.window = 300.0
+        self.max_per_user = 5
+        self.max_per_ip = 50
+        self.max_keys = 10000
+        self._failures = OrderedDict()
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.window = app.config['LOGIN_THROTTLE_WINDOW']
+        self.max_per_user = app.config['LOGIN_THROTTLE_MAX_PER_USER']
+        self.max_per_ip = app.config['LOGIN_THROTTLE_MAX_PER_IP']
+        self.reset()
+        app.extensions['login_throttle'] = self
+
+    def _recent(self, key, now: float) -> deque:
+        attempts = self._failures.get(key)
+        if attempts is None:
+            return deque()
+        while attempts and attempts[0] <= now - self.window:
+            attempts.popleft()
+        if not attempts:
+            del self._failures[key]
+        return attempts
+
+    def _keys(self, username: str, ip: Optional[str]):
+        yield ('user', username), self.max_per_user
+        if ip is not None:
+            yield ('ip', ip), self.max_per_ip
+
+    def retry_after(self, username: str, ip: Optional[str] = None) -> int:
+        """Seconds until a login may be attempted again, 0 if allowed now."""
+        now = time.monotonic()
+        wait = 0.0
+        with self._lock:
+            for key, limit in self._keys(username, ip):
+                attempts = self._recent(key, now)
+                if limit and len(attempts) >= limit:
+                    wait = max(wait, attempts[-limit] + self.window - now)
+        return int(wait) + 1 if wait else 0
+
+    def record_failure(self, username: str, ip: Optional[str] = None):
+        now = time.monotonic()
+        with self._lock:
+            for key, _ in self._keys(username, ip):
+                self._failures.setdefault(key, deque()).append(now)
+                self._failures.move_to_end(key)
+            while len(self._failures) > self.max_keys:
+                self._failures.popitem(last=False)
+
+    def clear_user(self, username: str):
+        with self._lock:
+            self._failures.pop(('user', username), None)
+
+    def reset(self):
+        with self._lock:
+            self._failures.clear()
+
+
+password_hasher = PasswordHasher()
+login_throttle = LoginThrottle()
@@ -0,0 +1,250 @@
+"""Process-wide LLM provider registry with a shared, pooled HTTP client."""
+import atexit
+import logging
+import os
+import threading
+from typing import Optional
+
+import httpx
+
+from ..utils.metrics import registry
+from .failover import FailoverProvider, ProviderSlot
+from .llm_providers import GroqProvider, LLMProvider, OllamaProvider
+from .ollama_pool import OllamaPool
+
+logger = logging.getLogger(__name__)
+
+# Connections reused = requests - connections opened
+upstream_requests = registry.counter(
+    'llm_http_requests_total', 'Requests sent to LLM upstreams through the pooled client'
+)
+upstream_connections = registry.counter(
+    'llm_http_connections_opened_total', 'TCP connections opened to LLM upstreams'
+)
+
+
+class ProviderRegistry:
+    """Builds each LLM provider once per worker process.
+
+    All providers share one ``httpx.Client`` so keep-alive connections to the
+    upstream are reused across turns instead of paying TCP/TLS setup per
+    message. Connection reuse is tracked through httpcore's trace hook.
+    With ``LLM_PROVIDERS`` set, the default provider is a ``FailoverProvider``
+    over those registry entries. Ollama requests are spread over the
+    ``OLLAMA_HOST`` nodes by an ``OllamaPool``.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()  # building 'failover' gets its members
+        self._providers = {}
+        self._client: Optional[httpx.Client] = None
+        self._settings = {
+            'max_connections': 20,
+            'max_keepalive_connections': 10,
+            'keepalive_expiry': 30.0,
+            'timeout': 120.0,
+            'http2': False,
+        }
+        self._failover = {
+            'providers': [],
+            'timeout': 20.0,
+            'hedge_quantile': 0.0,
+            'hedge_min_samples': 20,
+            'hedge_min_delay': 0.5,
+        }
+        self._ollama = {
+            'affinity': True,
+            'affinity_slack': 2,
+            'probe_interval': 10.0,
+            'slow_after': 2.0,
+            'warmup': True,
+        }
+        self._requests = 0
+        self._connections_opened = 0
+
+    def init_app(self, app):
+        """Read pool settings from the app config."""
+        self._settings.update({
+            'max_connections': app.config['LLM_POOL_MAX_CONNECTIONS'],
+            'max_keepalive_connections': app.config['LLM_POOL_MAX_KEEPALIVE'],
+            'keepalive_expiry': app.config['LLM_POOL_KEEPALIVE_EXPIRY'],
+            'timeout': app.config['LLM_TIMEOUT'],
+            'http2': app.config['LLM_HTTP2'],
+        })
+        self._failover.update({
+            'providers': [p.strip() for p in app.config['LLM_PROVIDERS'].split(',') if p.strip()],
+            'timeout': app.config['LLM_PROVIDER_TIMEOUT'],
+            'hedge_quantile': app.config['LLM_HEDGE_QUANTILE'],
+            'hedge_min_samples': app.config['LLM_HEDGE_MIN_SAMPLES'],
+            'hedge_min_delay': app.config['LLM_HEDGE_MIN_DELAY'],
+        })
+        self._ollama.update({
+            'affinity': app.config['OLLAMA_AFFINITY'],
+            'affinity_slack': app.config['OLLAMA_AFFINITY_SLACK'],
+            'probe_interval': app.config['OLLAMA_PROBE_INTERVAL'],
+            'slow_after': app.config['OLLAMA_PROBE_SLOW'],
+            'warmup': app.config['OLLAMA_WARMUP'],
+        })
+        app.extensions['llm_registry'] = self
+
+    def default_name(self) -> str:
+        """Returns 'failover' if LLM_PROVIDERS is set, 'ollama' if OLLAMA_HOST is set, else 'groq'."""
+        if self._failover['providers']:
+            return 'failover'
+        return 'ollama' if os.environ.get('OLLAMA_HOST') else 'groq'
+
+    def get(self, name: Optional[str] = None) -> LLMProvider:
+        """Return the cached provider, building it on first use."""
+        name = name or self.default_name()
+        provider = self._providers.get(name)
+        if provider is not None:
+            return provider
+
+        with self._lock:
+            provider = self._providers.get(name)
+            if provider is None:
+                logger.info(f"Building LLM provider '{name}'")
+                provider = self.build(name)
+                self._providers[name] = provider
+        return provider
+
+    def build(self, name: str) -> LLMProvider:
+        """Construct a provider bound to the shared HTTP client."""
+        if name == 'groq':
+            return GroqProvider(http_client=self.http_client())
+        if name == 'ollama':
+            settings = {k: v for k, v in self._ollama.items() if k != 'warmup'}
+            pool = OllamaPool.from_hosts(os.environ.get('OLLAMA_HOST', 'http://localhost:11434'), **settings)
+            return OllamaProvider(client=self.http_client(), pool=pool)
+        if name == 'failover':
+            return self._build_failover()
+        raise ValueError(f"Unknown LLM provider: {name}")
+
+    def _build_failover(self) -> FailoverProvider:
+        # Imported here: the scheduler looks up the default provider in this module
+        from .scheduler import llm_scheduler
+
+        # Entries are 'name' or 'name:timeout' (seconds to the first token)
+        settings = self._failover
+        slots = []
+        for entry in settings['providers']:
+            name, _, timeout = entry.partition(':')
+            slots.append(ProviderSlot(
+                name=name,
+                provider=self.get(name),
+                timeout=float(timeout) if timeout else settings['timeout']
+            ))
+        return FailoverProvider(
+            slots,
+            hedge_quantile=settings['hedge_quantile'],
+            hedge_min_samples=settings['hedge_min_samples'],
+            hedge_min_delay=settings['hedge_min_delay'],
+            scheduler=llm_scheduler,
+        )
+
+    def uses_ollama(self) -> bool:
+        """True if the default provider is Ollama or a failover chain including it."""
+        names = self._failover['providers'] or [self.default_name()]
+        return any(entry.partition(':')[0] == 'ollama' for entry in names)
+
+    def warmup(self):
+        """Start Ollama health probes and load the model on every node.
+
+        Called once per worker process; the model load runs on a daemon
+        thread so the worker starts serving right away.
+        """
+        if not self.uses_ollama():
+            return
+        provider = self.get('ollama')
+        pool = provider.pool
+        pool.start_probes(self.http_client())
+        if self._ollama['warmup']:
+            threading.Thread(
+                target=pool.warmup,
+                args=(self.http_client(), provider.model, provider.keep_alive),
+                name='ollama-warmup',
+                daemon=True
+            ).start()
+
+    def register(self, name: str, provider: LLMProvider):
+        """Install a prebuilt provider (used by tests and custom setups)."""
+        with self._lock:
+            self._providers[name] = provider
+
+    def http_client(self) -> httpx.Client:
+        """Return the shared pooled client, creating it lazily."""
+        client = self._client
+        if client is not None:
+            return client
+        with self._lock:
+            if self._client is None:
+                self._client = self._make_client()
+            return self._client
+
+    def _make_client(self) -> httpx.Client:
+        settings = self._settings
+        http2 = settings['http2']
+        if http2:
+            try:
+                import h2  # noqa: F401
+            except ImportError:
+                logger.warning("LLM_HTTP2 enabled but 'h2' is not installed, using HTTP/1.1")
+                http2 = False
+
+        return httpx.Client(
+            timeout=settings['timeout'],
+            http2=http2,
+            limits=httpx.Limits(
+                max_connections=settings['max_connections'],
+                max_keepalive_connections=settings['max_keepalive_connections'],
+                keepalive_expiry=settings['keepalive_expiry'],
+            ),
+            event_hooks={'request': [self._on_request]},
+        )
+
+    def _on_request(self, request: httpx.Request):
+        with self._lock:
+            self._requests += 1
+        upstream_requests.inc()
+        request.extensions['trace'] = self._trace
+
+    def _trace(self, event_name: str, info: dict):
+        if event_name == 'connection.connect_tcp.complete':
+            with self._lock:
+                self._connections_opened += 1
+            upstream_connections.inc()
+
+    def stats(self) -> dict:
+        """Pool usage counters for this worker."""
+        with self._lock:
+            requests = self._requests
+            opened = self._connections_opened
+            providers = sorted(self._providers)
+        return {
+            'providers': providers,
+            'requests': requests,
+            'connections_opened': opened,
+            'connections_reused': max(requests - opened, 0),
+            'reuse_ratio': round(1 - opened / requests, 4) if requests else 0.0,
+        }
+
+    def close(self):
+        """Drop cached providers and close pooled connections."""
+        with self._lock:
+            for provider in self._providers.values():
+                pool = getattr(provider, 'pool', None)
+                if pool is not None:
+                    pool.stop()
+            self._providers.clear()
+            if self._client is not None:
+                self._client.close()
+                self._client = None
+
+
+provider_registry = ProviderRegistry()
+atexit.register(provider_registry.close)
+
+
+def get_llm_provider() -> LLMProvider:
+    """Returns the shared default provider (failover chain, Ollama or Groq)."""
+    return provider_registry.get()
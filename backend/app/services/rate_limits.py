@@ -0,0 +1,263 @@
+"""Per-user request rate limits and rolling daily token quotas.
+
+Each message request takes one token from the user's bucket, which refills
+at ``RATE_LIMIT_PER_MINUTE`` up to ``RATE_LIMIT_BURST``. The LLM tokens of
+each completed turn (prompt plus reply, estimated) are added to hourly
+usage buckets; once the last 24 hours add up to the daily quota, new
+messages are refused until the oldest hour ages out. Staff accounts
+(``User.is_staff``) get their own limits. The ``memory`` backend keeps the
+state per worker (a lock and a dict lookup per check); ``sqlite`` shares it
+between the workers of a host.
+"""
+import logging
+import math
+import sqlite3
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+from ..utils.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+QUOTA_WINDOW = 86400  # seconds of usage counted against the daily quota
+USAGE_BUCKET = 3600  # usage is kept per hour
+
+rate_limited = registry.counter('rate_limited_total', 'Message requests refused by rate limits', ['reason'])
+tokens_recorded = registry.counter('rate_limit_tokens_total', 'LLM tokens counted against user quotas')
+
+
+class RateLimited(Exception):
+    """The user is over a limit; retry after ``retry_after`` seconds."""
+
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+@dataclass(frozen=True)
+class Limits:
+    """Limits of one class of users (0 disables a limit)."""
+    per_minute: float
+    burst: int
+    daily_tokens: int
+
+
+class MemoryRateLimitBackend:
+    """Buckets and usage in this worker process."""
+
+    def __init__(self):
+        self._buckets = {}  # key -> [tokens, updated_at]
+        self._usage = {}  # user_id -> deque of [hour, tokens]
+        self._lock = threading.Lock()
+
+    def take(self, key: str, rate: float, burst: int) -> float:
+        """Take one token; returns 0 or the seconds until one is available."""
+        now = time.monotonic()
+        with self._lock:
+            state = self._buckets.get(key)
+            if state is None:
+                state = self._buckets[key] = [float(burst), now]
+            tokens = min(float(burst), state[0] + (now - state[1]) * rate)
+            state[1] = now
+            if tokens >= 1:
+                state[0] = tokens - 1
+                return 0.0
+            state[0] = tokens
+            return (1 - tokens) / rate
+
+    def give_back(self, key: str, burst: int):
+        """Return a token taken by a request that was refused later on."""
+        with self._lock:
+            state = self._buckets.get(key)
+            if state is not None:
+                state[0] = min(float(burst), state[0] + 1)
+
+    def add_usage(self, user_id: int, tokens: int):
+        hour = int(time.time() // USAGE_BUCKET)
+        with self._lock:
+            usage = self._usage.setdefault(user_id, deque())
+            if usage and usage[-1][0] == hour:
+                usage[-1][1] += tokens
+            else:
+                usage.append([hour, tokens])
+
+    def usage(self, user_id: int) -> Tuple[int, Optional[float]]:
+        """Tokens used in the window and when the oldest of them stop counting."""
+        first = int(time.time() // USAGE_BUCKET) - QUOTA_WINDOW // USAGE_BUCKET + 1
+        with self._lock:
+            usage = self._usage.get(user_id)
+            if not usage:
+                return 0, None
+            while usage and usage[0][0] < first:
+                usage.popleft()
+            if not usage:
+                return 0, None
+            return sum(tokens for _, tokens in usage), usage[0][0] * USAGE_BUCKET + QUOTA_WINDOW
+
+    def close(self):
+        pass
+
+
+class SQLiteRateLimitBackend:
+    """Buckets and usage in a SQLite file shared by the workers of a host."""
+
+    def __init__(self, path: str):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(path), check_same_thread=False, timeout=5.0, isolation_level=None)
+        with self._lock:
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('PRAGMA synchronous=NORMAL')
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS rate_buckets ('
+                'key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated_at REAL NOT NULL)'
+            )
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS token_usage ('
+                'user_id INTEGER NOT NULL, hour INTEGER NOT NULL, tokens INTEGER NOT NULL, '
+                'PRIMARY KEY (user_id, hour))'
+            )
+
+    def take(self, key: str, rate: float, burst: int) -> float:
+        now = time.time()
+        with self._lock:
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                row = self._conn.execute(
+                    'SELECT tokens, updated_at FROM rate_buckets WHERE key = ?', (key,)
+                ).fetchone()
+                tokens = float(burst) if row is None else min(float(burst), row[0] + max(now - row[1], 0) * rate)
+                wait = 0.0 if tokens >= 1 else (1 - tokens) / rate
+                if not wait:
+                    tokens -= 1
+                self._conn.execute(
+                    'INSERT OR REPLACE INTO rate_buckets (key, tokens, updated_at) VALUES (?, ?, ?)',
+                    (key, tokens, now)
+                )
+            except BaseException:
+                self._conn.execute('ROLLBACK')
+                raise
+            self._conn.execute('COMMIT')
+        return wait
+
+    def give_back(self, key: str, burst: int):
+        with self._lock:
+            self._conn.execute(
+                'UPDATE rate_buckets SET tokens = MIN(?, tokens + 1) WHERE key = ?', (float(burst), key)
+            )
+
+    def add_usage(self, user_id: int, tokens: int):
+        hour = int(time.time() // USAGE_BUCKET)
+        with self._lock:
+            self._conn.execute(
+                'INSERT INTO token_usage (user_id, hour, tokens) VALUES (?, ?, ?) '
+                'ON CONFLICT (user_id, hour) DO UPDATE SET tokens = tokens + excluded.tokens',
+                (user_id, hour, tokens)
+            )
+            self._conn.execute(
+                'DELETE FROM token_usage WHERE hour < ?', (hour - QUOTA_WINDOW // USAGE_BUCKET,)
+            )
+
+    def usage(self, user_id: int) -> Tuple[int, Optional[float]]:
+        first = int(time.time() // USAGE_BUCKET) - QUOTA_WINDOW // USAGE_BUCKET + 1
+        with self._lock:
+            total, oldest = self._conn.execute(
+                'SELECT SUM(tokens), MIN(hour) FROM token_usage WHERE user_id = ? AND hour >= ?',
+                (user_id, first)
+            ).fetchone()
+        if not total:
+            return 0, None
+        return total, oldest * USAGE_BUCKET + QUOTA_WINDOW
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class RateLimiter:
+    """Checks and accounts per-user limits against the configured backend."""
+
+    def __init__(self):
+        self.enabled = True
+        self.backend = None
+        self.limits = {
+            'default': Limits(per_minute=10, burst=5, daily_tokens=200000),
+            'staff': Limits(per_minute=60, burst=20, daily_tokens=0),
+        }
+
+    def init_app(self, app):
+        """Build the configured backend and read the limits."""
+        self.enabled = app.config['RATE_LIMIT_ENABLED']
+        self.limits = {
+            'default': Limits(
+                per_minute=app.config['RATE_LIMIT_PER_MINUTE'],
+                burst=app.config['RATE_LIMIT_BURST'],
+                daily_tokens=app.config['TOKEN_QUOTA_DAILY'],
+            ),
+            'staff': Limits(
+                per_minute=app.config['RATE_LIMIT_STAFF_PER_MINUTE'],
+                burst=app.config['RATE_LIMIT_STAFF_BURST'],
+                daily_tokens=app.config['TOKEN_QUOTA_STAFF_DAILY'],
+            ),
+        }
+
+        kind = app.config['RATE_LIMIT_BACKEND']
+        if self.backend is not None:
+            self.backend.close()
+        if kind == 'memory':
+            self.backend = MemoryRateLimitBackend()
+        elif kind == 'sqlite':
+            self.backend = SQLiteRateLimitBackend(app.config['RATE_LIMIT_PATH'])
+        else:
+            raise ValueError(f"Unknown RATE_LIMIT_BACKEND: {kind}")
+        app.extensions['rate_limiter'] = self
+
+    def limits_for(self, user) -> Limits:
+        return self.limits['staff' if getattr(user, 'is_staff', False) else 'default']
+
+    def check(self, user):
+        """Take one request from ``user``'s budget; raises ``RateLimited``."""
+        if not self.enabled:
+            return
+        limits = self.limits_for(user)
+        # The quota is checked first so a refused request does not use up the rate
+        if limits.daily_tokens:
+            used, resets_at = self.backend.usage(user.id)
+            if used >= limits.daily_tokens:
+                rate_limited.labels(reason='token_quota').inc()
+                raise RateLimited('token_quota', max(math.ceil(resets_at - time.time()), 1))
+        if limits.per_minute:
+            wait = self.backend.take(f'user:{user.id}', limits.per_minute / 60.0, max(limits.burst, 1))
+            if wait:
+                rate_limited.labels(reason='rate').inc()
+                raise RateLimited('rate', max(math.ceil(wait), 1))
+
+    def refund(self, user):
+        """Give back the request ``check`` took when admission refuses it afterwards."""
+        if not self.enabled:
+            return
+        limits = self.limits_for(user)
+        if limits.per_minute:
+            self.backend.give_back(f'user:{user.id}', max(limits.burst, 1))
+
+    def record(self, user_id: Optional[int], tokens: int):
+        """Count LLM tokens used by ``user_id`` against the daily quota."""
+        if not self.enabled or user_id is None or tokens <= 0:
+            return
+        self.backend.add_usage(user_id, tokens)
+        tokens_recorded.inc(tokens)
+
+    def usage(self, user) -> dict:
+        """Quota state of ``user`` as seen by this backend."""
+        used, resets_at = self.backend.usage(user.id)
+        return {
+            'tokens_used': used,
+            'daily_tokens': self.limits_for(user).daily_tokens,
+            'resets_at': resets_at,
+        }
+
+
+rate_limiter = RateLimiter()
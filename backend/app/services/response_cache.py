@@ -0,0 +1,312 @@
+"""Exact-match cache for LLM completions.
+
+Misses go through ``single_flight``, so identical concurrent requests share
+one upstream call even when they are not cacheable.
+"""
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Generator, List, Optional
+
+from ..utils.metrics import registry
+from .llm_providers import CancelToken, LLMProvider
+from .single_flight import single_flight
+
+logger = logging.getLogger(__name__)
+
+cache_lookups = registry.counter(
+    'llm_cache_lookups_total',
+    'LLM response cache lookups (skipped: temperature above LLM_CACHE_MAX_TEMPERATURE)',
+    ['result']
+)
+
+REPLAY_CHUNK_SIZE = 32
+
+
+def make_cache_key(model: str, messages: List[dict], temperature: float, max_tokens: int) -> str:
+    """Canonical hash of everything that determines a completion."""
+    payload = {
+        'model': model,
+        'messages': [{'role': m['role'], 'content': m['content']} for m in messages],
+        'temperature': round(float(temperature), 4),
+        'max_tokens': int(max_tokens),
+    }
+    canonical = json.dumps(payload, sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+class MemoryCacheBackend:
+    """In-process LRU with per-entry TTL."""
+
+    def __init__(self, max_entries: int = 1024, ttl: float = 3600.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: str):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key: str):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def close(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class SQLiteCacheBackend:
+    """On-disk cache shared by every worker on the host."""
+
+    def __init__(self, path: str, max_entries: int = 1024, ttl: float = 3600.0, table: str = 'llm_cache'):
+        if not table.isidentifier():
+            raise ValueError(f"Invalid cache table name: {table}")
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.table = table
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(path), check_same_thread=False, timeout=5.0)
+        with self._lock, self._conn:
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('PRAGMA synchronous=NORMAL')
+            self._conn.execute(
+                f'CREATE TABLE IF NOT EXISTS {table} ('
+                'key TEXT PRIMARY KEY, value TEXT NOT NULL, '
+                'expires_at REAL NOT NULL, accessed_at REAL NOT NULL)'
+            )
+            self._conn.execute(
+                f'CREATE INDEX IF NOT EXISTS ix_{table}_accessed_at ON {table} (accessed_at)'
+            )
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                f'SELECT value, expires_at FROM {self.table} WHERE key = ?', (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if row[1] < now:
+                self._conn.execute(f'DELETE FROM {self.table} WHERE key = ?', (key,))
+                return None
+            self._conn.execute(f'UPDATE {self.table} SET accessed_at = ? WHERE key = ?', (now, key))
+            return row[0]
+
+    def set(self, key: str, value: str):
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                f'INSERT OR REPLACE INTO {self.table} (key, value, expires_at, accessed_at) '
+                'VALUES (?, ?, ?, ?)',
+                (key, value, now + self.ttl, now)
+            )
+            self._conn.execute(f'DELETE FROM {self.table} WHERE expires_at < ?', (now,))
+            self._conn.execute(
+                f'DELETE FROM {self.table} WHERE key IN ('
+                f'SELECT key FROM {self.table} ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)',
+                (self.max_entries,)
+            )
+
+    def delete(self, key: str):
+        with self._lock, self._conn:
+            self._conn.execute(f'DELETE FROM {self.table} WHERE key = ?', (key,))
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute(f'SELECT COUNT(*) FROM {self.table}').fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class ResponseCache:
+    """Wraps provider calls with an exact-match completion cache.
+
+    Only requests at or below ``LLM_CACHE_MAX_TEMPERATURE`` are cached, since
+    sampling at higher temperatures is not expected to be repeatable.
+    """
+
+    def __init__(self):
+        self.backend = None
+        self.max_temperature = 0.0
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()  # counters are bumped from request and job threads
+
+    def init_app(self, app):
+        """Build the configured backend."""
+        kind = app.config['LLM_CACHE_BACKEND']
+        ttl = app.config['LLM_CACHE_TTL']
+        max_entries = app.config['LLM_CACHE_MAX_ENTRIES']
+        self.max_temperature = app.config['LLM_CACHE_MAX_TEMPERATURE']
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+
+        if self.backend is not None:
+            self.backend.close()
+        if kind == 'memory':
+            self.backend = MemoryCacheBackend(max_entries=max_entries, ttl=ttl)
+        elif kind == 'sqlite':
+            self.backend = SQLiteCacheBackend(
+                app.config['LLM_CACHE_PATH'], max_entries=max_entries, ttl=ttl
+            )
+        elif kind == 'none':
+            self.backend = None
+        else:
+            raise ValueError(f"Unknown LLM_CACHE_BACKEND: {kind}")
+        if self.backend is not None and app.config['LLM_TEMPERATURE'] > self.max_temperature:
+            logger.info(
+                "LLM response cache only serves requests at temperature <= %s; "
+                "replies at LLM_TEMPERATURE=%s are not cached",
+                self.max_temperature, app.config['LLM_TEMPERATURE']
+            )
+        app.extensions['llm_response_cache'] = self
+
+    def key_for(
+        self,
+        llm: LLMProvider,
+        messages: List[dict],
+        temperature: float,
+        max_tokens: int
+    ) -> Optional[str]:
+        """Cache key for a request, or None if it should not be cached."""
+        if self.backend is None or temperature > self.max_temperature:
+            return None
+        model = getattr(llm, 'model', type(llm).__name__)
+        return make_cache_key(model, messages, temperature, max_tokens)
+
+    def lookup(self, key: Optional[str]) -> Optional[str]:
+        if key is None:
+            if self.backend is not None:
+                cache_lookups.labels(result='skipped').inc()
+            return None
+        value = self.backend.get(key)
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        cache_lookups.labels(result='miss' if value is None else 'hit').inc()
+        return value
+
+    def store(self, key: Optional[str], value: str):
+        if key is not None and value:
+            self.backend.set(key, value)
+
+    def flight_key(
+        self,
+        llm: LLMProvider,
+        messages: List[dict],
+        temperature: float,
+        max_tokens: int,
+        key: Optional[str]
+    ) -> Optional[str]:
+        """Single-flight key (any temperature), or None if coalescing is off."""
+        if not single_flight.enabled:
+            return None
+        if key is not None:
+            return key
+        model = getattr(llm, 'model', type(llm).__name__)
+        return make_cache_key(model, messages, temperature, max_tokens)
+
+    def chat(
+        self,
+        llm: LLMProvider,
+        messages: List[dict],
+        temperature: float = 0.7,
+        max_tokens: int = 500
+    ) -> str:
+        """``llm.chat`` served from the cache when possible."""
+        key = self.key_for(llm, messages, temperature, max_tokens)
+        cached = self.lookup(key)
+        if cached is not None:
+            return cached
+
+        def call():
+            content = llm.chat(messages, temperature=temperature, max_tokens=max_tokens)
+            self.store(key, content)
+            return content
+
+        flight_key = self.flight_key(llm, messages, temperature, max_tokens, key)
+        if flight_key is None:
+            return call()
+        return single_flight.do(flight_key, call)
+
+    def chat_stream(
+        self,
+        llm: LLMProvider,
+        messages: List[dict],
+        temperature: float = 0.7,
+        max_tokens: int = 500,
+        cancel: Optional[CancelToken] = None
+    ) -> Generator[str, None, None]:
+        """``llm.chat_stream`` that replays cached answers as chunks.
+
+        A streamed answer is only stored once the upstream stream completes
+        without being cancelled. With single-flight, ``cancel`` detaches this
+        caller and the upstream stops once no caller is left.
+        """
+        key = self.key_for(llm, messages, temperature, max_tokens)
+        cached = self.lookup(key)
+        if cached is not None:
+            for start in range(0, len(cached), REPLAY_CHUNK_SIZE):
+                if cancel is not None and cancel.cancelled:
+                    return
+                yield cached[start:start + REPLAY_CHUNK_SIZE]
+            return
+
+        def upstream(token: Optional[CancelToken]):
+            parts = []
+            for chunk in llm.chat_stream(messages, temperature=temperature, max_tokens=max_tokens, cancel=token):
+                parts.append(chunk)
+                yield chunk
+            if token is None or not token.cancelled:
+                self.store(key, ''.join(parts))
+
+        flight_key = self.flight_key(llm, messages, temperature, max_tokens, key)
+        if flight_key is None:
+            yield from upstream(cancel)
+        else:
+            yield from single_flight.stream(flight_key, upstream, cancel=cancel)
+
+    def stats(self) -> dict:
+        """Hit/miss counters for this worker."""
+        with self._lock:
+            hits, misses = self.hits, self.misses
+        lookups = hits + misses
+        return {
+            'backend': type(self.backend).__name__ if self.backend else None,
+            'entries': len(self.backend) if self.backend else 0,
+            'hits': hits,
+            'misses': misses,
+            'hit_ratio': round(hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+response_cache = ResponseCache()
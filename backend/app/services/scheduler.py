@@ -0,0 +1,246 @@
+"""Fair-share admission to the LLM provider.
+
+Each provider gets ``LLM_CONCURRENCY`` slots per worker process. Requests
+beyond that wait in a queue per priority class (staff before everyone else)
+and, within a class, per user: free slots go round-robin across users, so
+one account firing many requests cannot push the others back. A request
+is refused with ``SchedulerFull`` when the queue (or the user's share of it)
+is full, or when it waited ``LLM_QUEUE_TIMEOUT`` seconds without a slot.
+
+With ``LLM_PROVIDERS`` the default provider is ``failover``: its lane is the
+fair-share admission of whole requests, and each provider attempt the
+chain makes (hedges included) also takes a slot of that provider's own lane,
+so caps such as ``ollama:2`` still hold.
+"""
+import logging
+import math
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Dict, Optional
+
+from ..utils.metrics import registry
+from .provider_registry import provider_registry
+
+logger = logging.getLogger(__name__)
+
+PRIORITIES = ('staff', 'default')  # served in this order
+
+WAIT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0)
+
+queue_depth = registry.gauge(
+    'llm_scheduler_queue_depth', 'Requests waiting for an LLM slot', ['provider', 'priority']
+)
+active_slots = registry.gauge('llm_scheduler_active', 'LLM slots in use', ['provider'])
+queue_wait = registry.histogram(
+    'llm_scheduler_wait_seconds', 'Time waited for an LLM slot', ['provider', 'priority'], buckets=WAIT_BUCKETS
+)
+rejected = registry.counter(
+    'llm_scheduler_rejected_total', 'Requests refused an LLM slot', ['provider', 'reason']
+)
+
+
+class SchedulerFull(Exception):
+    """No LLM slot for this request; retry after ``retry_after`` seconds."""
+
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class Ticket:
+    """A granted slot; release it (or leave the ``with`` block) when done."""
+
+    def __init__(self, lane: Optional['_Lane'] = None, granted_at: Optional[float] = None):
+        self._lane = lane
+        self._granted_at = time.monotonic() if granted_at is None else granted_at
+        self._released = False
+
+    def release(self):
+        if self._released:
+            return
+        self._released = True
+        if self._lane is not None:
+            self._lane.release(self._granted_at)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+class _Waiter:
+    def __init__(self, user_id):
+        self.user_id = user_id
+        self.granted = threading.Event()
+        self.granted_at = 0.0
+
+
+class _Lane:
+    """Slots and queues of one provider."""
+
+    def __init__(self, scheduler: 'FairScheduler', provider: str, limit: int):
+        self.scheduler = scheduler
+        self.provider = provider
+        self.limit = limit
+        self.active = 0
+        self.queued = 0
+        self.avg_hold = 5.0  # seconds, moving average of slot hold times
+        self._granted_sum = 0.0  # grant times of the active slots, for their mean age
+        self._queues: Dict[str, OrderedDict] = {p: OrderedDict() for p in PRIORITIES}
+        self._lock = threading.Lock()
+
+    def retry_after(self) -> int:
+        """Rough seconds until a slot frees for a request queued now."""
+        return max(1, math.ceil(self.avg_hold * (self.queued + 1) / self.limit))
+
+    def _reject(self, reason: str):
+        rejected.labels(provider=self.provider, reason=reason).inc()
+        raise SchedulerFull(reason, self.retry_after())
+
+    def acquire(self, user_id, priority: str) -> Ticket:
+        start = time.monotonic()
+        with self._lock:
+            if self.active < self.limit and not self.queued:
+                self.active += 1
+                self._granted_sum += start
+                active_slots.labels(provider=self.provider).inc()
+                queue_wait.labels(provider=self.provider, priority=priority).observe(0.0)
+                return Ticket(self, start)
+            if self.queued >= self.scheduler.max_queue:
+                self._reject('queue_full')
+            users = self._queues[priority]
+            if len(users.get(user_id, ())) >= self.scheduler.max_queue_per_user:
+                self._reject('user_queue_full')
+            waiter = _Waiter(user_id)
+            users.setdefault(user_id, deque()).append(waiter)
+            self.queued += 1
+            queue_depth.labels(provider=self.provider, priority=priority).inc()
+
+        if not waiter.granted.wait(self.scheduler.max_wait):
+            with self._lock:
+                # A slot may have been granted between the timeout and the lock
+                if not waiter.granted.is_set():
+                    self._remove(users, waiter, priority)
+                    self._reject('timeout')
+        queue_wait.labels(provider=self.provider, priority=priority).observe(waiter.granted_at - start)
+        return Ticket(self, waiter.granted_at)
+
+    def _remove(self, users: OrderedDict, waiter: _Waiter, priority: str):
+        pending = users[waiter.user_id]
+        pending.remove(waiter)
+        if not pending:
+            del users[waiter.user_id]
+        self.queued -= 1
+        queue_depth.labels(provider=self.provider, priority=priority).dec()
+
+    def release(self, granted_at: float):
+        with self._lock:
+            self.avg_hold = 0.8 * self.avg_hold + 0.2 * (time.monotonic() - granted_at)
+            self.active -= 1
+            self._granted_sum = self._granted_sum - granted_at if self.active else 0.0
+            active_slots.labels(provider=self.provider).dec()
+            self._dispatch()
+
+    def _dispatch(self):
+        # Caller holds the lock
+        now = time.monotonic()
+        for priority in PRIORITIES:
+            users = self._queues[priority]
+            while users and self.active < self.limit:
+                user_id, pending = next(iter(users.items()))
+                waiter = pending.popleft()
+                if pending:
+                    users.move_to_end(user_id)
+                else:
+                    del users[user_id]
+                self.queued -= 1
+                queue_depth.labels(provider=self.provider, priority=priority).dec()
+                self.active += 1
+                self._granted_sum += now
+                active_slots.labels(provider=self.provider).inc()
+                waiter.granted_at = now
+                waiter.granted.set()
+
+    def stats(self) -> dict:
+        """``avg_hold`` covers finished calls; ``inflight_hold`` is the mean age of running ones."""
+        with self._lock:
+            inflight_hold = time.monotonic() - self._granted_sum / self.active if self.active else 0.0
+            return {
+                'limit': self.limit,
+                'active': self.active,
+                'avg_hold': round(self.avg_hold, 3),
+                'inflight_hold': round(inflight_hold, 3),
+                'queued': {p: sum(len(q) for q in self._queues[p].values()) for p in PRIORITIES},
+            }
+
+
+class FairScheduler:
+    """Per-provider concurrency caps with fair, prioritised queues.
+
+    Slots and queues live in the worker process, so the effective cap on a
+    provider is ``LLM_CONCURRENCY`` times the number of gunicorn workers
+    (and Celery worker processes).
+    """
+
+    def __init__(self):
+        self.enabled = True
+        self.default_limit = 8
+        self.limits: Dict[str, int] = {}
+        self.max_queue = 64
+        self.max_queue_per_user = 2
+        self.max_wait = 15.0
+        self._lanes: Dict[str, _Lane] = {}
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.enabled = app.config['LLM_SCHEDULER']
+        self.default_limit = app.config['LLM_CONCURRENCY_DEFAULT']
+        # 'name:limit' entries, e.g. 'ollama:2,groq:16'
+        self.limits = {}
+        for entry in app.config['LLM_CONCURRENCY'].split(','):
+            name, _, limit = entry.strip().partition(':')
+            if name and limit:
+                self.limits[name] = int(limit)
+        self.max_queue = app.config['LLM_QUEUE_MAX']
+        self.max_queue_per_user = app.config['LLM_QUEUE_PER_USER']
+        self.max_wait = app.config['LLM_QUEUE_TIMEOUT']
+        self._lanes = {}
+        app.extensions['llm_scheduler'] = self
+
+    @staticmethod
+    def priority_for(user) -> str:
+        return 'staff' if getattr(user, 'is_staff', False) else 'default'
+
+    def _lane(self, provider: str) -> _Lane:
+        lane = self._lanes.get(provider)
+        if lane is None:
+            with self._lock:
+                lane = self._lanes.get(provider)
+                if lane is None:
+                    limit = self.limits.get(provider, self.default_limit)
+                    lane = self._lanes[provider] = _Lane(self, provider, max(limit, 1))
+        return lane
+
+    def acquire(self, user_id, priority: str = 'default', provider: Optional[str] = None) -> Ticket:
+        """Wait for a slot on ``provider`` (the default one if omitted).
+
+        Raises ``SchedulerFull`` when the request cannot be queued or waited
+        too long.
+        """
+        if not self.enabled:
+            return Ticket()
+        if priority not in PRIORITIES:
+            raise ValueError(f"Unknown priority: {priority}")
+        if provider is None:
+            provider = provider_registry.default_name()
+        return self._lane(provider).acquire(user_id, priority)
+
+    def stats(self) -> dict:
+        """Slots in use and queued requests per provider."""
+        return {name: lane.stats() for name, lane in list(self._lanes.items())}
+
+
+llm_scheduler = FairScheduler()
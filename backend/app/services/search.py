@@ -0,0 +1,262 @@
+"""Full-text search over conversation titles and messages.
+
+SQLite uses external-content FTS5 tables kept in sync by triggers; PostgreSQL
+uses GIN expression indexes over ``to_tsvector``, which the database maintains
+on every write. Both are exposed through ``SearchBackend``.
+"""
+import html
+import re
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import List
+
+from flask import current_app, has_app_context
+from sqlalchemy import event, text
+
+from ..extensions import db
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+MARK_START = '<mark>'
+MARK_END = '</mark>'
+# The databases delimit matches with these private-use characters; the
+# snippet is HTML-escaped before they become MARK_START/MARK_END
+HIT_START = '\ue000'
+HIT_END = '\ue001'
+
+
+@dataclass
+class SearchHit:
+    """Best match for one conversation."""
+    conversation_id: int
+    snippet: str
+    rank: float
+
+
+def highlight(snippet: str) -> str:
+    """Escape a database snippet and turn its hit delimiters into ``<mark>`` tags."""
+    return html.escape(snippet or '').replace(HIT_START, MARK_START).replace(HIT_END, MARK_END)
+
+
+def query_terms(query: str) -> List[str]:
+    """Split user input into plain word tokens (no operator injection)."""
+    return TOKEN_RE.findall(query.lower())[:16]
+
+
+class SearchBackend(ABC):
+    """Dialect-specific index management and ranked search."""
+
+    @abstractmethod
+    def install(self, connection):
+        """Create index objects if they do not exist."""
+        pass
+
+    @abstractmethod
+    def uninstall(self, connection):
+        """Drop index objects."""
+        pass
+
+    @abstractmethod
+    def rebuild(self, connection):
+        """(Re)create index objects from the current settings and re-index every row."""
+        pass
+
+    @abstractmethod
+    def search(self, connection, user_id: int, query: str, limit: int, offset: int) -> List[SearchHit]:
+        """Conversations of ``user_id`` matching ``query``, best first."""
+        pass
+
+
+class SQLiteSearchBackend(SearchBackend):
+    """FTS5 external-content tables over ``messages`` and ``conversations``."""
+
+    DDL = [
+        "CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5("
+        "content, content='messages', content_rowid='id', "
+        "tokenize='unicode61 remove_diacritics 2')",
+        "CREATE VIRTUAL TABLE IF NOT EXISTS conversations_fts USING fts5("
+        "title, content='conversations', content_rowid='id', "
+        "tokenize='unicode61 remove_diacritics 2')",
+        "CREATE TRIGGER IF NOT EXISTS messages_fts_ai AFTER INSERT ON messages BEGIN "
+        "INSERT INTO messages_fts(rowid, content) VALUES (new.id, new.content); END",
+        "CREATE TRIGGER IF NOT EXISTS messages_fts_ad AFTER DELETE ON messages BEGIN "
+        "INSERT INTO messages_fts(messages_fts, rowid, content) "
+        "VALUES ('delete', old.id, old.content); END",
+        "CREATE TRIGGER IF NOT EXISTS messages_fts_au AFTER UPDATE OF content ON messages BEGIN "
+        "INSERT INTO messages_fts(messages_fts, rowid, content) "
+        "VALUES ('delete', old.id, old.content); "
+        "INSERT INTO messages_fts(rowid, content) VALUES (new.id, new.content); END",
+        "CREATE TRIGGER IF NOT EXISTS conversations_fts_ai AFTER INSERT ON conversations BEGIN "
+        "INSERT INTO conversations_fts(rowid, title) VALUES (new.id, new.title); END",
+        "CREATE TRIGGER IF NOT EXISTS conversations_fts_ad AFTER DELETE ON conversations BEGIN "
+        "INSERT INTO conversations_fts(conversations_fts, rowid, title) "
+        "VALUES ('delete', old.id, old.title); END",
+        "CREATE TRIGGER IF NOT EXISTS conversations_fts_au AFTER UPDATE OF title ON conversations BEGIN "
+        "INSERT INTO conversations_fts(conversations_fts, rowid, title) "
+        "VALUES ('delete', old.id, old.title); "
+        "INSERT INTO conversations_fts(rowid, title) VALUES (new.id, new.title); END",
+    ]
+
+    SEARCH_SQL = """
+        WITH hits AS (
+            SELECT c.id AS conversation_id,
+                   snippet(conversations_fts, 0, :hit_start, :hit_end, '…', 12) AS snippet,
+                   bm25(conversations_fts) * 2.0 AS rank
+            FROM conversations_fts
+            JOIN conversations c ON c.id = conversations_fts.rowid
+            WHERE conversations_fts MATCH :match AND c.user_id = :user_id
+            UNION ALL
+            SELECT m.conversation_id,
+                   snippet(messages_fts, 0, :hit_start, :hit_end, '…', 12),
+                   bm25(messages_fts)
+            FROM messages_fts
+            JOIN messages m ON m.id = messages_fts.rowid
+            JOIN conversations c ON c.id = m.conversation_id
+            WHERE messages_fts MATCH :match AND c.user_id = :user_id
+        ), ranked AS (
+            SELECT conversation_id, snippet, rank,
+                   ROW_NUMBER() OVER (PARTITION BY conversation_id ORDER BY rank) AS rn
+            FROM hits
+        )
+        SELECT conversation_id, snippet, rank FROM ranked
+        WHERE rn = 1
+        ORDER BY rank, conversation_id DESC
+        LIMIT :limit OFFSET :offset
+    """
+
+    def install(self, connection):
+        for statement in self.DDL:
+            connection.execute(text(statement))
+
+    def uninstall(self, connection):
+        for name in ('messages_fts', 'conversations_fts'):
+            connection.execute(text(f'DROP TABLE IF EXISTS {name}'))
+
+    def rebuild(self, connection):
+        self.install(connection)
+        for name in ('messages_fts', 'conversations_fts'):
+            connection.execute(text(f"INSERT INTO {name}({name}) VALUES ('rebuild')"))
+
+    def search(self, connection, user_id, query, limit, offset):
+        terms = query_terms(query)
+        if not terms:
+            return []
+        # Quote every term; the last one is a prefix so results follow typing
+        match = ' '.join(f'"{t}"' for t in terms[:-1]) + f' "{terms[-1]}"*'
+        rows = connection.execute(text(self.SEARCH_SQL), {
+            'match': match.strip(), 'user_id': user_id, 'limit': limit, 'offset': offset,
+            'hit_start': HIT_START, 'hit_end': HIT_END,
+        })
+        return [SearchHit(row.conversation_id, highlight(row.snippet), -row.rank) for row in rows]
+
+
+class PostgresSearchBackend(SearchBackend):
+    """GIN expression indexes over ``to_tsvector``.
+
+    The indexes are only used while their text search configuration equals
+    ``SEARCH_LANGUAGE``; after changing it, run ``manage.py reindex-search``.
+    """
+
+    def __init__(self, language: str = 'simple'):
+        if not re.fullmatch(r'[a-z_]+', language):
+            raise ValueError(f"Invalid text search configuration: {language}")
+        # Inlined (not bound) so the planner matches the expression indexes
+        self.language = language
+
+    def _vector(self, column: str) -> str:
+        return f"to_tsvector('{self.language}', coalesce({column}, ''))"
+
+    def install(self, connection):
+        connection.execute(text(
+            f"CREATE INDEX IF NOT EXISTS ix_messages_content_fts "
+            f"ON messages USING GIN ({self._vector('content')})"
+        ))
+        connection.execute(text(
+            f"CREATE INDEX IF NOT EXISTS ix_conversations_title_fts "
+            f"ON conversations USING GIN ({self._vector('title')})"
+        ))
+
+    def uninstall(self, connection):
+        connection.execute(text('DROP INDEX IF EXISTS ix_messages_content_fts'))
+        connection.execute(text('DROP INDEX IF EXISTS ix_conversations_title_fts'))
+
+    def rebuild(self, connection):
+        # Dropped first: an index built for another SEARCH_LANGUAGE would be
+        # kept by IF NOT EXISTS and never match the queries' expressions
+        self.uninstall(connection)
+        self.install(connection)
+
+    def search(self, connection, user_id, query, limit, offset):
+        terms = query_terms(query)
+        if not terms:
+            return []
+        tsquery = ' & '.join(terms[:-1] + [f'{terms[-1]}:*'])
+        lang = self.language
+        sql = f"""
+            WITH q AS (SELECT to_tsquery('{lang}', :tsquery) AS query),
+            hits AS (
+                SELECT c.id AS conversation_id, c.title AS body,
+                       ts_rank({self._vector('c.title')}, q.query) * 2.0 AS rank
+                FROM conversations c, q
+                WHERE c.user_id = :user_id AND {self._vector('c.title')} @@ q.query
+                UNION ALL
+                SELECT m.conversation_id, m.content,
+                       ts_rank({self._vector('m.content')}, q.query)
+                FROM messages m JOIN conversations c ON c.id = m.conversation_id, q
+                WHERE c.user_id = :user_id AND {self._vector('m.content')} @@ q.query
+            ), ranked AS (
+                SELECT conversation_id, body, rank,
+                       ROW_NUMBER() OVER (PARTITION BY conversation_id ORDER BY rank DESC) AS rn
+                FROM hits
+            ), page AS (
+                SELECT conversation_id, body, rank FROM ranked
+                WHERE rn = 1
+                ORDER BY rank DESC, conversation_id DESC
+                LIMIT :limit OFFSET :offset
+            )
+            SELECT page.conversation_id,
+                   ts_headline('{lang}', page.body, q.query, :headline_options) AS snippet,
+                   page.rank
+            FROM page, q
+            ORDER BY page.rank DESC, page.conversation_id DESC
+        """
+        rows = connection.execute(text(sql), {
+            'tsquery': tsquery, 'user_id': user_id, 'limit': limit, 'offset': offset,
+            'headline_options': f'StartSel={HIT_START},StopSel={HIT_END},MaxWords=24,MinWords=8',
+        })
+        return [SearchHit(row.conversation_id, highlight(row.snippet), row.rank) for row in rows]
+
+
+def get_search_backend(dialect_name: str, language: str = 'simple') -> SearchBackend:
+    """Search backend for a SQLAlchemy dialect name."""
+    if dialect_name == 'sqlite':
+        return SQLiteSearchBackend()
+    if dialect_name == 'postgresql':
+        return PostgresSearchBackend(language)
+    raise ValueError(f"Full-text search is not supported on {dialect_name}")
+
+
+def _configured_language() -> str:
+    return current_app.config['SEARCH_LANGUAGE'] if has_app_context() else 'simple'
+
+
+def search_conversations(user_id: int, query: str, limit: int, offset: int = 0) -> List[SearchHit]:
+    """Ranked conversation hits for the current database."""
+    backend = get_search_backend(db.engine.dialect.name, _configured_language())
+    return backend.search(db.session.connection(), user_id, query, limit, offset)
+
+
+def rebuild_search_index(connection):
+    """Recreate the index objects for the current settings and re-index all rows."""
+    get_search_backend(connection.dialect.name, _configured_language()).rebuild(connection)
+
+
+@event.listens_for(db.metadata, 'after_create')
+def _install_search_index(target, connection, **kw):
+    if connection.dialect.name in ('sqlite', 'postgresql'):
+        get_search_backend(connection.dialect.name, _configured_language()).install(connection)
+
+
+@event.listens_for(db.metadata, 'before_drop')
+def _uninstall_search_index(target, connection, **kw):
+    if connection.dialect.name in ('sqlite', 'postgresql'):
+        get_search_backend(connection.dialect.name, _configured_language()).uninstall(connection)
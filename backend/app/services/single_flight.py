@@ -0,0 +1,174 @@
+"""Single-flight coalescing of identical concurrent LLM requests.
+
+When many users send the same prompt at once (a question projected in
+class), only the first request goes upstream; the others wait for it and
+receive the same answer. Streams are fanned out: every subscriber reads the
+shared chunk buffer from the start, so late joiners catch up immediately.
+Coalescing is per worker process and only lasts while a request is in
+flight; repeats after it finishes go to the response cache (if cacheable)
+or upstream again.
+"""
+import logging
+import threading
+from typing import Callable, Dict, Iterator, List, Optional
+
+from ..utils.metrics import registry
+from .llm_providers import CancelToken
+
+logger = logging.getLogger(__name__)
+
+flight_requests = registry.counter(
+    'llm_single_flight_requests_total',
+    'LLM requests by single-flight role (leader calls upstream, follower shares it)',
+    ['mode', 'role']
+)
+flights_inflight = registry.gauge('llm_single_flight_inflight', 'Upstream LLM calls being shared', ['mode'])
+
+
+class _Flight:
+    def __init__(self):
+        self.cond = threading.Condition()
+        self.chunks: List[str] = []
+        self.result: Optional[str] = None
+        self.error: Optional[BaseException] = None
+        self.done = False
+        self.subscribers = 0
+        self.token = CancelToken()
+
+    def finish(self, error: Optional[BaseException] = None):
+        with self.cond:
+            self.error = error
+            self.done = True
+            self.cond.notify_all()
+
+
+class SingleFlight:
+    """Shares one upstream call between concurrent requests with the same key.
+
+    The upstream stream runs on its own thread, so it outlives any single
+    subscriber; it is only cancelled once every subscriber has left.
+    """
+
+    def __init__(self):
+        self.enabled = True
+        self._calls: Dict[str, _Flight] = {}
+        self._streams: Dict[str, _Flight] = {}
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.enabled = app.config['LLM_SINGLE_FLIGHT']
+        app.extensions['llm_single_flight'] = self
+
+    def do(self, key: str, call: Callable[[], str]) -> str:
+        """Return ``call()``, shared with concurrent callers of the same ``key``."""
+        with self._lock:
+            flight = self._calls.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._calls[key] = _Flight()
+        flight_requests.labels(mode='chat', role='leader' if leader else 'follower').inc()
+
+        if not leader:
+            with flight.cond:
+                flight.cond.wait_for(lambda: flight.done)
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        flights_inflight.labels(mode='chat').inc()
+        error = None
+        try:
+            flight.result = call()
+            return flight.result
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            flights_inflight.labels(mode='chat').dec()
+            flight.finish(error)
+
+    def stream(
+        self,
+        key: str,
+        start: Callable[[CancelToken], Iterator[str]],
+        cancel: Optional[CancelToken] = None
+    ) -> Iterator[str]:
+        """Chunks of ``start(token)``, shared with concurrent streams of ``key``.
+
+        ``cancel`` only detaches this subscriber; the shared upstream keeps
+        going while anyone else is still reading.
+        """
+        with self._lock:
+            flight = self._streams.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._streams[key] = _Flight()
+            flight.subscribers += 1
+        flight_requests.labels(mode='stream', role='leader' if leader else 'follower').inc()
+        if leader:
+            flights_inflight.labels(mode='stream').inc()
+            threading.Thread(
+                target=self._pump, args=(key, flight, start), name='llm-single-flight', daemon=True
+            ).start()
+
+        def wake():
+            with flight.cond:
+                flight.cond.notify_all()
+
+        def cancelled():
+            return cancel is not None and cancel.cancelled
+
+        if cancel is not None:
+            cancel.on_cancel(wake)
+        index = 0
+        try:
+            while True:
+                with flight.cond:
+                    flight.cond.wait_for(lambda: index < len(flight.chunks) or flight.done or cancelled())
+                    pending = flight.chunks[index:]
+                    done, error = flight.done, flight.error
+                for chunk in pending:
+                    if cancelled():
+                        return
+                    yield chunk
+                    index += 1
+                if cancelled():
+                    return
+                if done:
+                    if error is not None:
+                        raise error
+                    return
+        finally:
+            self._leave(key, flight)
+
+    def _leave(self, key: str, flight: _Flight):
+        with self._lock:
+            flight.subscribers -= 1
+            abandoned = flight.subscribers == 0 and not flight.done
+            if abandoned and self._streams.get(key) is flight:
+                del self._streams[key]  # a new request must not join a cancelled flight
+        if abandoned:
+            flight.token.cancel('abandoned')
+
+    def _pump(self, key: str, flight: _Flight, start: Callable[[CancelToken], Iterator[str]]):
+        error = None
+        try:
+            for chunk in start(flight.token):
+                with flight.cond:
+                    flight.chunks.append(chunk)
+                    flight.cond.notify_all()
+        except Exception as e:
+            if not flight.token.cancelled:
+                logger.warning("Shared LLM stream failed: %s", e)
+            error = e
+        finally:
+            with self._lock:
+                if self._streams.get(key) is flight:
+                    del self._streams[key]
+            flights_inflight.labels(mode='stream').dec()
+            flight.finish(error)
+
+
+single_flight = SingleFlight()
@@ -0,0 +1,549 @@
+"""Resumable, multi-subscriber generation jobs behind the SSE endpoints.
+
+Each streamed answer runs as a job on its own thread. The job writes numbered
+events into a bounded buffer, and HTTP responses only read from it. So a
+dropped connection does not stop the generation. A client reconnecting with
+``Last-Event-ID`` and any other tab on the conversation read the same events.
+When old chunk events are evicted from the buffer, a reader that is behind
+first gets a ``snapshot`` event holding the evicted text.
+
+A job is cancelled when it is stopped explicitly, or when its last reader
+has been gone for ``STREAM_CANCEL_GRACE`` seconds. Cancellation closes the
+upstream stream, and the partial answer is stored as a truncated message.
+
+The in-memory backend only serves readers in the same worker process. The
+SQLite backend shares jobs between all workers of a host.
+"""
+import json
+import logging
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from dataclasses import dataclass
+from typing import Dict, Iterator, List, Optional
+
+from flask import current_app
+
+from ..extensions import db
+from ..utils.fast_json import dumps
+from ..utils.metrics import registry
+from .context_builder import estimate_tokens
+from .deferred import deferred
+from .llm_providers import CancelToken
+from .messages import Turn, complete_turn, summarize_turn
+from .provider_registry import get_llm_provider
+from .response_cache import response_cache
+from .scheduler import Ticket
+from .streaming import ChunkCoalescer
+
+logger = logging.getLogger(__name__)
+
+stream_cancellations = registry.counter(
+    'llm_stream_cancellations_total', 'Generations cancelled before completion', ['provider', 'reason']
+)
+tokens_saved = registry.counter(
+    'llm_tokens_saved_total', 'Estimated completion tokens not generated due to cancellation', ['provider']
+)
+
+
+class JobConflict(Exception):
+    """A generation is already running for the conversation."""
+
+    def __init__(self, job_id: str):
+        super().__init__(job_id)
+        self.job_id = job_id
+
+
+@dataclass
+class StreamEvent:
+    """One SSE event of a job."""
+    id: int
+    event: str
+    data: dict
+
+    def encode(self) -> str:
+        return f"id: {self.id}\nevent: {self.event}\ndata: {dumps(self.data)}\n\n"
+
+
+@dataclass
+class JobInfo:
+    job_id: str
+    conversation_id: int
+    user_id: int
+    done: bool
+
+
+@dataclass
+class ReadResult:
+    """Events after a reader's cursor; ``snapshot`` is set if some were evicted."""
+    events: List[StreamEvent]
+    done: bool
+    snapshot: Optional[StreamEvent] = None
+
+
+class _MemoryJob:
+    __slots__ = (
+        'info', 'events', 'last_id', 'evicted_text', 'finished_at',
+        'readers', 'detached_at', 'stop_requested',
+    )
+
+    def __init__(self, info: JobInfo, size: int):
+        self.info = info
+        self.events = deque(maxlen=size)
+        self.last_id = 0
+        self.evicted_text: List[str] = []
+        self.finished_at: Optional[float] = None
+        self.readers = 0
+        self.detached_at: Optional[float] = None
+        self.stop_requested = False
+
+
+class MemoryStreamBackend:
+    """Per-process job buffers with condition-variable wakeups."""
+
+    def __init__(self, buffer_size: int = 256, ttl: float = 120.0):
+        self.buffer_size = buffer_size
+        self.ttl = ttl
+        self._jobs = OrderedDict()
+        self._by_conversation = {}
+        self._cond = threading.Condition()
+
+    def _purge(self):
+        now = time.monotonic()
+        for job_id, job in list(self._jobs.items()):
+            if job.finished_at is not None and job.finished_at + self.ttl < now:
+                del self._jobs[job_id]
+                if self._by_conversation.get(job.info.conversation_id) == job_id:
+                    del self._by_conversation[job.info.conversation_id]
+
+    def create(self, job_id: str, conversation_id: int, user_id: int):
+        with self._cond:
+            self._purge()
+            running = self._by_conversation.get(conversation_id)
+            if running and not self._jobs[running].info.done:
+                raise JobConflict(running)
+            self._jobs[job_id] = _MemoryJob(JobInfo(job_id, conversation_id, user_id, False), self.buffer_size)
+            self._by_conversation[conversation_id] = job_id
+
+    def publish(self, job_id: str, event: str, data: dict) -> int:
+        with self._cond:
+            job = self._jobs[job_id]
+            if len(job.events) == job.events.maxlen:
+                evicted = job.events[0]
+                if evicted.event == 'chunk':
+                    job.evicted_text.append(evicted.data['content'])
+            job.last_id += 1
+            job.events.append(StreamEvent(job.last_id, event, data))
+            self._cond.notify_all()
+            return job.last_id
+
+    def finish(self, job_id: str):
+        with self._cond:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                job.info.done = True
+                job.finished_at = time.monotonic()
+            self._cond.notify_all()
+
+    def info(self, job_id: str) -> Optional[JobInfo]:
+        job = self._jobs.get(job_id)
+        return job.info if job else None
+
+    def attach(self, job_id: str):
+        with self._cond:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                job.readers += 1
+
+    def detach(self, job_id: str) -> int:
+        """Remove a reader; returns the number left."""
+        with self._cond:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return 0
+            job.readers -= 1
+            if not job.readers:
+                job.detached_at = time.monotonic()
+            return job.readers
+
+    def request_stop(self, job_id: str):
+        with self._cond:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                job.stop_requested = True
+
+    def cancel_reason(self, job_id: str, grace: float) -> Optional[str]:
+        """'stop', 'disconnect' or None if the job should keep going."""
+        job = self._jobs.get(job_id)
+        if job is None:
+            return None
+        if job.stop_requested:
+            return 'stop'
+        if not job.readers and job.detached_at is not None and time.monotonic() - job.detached_at >= grace:
+            return 'disconnect'
+        return None
+
+    def conversation_job(self, conversation_id: int) -> Optional[str]:
+        with self._cond:
+            self._purge()
+            return self._by_conversation.get(conversation_id)
+
+    def read(self, job_id: str, after_id: int, timeout: float) -> ReadResult:
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while True:
+                job = self._jobs.get(job_id)
+                if job is None:
+                    return ReadResult([], True)
+                if job.last_id > after_id or job.info.done:
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return ReadResult([], False)
+                self._cond.wait(remaining)
+
+            events = [e for e in job.events if e.id > after_id]
+            snapshot = None
+            if events and events[0].id > after_id + 1:
+                snapshot = StreamEvent(events[0].id - 1, 'snapshot', {'content': ''.join(job.evicted_text)})
+            return ReadResult(events, job.info.done, snapshot)
+
+    def close(self):
+        with self._cond:
+            self._jobs.clear()
+            self._by_conversation.clear()
+
+
+class SQLiteStreamBackend:
+    """Job buffers in a SQLite file shared by every worker on the host.
+
+    Readers poll every ``poll_interval`` seconds, since there is no
+    cross-process wakeup. A job that has not published for ``ttl`` seconds is
+    treated as abandoned (its worker died) and no longer blocks new ones.
+    """
+
+    def __init__(self, path: str, buffer_size: int = 256, ttl: float = 120.0, poll_interval: float = 0.05):
+        self.buffer_size = buffer_size
+        self.ttl = ttl
+        self.poll_interval = poll_interval
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(path), check_same_thread=False, timeout=5.0, isolation_level=None)
+        with self._lock:
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('PRAGMA synchronous=NORMAL')
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS stream_jobs ('
+                'job_id TEXT PRIMARY KEY, conversation_id INTEGER NOT NULL, user_id INTEGER NOT NULL, '
+                "done INTEGER NOT NULL DEFAULT 0, finished_at REAL, evicted_text TEXT NOT NULL DEFAULT '', "
+                'last_id INTEGER NOT NULL DEFAULT 0, created_at REAL NOT NULL, updated_at REAL NOT NULL, '
+                'readers INTEGER NOT NULL DEFAULT 0, detached_at REAL, stop_requested INTEGER NOT NULL DEFAULT 0)'
+            )
+            self._conn.execute(
+                'CREATE INDEX IF NOT EXISTS ix_stream_jobs_conversation ON stream_jobs (conversation_id, created_at)'
+            )
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS stream_events ('
+                'job_id TEXT NOT NULL, id INTEGER NOT NULL, event TEXT NOT NULL, data TEXT NOT NULL, '
+                'PRIMARY KEY (job_id, id))'
+            )
+
+    def _transaction(self, mode: str = 'IMMEDIATE'):
+        self._conn.execute(f'BEGIN {mode}')
+
+    def _purge(self):
+        cutoff = time.time() - self.ttl
+        expired = [row[0] for row in self._conn.execute(
+            'SELECT job_id FROM stream_jobs WHERE finished_at < ? OR (done = 0 AND updated_at < ?)',
+            (cutoff, cutoff)
+        )]
+        for job_id in expired:
+            self._conn.execute('DELETE FROM stream_events WHERE job_id = ?', (job_id,))
+            self._conn.execute('DELETE FROM stream_jobs WHERE job_id = ?', (job_id,))
+
+    def create(self, job_id: str, conversation_id: int, user_id: int):
+        with self._lock:
+            self._transaction()
+            try:
+                self._purge()
+                row = self._conn.execute(
+                    'SELECT job_id FROM stream_jobs WHERE conversation_id = ? AND done = 0', (conversation_id,)
+                ).fetchone()
+                if row:
+                    raise JobConflict(row[0])
+                now = time.time()
+                self._conn.execute(
+                    'INSERT INTO stream_jobs (job_id, conversation_id, user_id, created_at, updated_at) '
+                    'VALUES (?, ?, ?, ?, ?)',
+                    (job_id, conversation_id, user_id, now, now)
+                )
+            except BaseException:
+                self._conn.execute('ROLLBACK')
+                raise
+            self._conn.execute('COMMIT')
+
+    def publish(self, job_id: str, event: str, data: dict) -> int:
+        with self._lock:
+            self._transaction()
+            try:
+                event_id = self._conn.execute(
+                    'UPDATE stream_jobs SET last_id = last_id + 1, updated_at = ? WHERE job_id = ? RETURNING last_id',
+                    (time.time(), job_id)
+                ).fetchone()[0]
+                self._conn.execute(
+                    'INSERT INTO stream_events (job_id, id, event, data) VALUES (?, ?, ?, ?)',
+                    (job_id, event_id, event, dumps(data))
+                )
+                evicted = self._conn.execute(
+                    "SELECT data FROM stream_events WHERE job_id = ? AND id <= ? AND event = 'chunk' ORDER BY id",
+                    (job_id, event_id - self.buffer_size)
+                ).fetchall()
+                if evicted:
+                    text = ''.join(json.loads(row[0])['content'] for row in evicted)
+                    self._conn.execute(
+                        'UPDATE stream_jobs SET evicted_text = evicted_text || ? WHERE job_id = ?', (text, job_id)
+                    )
+                self._conn.execute(
+                    'DELETE FROM stream_events WHERE job_id = ? AND id <= ?', (job_id, event_id - self.buffer_size)
+                )
+            except BaseException:
+                self._conn.execute('ROLLBACK')
+                raise
+            self._conn.execute('COMMIT')
+            return event_id
+
+    def finish(self, job_id: str):
+        with self._lock:
+            self._conn.execute(
+                'UPDATE stream_jobs SET done = 1, finished_at = ? WHERE job_id = ?', (time.time(), job_id)
+            )
+
+    def info(self, job_id: str) -> Optional[JobInfo]:
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT conversation_id, user_id, done FROM stream_jobs WHERE job_id = ?', (job_id,)
+            ).fetchone()
+        return JobInfo(job_id, row[0], row[1], bool(row[2])) if row else None
+
+    def attach(self, job_id: str):
+        with self._lock:
+            self._conn.execute('UPDATE stream_jobs SET readers = readers + 1 WHERE job_id = ?', (job_id,))
+
+    def detach(self, job_id: str) -> int:
+        with self._lock:
+            row = self._conn.execute(
+                'UPDATE stream_jobs SET readers = max(readers - 1, 0), '
+                'detached_at = CASE WHEN readers <= 1 THEN ? ELSE detached_at END '
+                'WHERE job_id = ? RETURNING readers',
+                (time.time(), job_id)
+            ).fetchone()
+        return row[0] if row else 0
+
+    def request_stop(self, job_id: str):
+        with self._lock:
+            self._conn.execute('UPDATE stream_jobs SET stop_requested = 1 WHERE job_id = ?', (job_id,))
+
+    def cancel_reason(self, job_id: str, grace: float) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT stop_requested, readers, detached_at FROM stream_jobs WHERE job_id = ?', (job_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        if row[0]:
+            return 'stop'
+        if not row[1] and row[2] is not None and time.time() - row[2] >= grace:
+            return 'disconnect'
+        return None
+
+    def conversation_job(self, conversation_id: int) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT job_id FROM stream_jobs WHERE conversation_id = ? ORDER BY created_at DESC LIMIT 1',
+                (conversation_id,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def _read_once(self, job_id: str, after_id: int):
+        with self._lock:
+            self._transaction('DEFERRED')
+            try:
+                job = self._conn.execute(
+                    'SELECT done, last_id, evicted_text FROM stream_jobs WHERE job_id = ?', (job_id,)
+                ).fetchone()
+                rows = self._conn.execute(
+                    'SELECT id, event, data FROM stream_events WHERE job_id = ? AND id > ? ORDER BY id',
+                    (job_id, after_id)
+                ).fetchall() if job else []
+            finally:
+                self._conn.execute('COMMIT')
+        if job is None:
+            return ReadResult([], True)
+        events = [StreamEvent(row[0], row[1], json.loads(row[2])) for row in rows]
+        snapshot = None
+        if events and events[0].id > after_id + 1:
+            snapshot = StreamEvent(events[0].id - 1, 'snapshot', {'content': job[2]})
+        return ReadResult(events, bool(job[0]), snapshot)
+
+    def read(self, job_id: str, after_id: int, timeout: float) -> ReadResult:
+        deadline = time.monotonic() + timeout
+        while True:
+            result = self._read_once(job_id, after_id)
+            if result.events or result.done or time.monotonic() >= deadline:
+                return result
+            time.sleep(self.poll_interval)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class StreamJobs:
+    """Starts generation jobs and serves their events to SSE readers."""
+
+    def __init__(self):
+        self.backend = None
+        self.keepalive = 15.0
+        self.cancel_grace = 5.0
+        self._tokens: Dict[str, CancelToken] = {}
+
+    def init_app(self, app):
+        kind = app.config['STREAM_JOBS_BACKEND']
+        buffer_size = app.config['STREAM_JOB_BUFFER']
+        ttl = app.config['STREAM_JOB_TTL']
+        self.keepalive = app.config['STREAM_KEEPALIVE']
+        self.cancel_grace = app.config['STREAM_CANCEL_GRACE']
+
+        if self.backend is not None:
+            self.backend.close()
+        if kind == 'memory':
+            self.backend = MemoryStreamBackend(buffer_size=buffer_size, ttl=ttl)
+        elif kind == 'sqlite':
+            self.backend = SQLiteStreamBackend(app.config['STREAM_JOBS_PATH'], buffer_size=buffer_size, ttl=ttl)
+        else:
+            raise ValueError(f"Unknown STREAM_JOBS_BACKEND: {kind}")
+        app.extensions['stream_jobs'] = self
+
+    def reserve(self, conversation_id: int, user_id: int) -> str:
+        """Claim the conversation for a new job; raises ``JobConflict``."""
+        job_id = uuid.uuid4().hex
+        self.backend.create(job_id, conversation_id, user_id)
+        return job_id
+
+    def fail(self, job_id: str, error: str):
+        self.backend.publish(job_id, 'error', {'error': error})
+        self.backend.finish(job_id)
+
+    def attach(self, job_id: str):
+        """Count a reader; pair with ``detach`` when its response closes."""
+        self.backend.attach(job_id)
+
+    def detach(self, job_id: str):
+        if self.backend.detach(job_id) or job_id not in self._tokens:
+            return
+        if self.cancel_grace <= 0:
+            self._check_cancel(job_id)
+        else:
+            timer = threading.Timer(self.cancel_grace, self._check_cancel, args=(job_id,))
+            timer.daemon = True
+            timer.start()
+
+    def stop(self, job_id: str):
+        """Cancel a running job on behalf of the user."""
+        self.backend.request_stop(job_id)
+        self._check_cancel(job_id)
+
+    def _check_cancel(self, job_id: str):
+        # Jobs of this process are cancelled at once; others notice on their next chunk
+        token = self._tokens.get(job_id)
+        reason = self.backend.cancel_reason(job_id, self.cancel_grace)
+        if token is not None and reason:
+            token.cancel(reason)
+
+    def start(
+        self, job_id: str, turn: Turn, started_at: Optional[float] = None, ticket: Optional[Ticket] = None
+    ):
+        """Publish the user message and generate the reply on a new thread.
+
+        ``ticket`` (a scheduler slot) is released when the job ends.
+        """
+        self.backend.publish(job_id, 'user_message', turn.user_message)
+        app = current_app._get_current_object()
+        token = self._tokens[job_id] = CancelToken()
+        thread = threading.Thread(
+            target=self._run, args=(app, job_id, turn, token, started_at, ticket),
+            name=f'stream-job-{job_id[:8]}', daemon=True
+        )
+        thread.start()
+        return thread
+
+    def _run(
+        self, app, job_id: str, turn: Turn, token: CancelToken, started_at: Optional[float],
+        ticket: Optional[Ticket] = None
+    ):
+        max_tokens = app.config['LLM_MAX_TOKENS']
+        with app.app_context():
+            try:
+                llm = get_llm_provider()
+                provider = type(llm).__name__
+                stream = ChunkCoalescer.from_config(app.config, started_at=started_at)
+                for text in stream.feed(response_cache.chat_stream(
+                    llm,
+                    turn.llm_messages,
+                    temperature=app.config['LLM_TEMPERATURE'],
+                    max_tokens=max_tokens,
+                    cancel=token
+                )):
+                    self.backend.publish(job_id, 'chunk', {'content': text})
+                    reason = self.backend.cancel_reason(job_id, self.cancel_grace)
+                    if reason:
+                        token.cancel(reason)
+                        break
+                stream.observe(provider)
+
+                if token.cancelled:
+                    stream_cancellations.labels(provider=provider, reason=token.reason).inc()
+                    tokens_saved.labels(provider=provider).inc(max(max_tokens - estimate_tokens(stream.text), 0))
+                    if stream.text:
+                        assistant_message = complete_turn(turn, stream.text, truncated=True)
+                        self.backend.publish(job_id, 'assistant_message', assistant_message)
+                    self.backend.publish(job_id, 'done', {'status': 'cancelled'})
+                    return
+
+                assistant_message = complete_turn(turn, stream.text)
+                self.backend.publish(job_id, 'assistant_message', assistant_message)
+                self.backend.publish(job_id, 'done', {'status': 'complete'})
+                if turn.overflow:
+                    deferred.submit(summarize_turn, turn)
+            except Exception as e:
+                logger.exception("Generation job %s failed", job_id)
+                db.session.rollback()
+                self.backend.publish(job_id, 'error', {'error': str(e)})
+            finally:
+                if ticket is not None:
+                    ticket.release()
+                self._tokens.pop(job_id, None)
+                self.backend.finish(job_id)
+
+    def running(self) -> int:
+        """Jobs generating on this worker."""
+        return len(self._tokens)
+
+    def subscribe(self, job_id: str, last_event_id: int = 0) -> Iterator[str]:
+        """Encoded SSE events after ``last_event_id`` until the job ends."""
+        cursor = last_event_id
+        while True:
+            result = self.backend.read(job_id, cursor, timeout=self.keepalive)
+            if result.snapshot is not None:
+                yield result.snapshot.encode()
+            for event in result.events:
+                yield event.encode()
+                cursor = event.id
+            if result.done and not result.events:
+                return
+            if not result.events and not result.done:
+                yield ': keepalive\n\n'
+
+
+stream_jobs = StreamJobs()
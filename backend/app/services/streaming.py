@@ -0,0 +1,98 @@
+"""Coalescing of LLM token chunks into SSE frames."""
+import time
+from typing import Callable, Iterable, Iterator, List, Optional
+
+from ..utils.metrics import registry
+
+stream_ttfb = registry.histogram(
+    'sse_time_to_first_byte_seconds', 'Request start to first streamed chunk', ['provider']
+)
+stream_chunks = registry.counter('sse_upstream_chunks_total', 'Chunks received from LLM providers', ['provider'])
+stream_frames = registry.counter('sse_frames_total', 'Chunk frames written to SSE clients', ['provider'])
+streams_active = registry.gauge('sse_streams_active', 'SSE responses being written', ['stream'])
+
+
+def track_stream(stream: str, events: Iterable[str]) -> Iterator[str]:
+    """Pass ``events`` through, counting the response in ``sse_streams_active``."""
+    active = streams_active.labels(stream=stream)
+    active.inc()
+    try:
+        yield from events
+    finally:
+        active.dec()
+
+
+class ChunkCoalescer:
+    """Merges small upstream chunks until ``max_bytes`` or ``max_delay`` is hit.
+
+    The first chunk is always emitted at once so time-to-first-byte is not
+    penalized. The time window is checked as chunks arrive (the stream is
+    pulled, there is no timer), so a stalled upstream is flushed by its next
+    chunk or by the end of the stream. ``max_delay = 0`` disables coalescing.
+    The full text is kept as a list and joined once in ``text``.
+    """
+
+    def __init__(
+        self,
+        max_bytes: int = 512,
+        max_delay: float = 0.03,
+        started_at: Optional[float] = None,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        self.max_bytes = max_bytes
+        self.max_delay = max_delay
+        self.clock = clock
+        self.started_at = clock() if started_at is None else started_at
+        self.first_byte_at: Optional[float] = None
+        self.chunks_in = 0
+        self.frames_out = 0
+        self._parts: List[str] = []
+
+    @classmethod
+    def from_config(cls, config, **kwargs) -> 'ChunkCoalescer':
+        return cls(max_bytes=config['SSE_COALESCE_BYTES'], max_delay=config['SSE_COALESCE_WINDOW'], **kwargs)
+
+    @property
+    def text(self) -> str:
+        return ''.join(self._parts)
+
+    @property
+    def ttfb(self) -> Optional[float]:
+        return None if self.first_byte_at is None else self.first_byte_at - self.started_at
+
+    def _emit(self, pending: List[str]) -> str:
+        if self.first_byte_at is None:
+            self.first_byte_at = self.clock()
+        self.frames_out += 1
+        return ''.join(pending)
+
+    def feed(self, chunks: Iterable[str]) -> Iterator[str]:
+        """Yield coalesced text for ``chunks``."""
+        pending: List[str] = []
+        pending_bytes = 0
+        window_start = 0.0
+        for chunk in chunks:
+            if not chunk:
+                continue
+            self.chunks_in += 1
+            self._parts.append(chunk)
+            if self.first_byte_at is None or self.max_delay <= 0:
+                yield self._emit([chunk])
+                continue
+            if not pending:
+                window_start = self.clock()
+            pending.append(chunk)
+            pending_bytes += len(chunk.encode('utf-8'))
+            if pending_bytes >= self.max_bytes or self.clock() - window_start >= self.max_delay:
+                yield self._emit(pending)
+                pending = []
+                pending_bytes = 0
+        if pending:
+            yield self._emit(pending)
+
+    def observe(self, provider: str):
+        """Record TTFB and chunk/frame counts for ``provider``."""
+        if self.ttfb is not None:
+            stream_ttfb.labels(provider=provider).observe(self.ttfb)
+        stream_chunks.labels(provider=provider).inc(self.chunks_in)
+        stream_frames.labels(provider=provider).inc(self.frames_out)
@@ -0,0 +1,34 @@
+"""Celery application for queued reply generation (``USE_CELERY``).
+
+Celery is only imported when enabled. Tasks run inside the Flask app context
+so they share models, config and the provider registry with the web app.
+"""
+from flask import Flask
+
+
+def init_celery(app: Flask):
+    """Create the Celery app from ``CELERY_*`` config and register the tasks."""
+    if 'celery' in app.extensions:
+        return app.extensions['celery']
+
+    from celery import Celery, Task
+
+    from .services.generation_queue import CELERY_TASK_NAME, run_generation
+
+    class FlaskTask(Task):
+        def __call__(self, *args, **kwargs):
+            with app.app_context():
+                return self.run(*args, **kwargs)
+
+    celery = Celery(app.import_name, task_cls=FlaskTask)
+    celery.conf.update(
+        broker_url=app.config['CELERY_BROKER_URL'],
+        result_backend=app.config['CELERY_RESULT_BACKEND'],
+        task_ignore_result=True,  # outcome lives in the generation_jobs row
+        task_acks_late=True,
+        worker_prefetch_multiplier=1,  # generations are long; don't hoard them
+    )
+    celery.task(name=CELERY_TASK_NAME)(run_generation)
+    celery.set_default()
+    app.extensions['celery'] = celery
+    return celery
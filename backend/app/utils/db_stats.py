@@ -0,0 +1,100 @@
+"""Per-request database query, commit and connection-pool counters."""
+import logging
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+from flask import g, has_app_context
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import Pool
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class QueryStats:
+    """Statements, commits, pool checkouts and time spent in the database."""
+    queries: int = 0
+    commits: int = 0
+    duration: float = 0.0
+    checkouts: int = 0
+    held: float = 0.0  # total seconds pooled connections were checked out
+    max_held: float = 0.0
+
+    def as_dict(self) -> dict:
+        return {
+            'queries': self.queries,
+            'commits': self.commits,
+            'duration_ms': round(self.duration * 1000, 2),
+            'checkouts': self.checkouts,
+            'held_ms': round(self.held * 1000, 2),
+            'max_held_ms': round(self.max_held * 1000, 2),
+        }
+
+
+def current() -> Optional[QueryStats]:
+    """Stats for the active app/request context, if any."""
+    if not has_app_context():
+        return None
+    stats = g.get('_db_stats')
+    if stats is None:
+        stats = g._db_stats = QueryStats()
+    return stats
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info['query_start'].pop()
+    stats = current()
+    if stats is not None:
+        stats.queries += 1
+        stats.duration += time.perf_counter() - started
+
+
+def _commit(conn):
+    stats = current()
+    if stats is not None:
+        stats.commits += 1
+
+
+def _checkout(dbapi_connection, connection_record, connection_proxy):
+    connection_record.info['checked_out_at'] = time.perf_counter()
+    stats = current()
+    if stats is not None:
+        stats.checkouts += 1
+
+
+def _checkin(dbapi_connection, connection_record):
+    started = connection_record.info.pop('checked_out_at', None)
+    stats = current()
+    if started is not None and stats is not None:
+        held = time.perf_counter() - started
+        stats.held += held
+        stats.max_held = max(stats.max_held, held)
+
+
+def init_app(app):
+    """Count statements on every engine and report them per request."""
+    if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+        event.listen(Engine, 'commit', _commit)
+        event.listen(Pool, 'checkout', _checkout)
+        event.listen(Pool, 'checkin', _checkin)
+
+    @app.before_request
+    def reset_db_stats():
+        g._db_stats = QueryStats()
+
+    @app.after_request
+    def add_db_stats_headers(response):
+        stats = g.get('_db_stats')
+        if stats is not None and not response.is_streamed:
+            response.headers['X-DB-Queries'] = str(stats.queries)
+            response.headers['X-DB-Commits'] = str(stats.commits)
+            response.headers['X-DB-Checkouts'] = str(stats.checkouts)
+        return response
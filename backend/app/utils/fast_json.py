@@ -0,0 +1,72 @@
+"""JSON encoding with orjson when it is installed.
+
+``FastJSONProvider`` writes the same bytes as Flask's default provider:
+keys are sorted when ``sort_keys`` is set and, as orjson always writes
+UTF-8, non-ASCII characters are escaped afterwards when ``ensure_ascii``
+is set (JSON syntax is ASCII, so they can only occur inside strings). The
+one remaining difference is the spelling of floats in exponent notation
+(``1e-7`` rather than ``1e-07``); no serialized model field is a float.
+"""
+import json
+import re
+from typing import Any
+
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional dependency
+    orjson = None
+
+# What json.dumps(ensure_ascii=True) escapes beyond what orjson already does
+NON_ASCII_RE = re.compile('[\x7f-\U0010ffff]')
+
+
+def _escape_non_ascii(match) -> str:
+    code = ord(match.group())
+    if code < 0x10000:
+        return f'\\u{code:04x}'
+    # Outside the BMP: a UTF-16 surrogate pair, as the standard library does
+    code -= 0x10000
+    return f'\\u{0xd800 | (code >> 10):04x}\\u{0xdc00 | (code & 0x3ff):04x}'
+
+
+def ascii_escape(text: str) -> str:
+    """Escape non-ASCII characters of encoded JSON like ``ensure_ascii``."""
+    if text.isascii() and '\x7f' not in text:
+        return text
+    return NON_ASCII_RE.sub(_escape_non_ascii, text)
+
+
+def dumps(obj: Any) -> str:
+    """Compact JSON for SSE events and NDJSON lines (UTF-8, not escaped)."""
+    if orjson is not None:
+        return orjson.dumps(obj).decode()
+    return json.dumps(obj, separators=(',', ':'), ensure_ascii=False)
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """Flask JSON provider backed by orjson (``jsonify``/``request.json``)."""
+
+    def dumps(self, obj: Any, **kwargs: Any) -> str:
+        if orjson is None:
+            return super().dumps(obj, **kwargs)
+        option = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+        if kwargs.get('sort_keys', self.sort_keys):
+            option |= orjson.OPT_SORT_KEYS
+        if kwargs.get('indent'):
+            option |= orjson.OPT_INDENT_2
+        try:
+            # Types orjson does not know (dates, UUIDs, ...) use Flask's rules
+            text = orjson.dumps(obj, default=kwargs.get('default', self.default), option=option).decode()
+        except orjson.JSONEncodeError:
+            # e.g. integers beyond 64 bits, which the standard library accepts
+            return super().dumps(obj, **kwargs)
+        if kwargs.get('ensure_ascii', self.ensure_ascii):
+            text = ascii_escape(text)
+        return text
+
+    def loads(self, s, **kwargs: Any) -> Any:
+        if orjson is None or kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
@@ -0,0 +1,380 @@
+"""Low-overhead in-process metrics (Prometheus data model).
+
+Metrics are plain Python counters updated in the worker that owns them.
+For the ``/api/metrics/`` exposition under several gunicorn workers, each
+worker writes a snapshot of its registry to ``METRICS_DIR/metrics_<pid>.json``
+every ``METRICS_FLUSH_INTERVAL`` seconds (and when it is scraped), and the
+scraped worker merges every file: counters and histograms are summed,
+gauges are combined by their ``aggregate`` mode. When a worker exits, the
+gunicorn master folds its counters and histograms into an archive file and
+drops its gauges, so totals never go backwards.
+"""
+import bisect
+import glob
+import json
+import logging
+import math
+import os
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class _Metric:
+    """Base for labelled metrics. ``labels()`` returns a cached child."""
+    kind = ''
+
+    def __init__(self, name: str, help: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+
+    def labels(self, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def _default(self):
+        if self.labelnames:
+            raise ValueError(f"{self.name} requires labels {self.labelnames}")
+        return self.labels()
+
+    def samples(self):
+        """Yield ``(label_values, child)`` pairs."""
+        return list(self._children.items())
+
+
+class _CounterChild:
+    __slots__ = ('value',)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0):
+        self.value += amount
+
+
+class Counter(_Metric):
+    """Monotonically increasing total."""
+    kind = 'counter'
+    _new_child = _CounterChild
+
+    def inc(self, amount: float = 1.0):
+        self._default().inc(amount)
+
+
+class _GaugeChild:
+    __slots__ = ('value',)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def set(self, value: float):
+        self.value = value
+
+    def inc(self, amount: float = 1.0):
+        self.value += amount
+
+    def dec(self, amount: float = 1.0):
+        self.value -= amount
+
+
+class Gauge(_Metric):
+    """Value that can go up and down.
+
+    ``aggregate`` ('sum', 'max' or 'min') combines the workers' values.
+    """
+    kind = 'gauge'
+    _new_child = _GaugeChild
+
+    def __init__(self, name: str, help: str, labelnames: Iterable[str] = (), aggregate: str = 'sum'):
+        super().__init__(name, help, labelnames)
+        if aggregate not in ('sum', 'max', 'min'):
+            raise ValueError(f"Unknown gauge aggregate: {aggregate}")
+        self.aggregate = aggregate
+
+    def set(self, value: float):
+        self._default().set(value)
+
+    def inc(self, amount: float = 1.0):
+        self._default().inc(amount)
+
+    def dec(self, amount: float = 1.0):
+        self._default().dec(amount)
+
+
+class _HistogramChild:
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Upper bound of the bucket holding the ``q`` quantile."""
+        if not self.count:
+            return None
+        target = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= target:
+                return bound
+        return float('inf')
+
+
+class Histogram(_Metric):
+    """Bucketed distribution of observations."""
+    kind = 'histogram'
+
+    def __init__(self, name: str, help: str, labelnames: Iterable[str] = (), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value: float):
+        self._default().observe(value)
+
+
+class Registry:
+    """Holds every metric of the process by name."""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls, name, *args, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, *args, **kwargs)
+            elif not isinstance(metric, cls):
+                raise ValueError(f"Metric {name} already registered as {metric.kind}")
+            return metric
+
+    def counter(self, name: str, help: str, labelnames: Iterable[str] = ()) -> Counter:
+        return self._get_or_create(Counter, name, help, labelnames)
+
+    def gauge(self, name: str, help: str, labelnames: Iterable[str] = (), aggregate: str = 'sum') -> Gauge:
+        return self._get_or_create(Gauge, name, help, labelnames, aggregate=aggregate)
+
+    def histogram(self, name: str, help: str, labelnames: Iterable[str] = (), buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self._get_or_create(Histogram, name, help, labelnames, buckets=buckets)
+
+    def metrics(self):
+        return list(self._metrics.values())
+
+    def snapshot(self) -> dict:
+        """JSON-serializable copy of every metric and its samples."""
+        data = {}
+        for metric in self.metrics():
+            entry = {'kind': metric.kind, 'help': metric.help, 'labelnames': list(metric.labelnames)}
+            if metric.kind == 'histogram':
+                entry['buckets'] = list(metric.buckets)
+                entry['samples'] = [
+                    [list(key), {'counts': list(child.counts), 'sum': child.sum, 'count': child.count}]
+                    for key, child in metric.samples()
+                ]
+            else:
+                if metric.kind == 'gauge':
+                    entry['aggregate'] = metric.aggregate
+                entry['samples'] = [[list(key), child.value] for key, child in metric.samples()]
+            data[metric.name] = entry
+        return data
+
+
+def merge(snapshots: Iterable[dict]) -> dict:
+    """Combine per-process snapshots into one."""
+    merged: Dict[str, dict] = {}
+    for snapshot in snapshots:
+        for name, entry in snapshot.items():
+            target = merged.get(name)
+            if target is None:
+                target = merged[name] = {**entry, 'samples': {}}
+            elif target['kind'] != entry['kind'] or target.get('buckets') != entry.get('buckets'):
+                logger.warning("Skipping metric %s with a conflicting definition", name)
+                continue
+            samples = target['samples']
+            for labels, value in entry['samples']:
+                key = tuple(labels)
+                current = samples.get(key)
+                if current is None:
+                    samples[key] = dict(value, counts=list(value['counts'])) if isinstance(value, dict) else value
+                elif entry['kind'] == 'histogram':
+                    current['counts'] = [a + b for a, b in zip(current['counts'], value['counts'])]
+                    current['sum'] += value['sum']
+                    current['count'] += value['count']
+                elif entry['kind'] == 'gauge' and entry.get('aggregate') == 'max':
+                    samples[key] = max(current, value)
+                elif entry['kind'] == 'gauge' and entry.get('aggregate') == 'min':
+                    samples[key] = min(current, value)
+                else:
+                    samples[key] = current + value
+    for entry in merged.values():
+        entry['samples'] = [[list(key), value] for key, value in entry['samples'].items()]
+    return merged
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return '+Inf' if value > 0 else '-Inf'
+    if value == int(value):
+        return str(int(value))
+    return repr(float(value))
+
+
+def _format_labels(names: Iterable[str], values: Iterable[str]) -> str:
+    pairs = [
+        '{}="{}"'.format(name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for name, value in zip(names, values)
+    ]
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def render(snapshot: dict) -> str:
+    """Prometheus text exposition format (version 0.0.4)."""
+    lines: List[str] = []
+    for name in sorted(snapshot):
+        entry = snapshot[name]
+        lines.append(f"# HELP {name} {entry['help']}")
+        lines.append(f"# TYPE {name} {entry['kind']}")
+        names = entry['labelnames']
+        for labels, value in sorted(entry['samples']):
+            if entry['kind'] != 'histogram':
+                lines.append(f'{name}{_format_labels(names, labels)} {_format_value(value)}')
+                continue
+            cumulative = 0
+            bounds = [_format_value(b) for b in entry['buckets']] + ['+Inf']
+            for bound, count in zip(bounds, value['counts']):
+                cumulative += count
+                lines.append(f'{name}_bucket{_format_labels(names + ["le"], labels + [bound])} {cumulative}')
+            lines.append(f'{name}_sum{_format_labels(names, labels)} {_format_value(value["sum"])}')
+            lines.append(f'{name}_count{_format_labels(names, labels)} {value["count"]}')
+    return '\n'.join(lines) + '\n'
+
+
+class MultiProcessStore:
+    """Per-process snapshot files in a directory shared by the workers."""
+
+    ARCHIVE = 'metrics_archive.json'
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, pid: int) -> str:
+        return os.path.join(self.directory, f'metrics_{pid}.json')
+
+    def _read(self, path: str) -> Optional[dict]:
+        try:
+            with open(path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write(self, path: str, snapshot: dict):
+        tmp = f'{path}.{os.getpid()}.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(snapshot, f)
+        os.replace(tmp, path)
+
+    def write(self, snapshot: dict, pid: Optional[int] = None):
+        """Replace the snapshot of ``pid`` (this process by default)."""
+        self._write(self._path(pid or os.getpid()), snapshot)
+
+    def collect(self) -> dict:
+        """Merged snapshot of every live process plus the archive."""
+        paths = glob.glob(os.path.join(self.directory, 'metrics_*.json'))
+        return merge(s for s in map(self._read, sorted(paths)) if s)
+
+    def mark_dead(self, pid: int):
+        """Fold a finished process's counters and histograms into the archive."""
+        path = self._path(pid)
+        snapshot = self._read(path)
+        if snapshot:
+            totals = {name: entry for name, entry in snapshot.items() if entry['kind'] != 'gauge'}
+            archive_path = os.path.join(self.directory, self.ARCHIVE)
+            self._write(archive_path, merge([self._read(archive_path) or {}, totals]))
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def clear(self):
+        """Remove every snapshot (the master does this at start-up)."""
+        for path in glob.glob(os.path.join(self.directory, 'metrics_*.json')):
+            os.remove(path)
+
+
+class MetricsExporter:
+    """Publishes this worker's registry for the aggregated ``/api/metrics/``.
+
+    Without ``METRICS_DIR`` only this process's metrics are exposed.
+    """
+
+    def __init__(self, registry: 'Registry'):
+        self.registry = registry
+        self.store: Optional[MultiProcessStore] = None
+        self.flush_interval = 5.0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._pid: Optional[int] = None
+
+    def init_app(self, app):
+        directory = app.config['METRICS_DIR']
+        self.store = MultiProcessStore(directory) if directory else None
+        self.flush_interval = app.config['METRICS_FLUSH_INTERVAL']
+        app.extensions['metrics_exporter'] = self
+
+    def start(self):
+        """Flush periodically from this process (call after forking)."""
+        if self.store is None or self.flush_interval <= 0 or self._pid == os.getpid():
+            return
+        self._pid = os.getpid()
+        self._stop.clear()
+
+        def run():
+            while not self._stop.wait(self.flush_interval):
+                self.flush()
+
+        self._thread = threading.Thread(target=run, name='metrics-flush', daemon=True)
+        self._thread.start()
+
+    def flush(self):
+        if self.store is None:
+            return
+        try:
+            self.store.write(self.registry.snapshot())
+        except OSError:
+            logger.exception("Could not write metrics snapshot")
+
+    def collect(self) -> dict:
+        if self.store is None:
+            return self.registry.snapshot()
+        self.flush()
+        return self.store.collect()
+
+    def stop(self):
+        self._stop.set()
+        self.flush()
+
+
+registry = Registry()
+exporter = MetricsExporter(registry)
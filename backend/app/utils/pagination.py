@@ -0,0 +1,27 @@
+"""Opaque keyset pagination cursors."""
+import base64
+import json
+from datetime import datetime
+from typing import Optional, Tuple
+
+
+class InvalidCursor(ValueError):
+    """Raised when a client sends a malformed cursor."""
+
+
+def encode_cursor(at: datetime, id: int) -> str:
+    """Encode a ``(timestamp, id)`` position as a URL-safe token."""
+    raw = json.dumps([at.isoformat() if at else None, id], separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token: Optional[str]) -> Optional[Tuple[Optional[datetime], int]]:
+    """Decode a token from ``encode_cursor``; None when no cursor was sent."""
+    if not token:
+        return None
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        at, id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return (datetime.fromisoformat(at) if at else None), int(id)
+    except (ValueError, TypeError) as e:
+        raise InvalidCursor(str(e)) from e
@@ -0,0 +1,48 @@
+"""Per-route request latency and per-request database metrics."""
+import time
+
+from flask import g, request
+
+from . import db_stats
+from .metrics import registry
+
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 20, 50, 100)
+
+request_duration = registry.histogram(
+    'http_request_duration_seconds', 'Time to produce a response (streams: until the view returns)',
+    ['method', 'endpoint', 'status']
+)
+request_queries = registry.histogram(
+    'db_queries_per_request', 'SQL statements executed per request', ['endpoint'], buckets=QUERY_BUCKETS
+)
+request_db_seconds = registry.histogram(
+    'db_query_seconds_per_request', 'Time spent in SQL statements per request', ['endpoint']
+)
+
+
+def init_app(app):
+    """Time every request by endpoint (the route name, not the URL)."""
+
+    @app.before_request
+    def start_request_timer():
+        g._request_started = time.perf_counter()
+
+    @app.after_request
+    def record_request_status(response):
+        g._response_status = response.status_code
+        return response
+
+    @app.teardown_request
+    def record_request_metrics(exc=None):
+        started = g.pop('_request_started', None)
+        if started is None:
+            return
+        endpoint = request.endpoint or 'unmatched'
+        status = 500 if exc is not None else g.pop('_response_status', 500)
+        request_duration.labels(method=request.method, endpoint=endpoint, status=status).observe(
+            time.perf_counter() - started
+        )
+        stats = db_stats.current()
+        if stats is not None:
+            request_queries.labels(endpoint=endpoint).observe(stats.queries)
+            request_db_seconds.labels(endpoint=endpoint).observe(stats.duration)
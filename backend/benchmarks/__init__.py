@@ -0,0 +1 @@
+"""Performance micro-benchmarks (not run by pytest)."""
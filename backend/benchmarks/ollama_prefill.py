@@ -0,0 +1,47 @@
+"""Benchmark: Ollama prefill work per turn as a conversation grows.
+
+Needs a running Ollama (``OLLAMA_HOST``, ``OLLAMA_MODEL``). Every turn
+resends the whole history, as the app does. While the model stays loaded,
+Ollama only evaluates the new suffix, so ``prompt_eval_count`` stays small
+even though the prompt grows. Run from ``backend/``::
+
+    python -m benchmarks.ollama_prefill [--turns 12] [--keep-alive 30m]
+"""
+import argparse
+import os
+
+from app.services import OllamaProvider
+
+QUESTIONS = [
+    'O que é uma derivada?',
+    'E a regra da cadeia?',
+    'Dê um exemplo com seno.',
+    'Como isso se relaciona com integrais?',
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--turns', type=int, default=12)
+    parser.add_argument('--keep-alive', default=None, help='OLLAMA_KEEP_ALIVE override, e.g. 0 to unload')
+    parser.add_argument('--max-tokens', type=int, default=120)
+    args = parser.parse_args()
+    if args.keep_alive is not None:
+        os.environ['OLLAMA_KEEP_ALIVE'] = args.keep_alive
+
+    provider = OllamaProvider()
+    messages = [{'role': 'system', 'content': 'Você é um tutor de cálculo. Seja breve.'}]
+    print(f"{'turn':>4} {'messages':>8} {'prompt tok':>10} {'prefill ms':>10} {'decode ms':>10}")
+    for turn in range(args.turns):
+        messages.append({'role': 'user', 'content': QUESTIONS[turn % len(QUESTIONS)]})
+        reply = provider.chat(messages, temperature=0, max_tokens=args.max_tokens)
+        messages.append({'role': 'assistant', 'content': reply})
+        t = provider.last_timings
+        print(
+            f"{turn + 1:>4} {len(messages) - 1:>8} {t['prompt_eval_count']:>10} "
+            f"{t['prompt_eval_duration'] / 1e6:>10.1f} {t['eval_duration'] / 1e6:>10.1f}"
+        )
+
+
+if __name__ == '__main__':
+    main()
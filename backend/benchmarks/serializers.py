@@ -0,0 +1,80 @@
+"""Micro-benchmark: marshmallow + json vs compiled serializers + fast JSON.
+
+Both sides encode with a Flask JSON provider as ``jsonify`` does, so they
+produce the same bytes: the default (stdlib) one for marshmallow and
+``FastJSONProvider`` for the compiled serializers.
+
+Run from ``backend/``::
+
+    python -m benchmarks.serializers [--repeat 5]
+"""
+import argparse
+import time
+from datetime import datetime, timedelta
+
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+
+from app.models import Conversation, Message
+from app.schemas import (
+    ConversationSchema,
+    MessageSchema,
+    conversation_serializer,
+    message_serializer,
+)
+from app.utils.fast_json import FastJSONProvider
+
+
+def make_conversations(count):
+    now = datetime(2024, 3, 1, 12, 0, 0)
+    return [
+        Conversation(
+            id=i, user_id=1, title=f'Conversa {i} sobre cálculo', created_at=now, updated_at=now,
+            message_count=i % 40, last_message_preview='Integral por partes: ∫u dv = uv − ∫v du',
+            last_message_at=now,
+        )
+        for i in range(count)
+    ]
+
+
+def make_messages(count):
+    start = datetime(2024, 3, 1, 12, 0, 0)
+    return [
+        Message(
+            id=i, conversation_id=1, role='user' if i % 2 else 'assistant',
+            content='Explique a regra da cadeia com um exemplo. ' * 8,
+            attachments=[], created_at=start + timedelta(seconds=i),
+        )
+        for i in range(count)
+    ]
+
+
+def best_of(repeat, fn):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+    app = Flask(__name__)
+    stdlib_json, fast_json = DefaultJSONProvider(app), FastJSONProvider(app)
+
+    cases = [
+        ('1k conversations', make_conversations(1000), ConversationSchema(many=True), conversation_serializer),
+        ('10k messages', make_messages(10000), MessageSchema(many=True), message_serializer),
+    ]
+    print(f"{'case':<18}{'marshmallow':>14}{'compiled':>12}{'speedup':>10}")
+    for name, rows, schema, compiled in cases:
+        baseline = best_of(args.repeat, lambda: stdlib_json.dumps(schema.dump(rows), separators=(',', ':')))
+        fast = best_of(args.repeat, lambda: fast_json.dumps(compiled.dump(rows, many=True)))
+        print(f'{name:<18}{baseline * 1000:>11.1f} ms{fast * 1000:>9.1f} ms{baseline / fast:>9.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,6 @@
+"""Celery worker entry point (``celery -A celery_worker worker``)."""
+from app import create_app
+from app.tasks import init_celery
+
+app = create_app()
+celery = init_celery(app)
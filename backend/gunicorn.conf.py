@@ -0,0 +1,86 @@
+"""Gunicorn configuration.
+
+``GUNICORN_WORKER_CLASS`` selects the serving mode:
+
+- ``sync`` (default): one request per worker process.
+- ``gevent``: cooperative workers. Sockets are monkey-patched, so time spent
+  waiting on the LLM provider or writing SSE chunks only parks a greenlet and
+  a single process can hold ``GUNICORN_WORKER_CONNECTIONS`` concurrent streams.
+
+With ``METRICS_DIR`` set, workers publish their metrics there for
+``/api/metrics/``; the master clears it at start-up and archives the
+counters of each worker that exits. With more than one worker and no
+``METRICS_DIR`` in the environment, a private temporary directory is used
+(removed at exit), so a scrape never sees a single worker's numbers; an
+explicitly empty ``METRICS_DIR`` is warned about.
+"""
+import os
+import shutil
+import tempfile
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:8000')
+workers = int(os.environ.get('GUNICORN_WORKERS', '4'))
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'sync')
+worker_connections = int(os.environ.get('GUNICORN_WORKER_CONNECTIONS', '1000'))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', '30'))
+keepalive = int(os.environ.get('GUNICORN_KEEPALIVE', '5'))
+
+# Read by the app in every worker, so it is set before any of them load it
+_metrics_tmpdir = None
+if workers > 1 and 'METRICS_DIR' not in os.environ:
+    _metrics_tmpdir = os.environ['METRICS_DIR'] = tempfile.mkdtemp(prefix='gunicorn-metrics-')
+
+
+def on_starting(server):
+    """Drop metrics left over from a previous run."""
+    if workers > 1 and not os.environ.get('METRICS_DIR'):
+        server.log.warning(
+            "METRICS_DIR is empty with %d workers: /api/metrics/ shows one worker per scrape", workers
+        )
+    if os.environ.get('METRICS_DIR'):
+        from app.utils.metrics import MultiProcessStore
+        MultiProcessStore(os.environ['METRICS_DIR']).clear()
+
+
+def post_fork(server, worker):
+    """Make psycopg2 cooperative when running under gevent."""
+    if worker_class == 'gevent':
+        from psycogreen.gevent import patch_psycopg
+        patch_psycopg()
+
+
+def post_worker_init(worker):
+    """Start metrics flushing, Ollama health probes and the model preload once the app is loaded."""
+    from app.services import provider_registry
+    from app.utils.metrics import exporter
+    exporter.start()
+    provider_registry.warmup()
+
+
+def worker_exit(server, worker):
+    """Drain deferred work, close LLM connections, hashing processes and generation threads, flush metrics."""
+    from app.services import (
+        deferred,
+        generation_queue,
+        password_hasher,
+        provider_registry,
+    )
+    from app.utils.metrics import exporter
+    deferred.close()
+    generation_queue.close()
+    provider_registry.close()
+    password_hasher.close()
+    exporter.stop()
+
+
+def child_exit(server, worker):
+    """Keep an exited worker's counters and drop its gauges (runs in the master)."""
+    if os.environ.get('METRICS_DIR'):
+        from app.utils.metrics import MultiProcessStore
+        MultiProcessStore(os.environ['METRICS_DIR']).mark_dead(worker.pid)
+
+
+def on_exit(server):
+    """Remove the temporary metrics directory, if one was made."""
+    if _metrics_tmpdir:
+        shutil.rmtree(_metrics_tmpdir, ignore_errors=True)
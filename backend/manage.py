@@ -6,6 +6,7 @@ from flask.cli import FlaskGroup
 from app import create_app
 from app.extensions import db
 from app.models import User
+from app.services import rebuild_search_index
 
 
 def create_cli_app():
@@ -47,6 +48,14 @@ def create_superuser(username, email, password):
     click.echo(f'Superuser created: {username}')
 
 
+@cli.command()
+def reindex_search():
+    """Recreate the full-text search index (for SEARCH_LANGUAGE) and backfill rows."""
+    with db.engine.begin() as connection:
+        rebuild_search_index(connection)
+    click.echo('Search index rebuilt.')
+
+
 @cli.command()
 def init_db():
     """Initialize the database."""
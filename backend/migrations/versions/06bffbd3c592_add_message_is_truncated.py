@@ -0,0 +1,38 @@
+"""add message is_truncated
+
+Revision ID: 06bffbd3c592
+Revises: 8492f97aed23
+Create Date: 2026-10-16 23:01:28.610066
+
+"""
+import sqlalchemy as sa
+from alembic import op
+
+from app.services.search import SQLiteSearchBackend
+
+# revision identifiers, used by Alembic.
+revision = '06bffbd3c592'
+down_revision = '8492f97aed23'
+branch_labels = None
+depends_on = None
+
+
+def _reinstall_search_triggers():
+    # A batch rebuild of ``messages`` on SQLite drops the FTS triggers of c3f1a9d27e54
+    bind = op.get_bind()
+    if bind.dialect.name == 'sqlite':
+        SQLiteSearchBackend().install(bind)
+
+
+def upgrade():
+    # Not in batch mode: a plain ADD COLUMN keeps the table (and its triggers)
+    op.add_column(
+        'messages', sa.Column('is_truncated', sa.Boolean(), server_default=sa.false(), nullable=False)
+    )
+    _reinstall_search_triggers()
+
+
+def downgrade():
+    with op.batch_alter_table('messages', schema=None) as batch_op:
+        batch_op.drop_column('is_truncated')
+    _reinstall_search_triggers()
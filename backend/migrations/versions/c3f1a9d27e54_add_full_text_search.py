@@ -0,0 +1,104 @@
+"""add full text search
+
+Revision ID: c3f1a9d27e54
+Revises: 92daa044fedc
+Create Date: 2026-10-16 23:05:12.418230
+
+"""
+import re
+
+from alembic import op
+from flask import current_app
+
+# revision identifiers, used by Alembic.
+revision = 'c3f1a9d27e54'
+down_revision = '92daa044fedc'
+branch_labels = None
+depends_on = None
+
+SQLITE_UPGRADE = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5("
+    "content, content='messages', content_rowid='id', "
+    "tokenize='unicode61 remove_diacritics 2')",
+    "CREATE VIRTUAL TABLE IF NOT EXISTS conversations_fts USING fts5("
+    "title, content='conversations', content_rowid='id', "
+    "tokenize='unicode61 remove_diacritics 2')",
+    "CREATE TRIGGER IF NOT EXISTS messages_fts_ai AFTER INSERT ON messages BEGIN "
+    "INSERT INTO messages_fts(rowid, content) VALUES (new.id, new.content); END",
+    "CREATE TRIGGER IF NOT EXISTS messages_fts_ad AFTER DELETE ON messages BEGIN "
+    "INSERT INTO messages_fts(messages_fts, rowid, content) "
+    "VALUES ('delete', old.id, old.content); END",
+    "CREATE TRIGGER IF NOT EXISTS messages_fts_au AFTER UPDATE OF content ON messages BEGIN "
+    "INSERT INTO messages_fts(messages_fts, rowid, content) "
+    "VALUES ('delete', old.id, old.content); "
+    "INSERT INTO messages_fts(rowid, content) VALUES (new.id, new.content); END",
+    "CREATE TRIGGER IF NOT EXISTS conversations_fts_ai AFTER INSERT ON conversations BEGIN "
+    "INSERT INTO conversations_fts(rowid, title) VALUES (new.id, new.title); END",
+    "CREATE TRIGGER IF NOT EXISTS conversations_fts_ad AFTER DELETE ON conversations BEGIN "
+    "INSERT INTO conversations_fts(conversations_fts, rowid, title) "
+    "VALUES ('delete', old.id, old.title); END",
+    "CREATE TRIGGER IF NOT EXISTS conversations_fts_au AFTER UPDATE OF title ON conversations BEGIN "
+    "INSERT INTO conversations_fts(conversations_fts, rowid, title) "
+    "VALUES ('delete', old.id, old.title); "
+    "INSERT INTO conversations_fts(rowid, title) VALUES (new.id, new.title); END",
+    # Backfill rows written before the index existed
+    "INSERT INTO messages_fts(messages_fts) VALUES ('rebuild')",
+    "INSERT INTO conversations_fts(conversations_fts) VALUES ('rebuild')",
+]
+
+SQLITE_DOWNGRADE = [
+    "DROP TRIGGER IF EXISTS messages_fts_ai",
+    "DROP TRIGGER IF EXISTS messages_fts_ad",
+    "DROP TRIGGER IF EXISTS messages_fts_au",
+    "DROP TRIGGER IF EXISTS conversations_fts_ai",
+    "DROP TRIGGER IF EXISTS conversations_fts_ad",
+    "DROP TRIGGER IF EXISTS conversations_fts_au",
+    "DROP TABLE IF EXISTS messages_fts",
+    "DROP TABLE IF EXISTS conversations_fts",
+]
+
+# The expressions must match the ones PostgresSearchBackend queries with,
+# so the text search configuration comes from SEARCH_LANGUAGE
+POSTGRES_UPGRADE = [
+    "CREATE INDEX IF NOT EXISTS ix_messages_content_fts "
+    "ON messages USING GIN (to_tsvector('{language}', coalesce(content, '')))",
+    "CREATE INDEX IF NOT EXISTS ix_conversations_title_fts "
+    "ON conversations USING GIN (to_tsvector('{language}', coalesce(title, '')))",
+]
+
+POSTGRES_DOWNGRADE = [
+    "DROP INDEX IF EXISTS ix_messages_content_fts",
+    "DROP INDEX IF EXISTS ix_conversations_title_fts",
+]
+
+
+def _search_language():
+    language = current_app.config.get('SEARCH_LANGUAGE', 'simple')
+    if not re.fullmatch(r'[a-z_]+', language):
+        raise ValueError(f"Invalid text search configuration: {language}")
+    return language
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'sqlite':
+        statements = SQLITE_UPGRADE
+    elif dialect == 'postgresql':
+        language = _search_language()
+        statements = [statement.format(language=language) for statement in POSTGRES_UPGRADE]
+    else:
+        statements = []
+    for statement in statements:
+        op.execute(statement)
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'sqlite':
+        statements = SQLITE_DOWNGRADE
+    elif dialect == 'postgresql':
+        statements = POSTGRES_DOWNGRADE
+    else:
+        statements = []
+    for statement in statements:
+        op.execute(statement)
@@ -4,6 +4,27 @@ import pytest
 from app import create_app
 from app.extensions import db
 from app.models import User
+from app.services import LLMProvider, provider_registry
+
+
+class StubProvider(LLMProvider):
+    """Deterministic in-process LLM provider."""
+    model = 'stub'
+
+    def __init__(self, reply='Hello from the stub'):
+        self.reply = reply
+        self.calls = 0
+
+    def chat(self, messages, temperature=0.7, max_tokens=500, images=None):
+        self.calls += 1
+        return self.reply
+
+    def chat_stream(self, messages, temperature=0.7, max_tokens=500, images=None, cancel=None):
+        self.calls += 1
+        for word in self.reply.split(' '):
+            if cancel is not None and cancel.cancelled:
+                return
+            yield word + ' '
 
 
 @pytest.fixture
@@ -40,3 +61,12 @@ def auth_client(app, client):
         'password': 'testpass'
     })
     return client
+
+
+@pytest.fixture
+def llm(app):
+    """Install a stub LLM provider in the registry."""
+    provider = StubProvider()
+    provider_registry.register(provider_registry.default_name(), provider)
+    yield provider
+    provider_registry.close()
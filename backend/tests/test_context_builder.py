@@ -0,0 +1,70 @@
+"""Context builder tests."""
+from app.extensions import db
+from app.models import Conversation, Message, User
+from app.services import ContextBuilder
+
+
+def _conversation_with_turns(count):
+    user = User(username='ctx', email='ctx@test.com')
+    user.set_password('x')
+    conversation = Conversation(user=user, title='ctx')
+    db.session.add(conversation)
+    for i in range(count):
+        role = 'user' if i % 2 == 0 else 'assistant'
+        db.session.add(Message(conversation=conversation, role=role, content=f'turn {i} ' + 'x' * 40))
+    db.session.commit()
+    return conversation
+
+
+def test_uses_most_recent_turns(app):
+    """Test history is filled newest-first within the token budget."""
+    conversation = _conversation_with_turns(30)
+    builder = ContextBuilder(token_budget=100, system_prompt='sys')
+
+    messages = builder.build(conversation, 'next question').messages
+
+    history = [m['content'] for m in messages[1:-1]]
+    assert history, 'expected some history within budget'
+    assert history[-1].startswith('turn 29 ')
+    assert not any(h.startswith('turn 0 ') for h in history)
+    assert messages[-1] == {'role': 'user', 'content': 'next question'}
+
+
+def test_overflow_is_summarized(app, llm):
+    """Test turns outside the budget are reported and summarized oldest first."""
+    conversation = _conversation_with_turns(30)
+    llm.reply = 'The student is learning about x.'
+    builder = ContextBuilder(token_budget=100, system_prompt='sys')
+
+    context = builder.build(conversation, 'next question')
+
+    assert context.overflow[0]['content'].startswith('turn 0 ')
+    assert context.overflow_last_id is not None
+    assert builder.summarize('', context.overflow, llm) == 'The student is learning about x.'
+
+
+def test_summary_replaces_folded_turns(app):
+    """Test folded turns are skipped and the summary is prepended."""
+    conversation = _conversation_with_turns(30)
+    conversation.summary = 'Earlier: atoms.'
+    conversation.summary_message_id = Message.query.filter_by(content='turn 27 ' + 'x' * 40).first().id
+    db.session.commit()
+
+    messages = ContextBuilder(token_budget=1000, system_prompt='sys').build(conversation, 'q').messages
+
+    assert 'Earlier: atoms.' in messages[1]['content']
+    assert [m['content'][:7] for m in messages[2:-1]] == ['turn 28', 'turn 29']
+
+
+def test_summary_continues_from_the_last_folded_turn(app):
+    """Test rows older than a full window are folded first, oldest first."""
+    conversation = _conversation_with_turns(30)
+    builder = ContextBuilder(token_budget=1000, max_messages=10, system_prompt='sys')
+
+    context = builder.build(conversation, 'q')
+
+    assert [m['content'][:7] for m in context.overflow] == [f'turn {i}'.ljust(7) for i in range(10)]
+    conversation.summary_message_id = context.overflow_last_id
+    db.session.commit()
+    context = builder.build(conversation, 'q')
+    assert context.overflow[0]['content'].startswith('turn 10 ')
@@ -0,0 +1,143 @@
+"""Conversation endpoint tests."""
+import json
+
+from sqlalchemy import event
+
+from app.extensions import db
+from app.models import Conversation, Message, User
+
+
+def _owner():
+    return User.query.filter_by(username='testuser').first()
+
+
+def test_message_counters_follow_inserts_and_deletes(app, auth_client):
+    """Test denormalized counters are maintained on message writes."""
+    conversation = Conversation(user=_owner(), title='Counters')
+    db.session.add(conversation)
+    first = Message(conversation=conversation, role='user', content='first')
+    second = Message(conversation=conversation, role='assistant', content='second')
+    db.session.add_all([first, second])
+    db.session.commit()
+    assert conversation.message_count == 2
+    assert conversation.last_message_preview == 'second'
+
+    db.session.delete(second)
+    db.session.commit()
+    assert conversation.message_count == 1
+    assert conversation.last_message_preview == 'first'
+
+
+def test_list_is_keyset_paginated(app, auth_client):
+    """Test the list walks every conversation once via next_cursor."""
+    app.config['PAGE_SIZE'] = 3
+    owner = _owner()
+    for i in range(7):
+        db.session.add(Conversation(user=owner, title=f'c{i}'))
+    db.session.commit()
+
+    seen = []
+    cursor = None
+    while True:
+        url = '/api/conversations/' + (f'?cursor={cursor}' if cursor else '')
+        page = auth_client.get(url).json
+        seen.extend(r['id'] for r in page['results'])
+        cursor = page['next_cursor']
+        if not cursor:
+            break
+
+    assert len(seen) == 7 == len(set(seen))
+    assert auth_client.get('/api/conversations/?cursor=garbage').status_code == 400
+
+
+def test_list_query_count_is_constant(app, auth_client):
+    """Test listing does not issue a query per conversation."""
+    owner = _owner()
+    for i in range(10):
+        conversation = Conversation(user=owner, title=f'c{i}')
+        db.session.add(Message(conversation=conversation, role='user', content='hi'))
+    db.session.commit()
+
+    statements = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', count)
+    try:
+        response = auth_client.get('/api/conversations/')
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', count)
+
+    assert [r['message_count'] for r in response.json['results']] == [1] * 10
+    assert len(statements) <= 2  # user load + page
+
+
+def _conversation_with_messages(count):
+    conversation = Conversation(user=_owner(), title='Long')
+    for i in range(count):
+        db.session.add(Message(conversation=conversation, role='user', content=f'm{i}'))
+    db.session.commit()
+    return conversation
+
+
+def test_messages_are_cursor_paginated(app, auth_client):
+    """Test before/after cursors walk the history without gaps."""
+    conversation = _conversation_with_messages(5)
+    url = f'/api/conversations/{conversation.id}/messages/'
+
+    first = auth_client.get(f'{url}?limit=2').json
+    assert [m['content'] for m in first['results']] == ['m4', 'm3']
+    assert first['has_more'] is True
+
+    second = auth_client.get(f"{url}?limit=2&before={first['before']}").json
+    assert [m['content'] for m in second['results']] == ['m2', 'm1']
+
+    newer = auth_client.get(f"{url}?limit=2&after={second['after']}").json
+    assert [m['content'] for m in newer['results']] == ['m4', 'm3']
+
+
+def test_messages_ndjson_stream(app, auth_client):
+    """Test NDJSON mode streams one message per line."""
+    conversation = _conversation_with_messages(3)
+    response = auth_client.get(f'/api/conversations/{conversation.id}/messages/?format=ndjson')
+
+    assert response.content_type == 'application/x-ndjson'
+    lines = response.get_data(as_text=True).splitlines()
+    assert [json.loads(line)['content'] for line in lines] == ['m2', 'm1', 'm0']
+
+
+def test_send_message_turn_cost(app, auth_client, llm):
+    """Test a turn titles and touches the conversation with two commits."""
+    created = auth_client.post('/api/conversations/', json={}).json
+
+    response = auth_client.post(
+        f"/api/conversations/{created['id']}/messages/", json={'content': 'What is an atom?'}
+    )
+
+    assert response.status_code == 201
+    assert response.json['assistant_message']['content'] == 'Hello from the stub'
+    assert response.headers['X-DB-Commits'] == '2'
+    conversation = db.session.get(Conversation, created['id'])
+    assert conversation.title == 'What is an atom?'
+    assert conversation.message_count == 2
+    assert conversation.updated_at.isoformat() > created['updated_at']
+
+
+def test_no_connection_held_during_generation(app, auth_client, llm):
+    """Test pooled connections are released while the LLM generates."""
+    import time
+
+    reply = llm.chat
+
+    def slow_chat(*args, **kwargs):
+        time.sleep(0.2)
+        return reply(*args, **kwargs)
+
+    llm.chat = slow_chat
+    created = auth_client.post('/api/conversations/', json={}).json
+    auth_client.post(f"/api/conversations/{created['id']}/messages/", json={'content': 'Hi'})
+
+    from flask import g
+    assert g._db_stats.checkouts >= 1
+    assert g._db_stats.max_held < 0.2
@@ -0,0 +1,136 @@
+"""Deferred post-response work tests."""
+import threading
+import time
+
+from flask import current_app
+
+from app.extensions import db
+from app.models import Conversation, Message
+from app.services import DeferredExecutor, Turn, deferred, save_summary, summarize_turn
+from app.services.deferred import deferred_tasks
+
+
+def _executor(app, **overrides):
+    app.config.update({'DEFERRED_WORKERS': 2, 'DEFERRED_RETRY_DELAY': 0, **overrides})
+    executor = DeferredExecutor()
+    executor.init_app(app)
+    return executor
+
+
+def test_tasks_run_with_app_context_and_are_retried(app):
+    """Test tasks get an app context, failures are retried and close drains."""
+    executor = _executor(app, DEFERRED_MAX_RETRIES=2)
+    seen = []
+    attempts = []
+
+    def record(value):
+        seen.append((value, current_app.name))
+
+    def flaky():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise RuntimeError('transient')
+
+    for i in range(5):
+        assert executor.submit(record, i)
+    executor.submit(flaky)
+    executor.close(timeout=5)
+
+    assert sorted(v for v, _ in seen) == [0, 1, 2, 3, 4]
+    assert {name for _, name in seen} == {app.name}
+    assert len(attempts) == 3
+    assert deferred_tasks.labels(task=flaky.__qualname__, outcome='retried').value == 1
+    assert not executor.submit(record, 'late')
+
+
+def test_full_queue_drops_tasks(app):
+    """Test submissions beyond DEFERRED_MAX_QUEUE are rejected, not blocked on."""
+    executor = _executor(app, DEFERRED_WORKERS=1, DEFERRED_MAX_QUEUE=1)
+    release = threading.Event()
+    started = threading.Event()
+
+    def block():
+        started.set()
+        release.wait(5)
+
+    assert executor.submit(block)
+    started.wait(5)
+    assert executor.submit(block)  # waits in the queue
+    assert not executor.submit(block)
+    release.set()
+    executor.close(timeout=5)
+
+
+def test_close_with_a_full_queue_respects_the_deadline(app):
+    """Test shutdown does not block on a full queue and drops what is left."""
+    executor = _executor(app, DEFERRED_WORKERS=1, DEFERRED_MAX_QUEUE=1)
+    release = threading.Event()
+    started = threading.Event()
+
+    def block():
+        started.set()
+        release.wait(5)
+
+    def leftover():
+        pass
+
+    dropped = deferred_tasks.labels(task=leftover.__qualname__, outcome='dropped').value
+    assert executor.submit(block)
+    started.wait(5)
+    assert executor.submit(leftover)
+
+    begun = time.monotonic()
+    executor.close(timeout=0.1)
+    assert time.monotonic() - begun < 1
+    assert deferred_tasks.labels(task=leftover.__qualname__, outcome='dropped').value == dropped + 1
+    release.set()
+
+
+def test_send_message_summarizes_after_the_response(app, auth_client, llm):
+    """Test overflow is summarized outside the request's transaction count."""
+    app.config['CONTEXT_TOKEN_BUDGET'] = 100
+    created = auth_client.post('/api/conversations/', json={}).json
+    for i in range(30):
+        role = 'user' if i % 2 == 0 else 'assistant'
+        db.session.add(Message(conversation_id=created['id'], role=role, content=f'turn {i} ' + 'x' * 40))
+    db.session.commit()
+
+    response = auth_client.post(f"/api/conversations/{created['id']}/messages/", json={'content': 'Hi'})
+
+    assert response.status_code == 201
+    assert response.headers['X-DB-Commits'] == '2'
+    assert llm.calls == 2
+    conversation = db.session.get(Conversation, created['id'], populate_existing=True)
+    assert conversation.summary == llm.reply
+    stale = Turn(conversation_id=created['id'], user_message={}, llm_messages=[], overflow_last_id=1)
+    assert not save_summary(stale, 'older summary')
+
+
+def test_streamed_reply_defers_the_summary_and_retries_provider_errors(app, auth_client, llm, monkeypatch):
+    """Test the stream path summarizes after done and a failing summary is retried."""
+    app.config['CONTEXT_TOKEN_BUDGET'] = 100
+    monkeypatch.setattr(deferred, 'retry_delay', 0)
+    created = auth_client.post('/api/conversations/', json={}).json
+    for i in range(30):
+        role = 'user' if i % 2 == 0 else 'assistant'
+        db.session.add(Message(conversation_id=created['id'], role=role, content=f'turn {i} ' + 'x' * 40))
+    db.session.commit()
+
+    chat, attempts = llm.chat, []
+
+    def flaky_chat(*args, **kwargs):
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise RuntimeError('provider unavailable')
+        return chat(*args, **kwargs)
+
+    llm.chat = flaky_chat
+    retried = deferred_tasks.labels(task=summarize_turn.__qualname__, outcome='retried').value
+    response = auth_client.post(f"/api/conversations/{created['id']}/messages/stream/", json={'content': 'Hi'})
+
+    body = response.get_data(as_text=True)
+    assert body.index('event: assistant_message') < body.index('event: done')
+    assert len(attempts) == 2
+    assert deferred_tasks.labels(task=summarize_turn.__qualname__, outcome='retried').value == retried + 1
+    conversation = db.session.get(Conversation, created['id'], populate_existing=True)
+    assert conversation.summary == llm.reply
@@ -0,0 +1,148 @@
+"""Failover and hedging provider tests."""
+import threading
+import time
+
+import pytest
+
+from app.services import (
+    CancelToken,
+    FailoverProvider,
+    ProvidersExhausted,
+    ProviderSlot,
+    get_llm_provider,
+    llm_scheduler,
+    provider_registry,
+)
+from app.services.failover import failovers, hedge_wins
+from app.services.llm_providers import llm_first_token
+from tests.conftest import StubProvider
+
+MESSAGES = [{'role': 'user', 'content': 'Hi'}]
+
+
+class SlowProvider(StubProvider):
+    """Waits ``delay`` seconds (or until cancelled) before the first token."""
+
+    def __init__(self, reply, delay):
+        super().__init__(reply)
+        self.delay = delay
+        self.cancelled = threading.Event()
+
+    def chat_stream(self, messages, temperature=0.7, max_tokens=500, images=None, cancel=None):
+        self.calls += 1
+        if cancel is not None:
+            cancel.on_cancel(self.cancelled.set)
+        if self.cancelled.wait(self.delay):
+            return
+        yield self.reply
+
+
+class FailingProvider(StubProvider):
+    def chat_stream(self, messages, temperature=0.7, max_tokens=500, images=None, cancel=None):
+        self.calls += 1
+        raise ConnectionError('node down')
+        yield
+
+
+def test_fails_over_on_error_and_on_first_token_timeout(app):
+    """Test errors and slow first tokens move on to the next provider."""
+    broken = FailingProvider()
+    stuck = SlowProvider('late', delay=5)
+    backup = StubProvider('from backup')
+    errors = failovers.labels(provider='broken', reason='error').value
+    provider = FailoverProvider([
+        ProviderSlot('broken', broken, timeout=1),
+        ProviderSlot('stuck', stuck, timeout=0.05),
+        ProviderSlot('backup', backup, timeout=1),
+    ])
+
+    started = time.monotonic()
+    assert provider.chat(MESSAGES) == 'from backup '
+    assert time.monotonic() - started < 1
+    assert stuck.cancelled.is_set()
+    assert failovers.labels(provider='broken', reason='error').value == errors + 1
+    assert failovers.labels(provider='stuck', reason='timeout').value >= 1
+
+    with pytest.raises(ProvidersExhausted):
+        FailoverProvider([ProviderSlot('broken', broken, timeout=1)]).chat(MESSAGES)
+
+
+def test_hedge_beats_slow_primary_and_cancels_it(app):
+    """Test a hedge is sent past the first-token quantile and the loser is cancelled."""
+    class HedgePrimary(SlowProvider):
+        pass
+
+    for _ in range(5):
+        llm_first_token.labels(provider='HedgePrimary').observe(0.05)
+    primary = HedgePrimary('slow answer', delay=2)
+    secondary = StubProvider('fast answer')
+    wins = hedge_wins.labels(provider='hedge-secondary').value
+    provider = FailoverProvider(
+        [ProviderSlot('hedge-primary', primary, timeout=5), ProviderSlot('hedge-secondary', secondary, timeout=5)],
+        hedge_quantile=0.9,
+        hedge_min_samples=5,
+        hedge_min_delay=0.01,
+    )
+    assert provider.hedge_delay(provider.slots[0]) == 0.1
+
+    started = time.monotonic()
+    assert ''.join(provider.chat_stream(MESSAGES)) == 'fast answer '
+    assert time.monotonic() - started < 1
+    assert primary.cancelled.wait(1)
+    assert hedge_wins.labels(provider='hedge-secondary').value == wins + 1
+
+
+def test_caller_cancel_stops_the_winning_stream(app):
+    """Test the caller's token cancels the provider that is streaming."""
+    llm = StubProvider(' '.join(['palavra'] * 100))
+    provider = FailoverProvider([ProviderSlot('stub', llm, timeout=1)])
+    token = CancelToken()
+    stream = provider.chat_stream(MESSAGES, cancel=token)
+    assert next(stream) == 'palavra '
+    token.cancel('stop')
+    assert list(stream) == []
+
+
+def test_registry_builds_failover_chain_from_config(app):
+    """Test LLM_PROVIDERS makes the default provider a failover chain."""
+    app.config.update(LLM_PROVIDERS='primary:3,secondary', LLM_PROVIDER_TIMEOUT=7)
+    provider_registry.init_app(app)
+    provider_registry.register('primary', FailingProvider())
+    provider_registry.register('secondary', StubProvider('ok'))
+    try:
+        llm = get_llm_provider()
+        assert [(s.name, s.timeout) for s in llm.slots] == [('primary', 3.0), ('secondary', 7.0)]
+        assert llm.chat(MESSAGES) == 'ok '
+    finally:
+        app.config['LLM_PROVIDERS'] = ''
+        provider_registry.init_app(app)
+        provider_registry.close()
+
+
+def test_failover_attempts_take_their_providers_slots(app):
+    """Test per-provider caps apply to the members of an LLM_PROVIDERS chain."""
+    app.config.update(
+        LLM_PROVIDERS='capped,backup', LLM_CONCURRENCY='capped:1', LLM_QUEUE_TIMEOUT=0.05
+    )
+    provider_registry.init_app(app)
+    llm_scheduler.init_app(app)
+    capped = StubProvider('from capped')
+    provider_registry.register('capped', capped)
+    provider_registry.register('backup', StubProvider('from backup'))
+    try:
+        holder = llm_scheduler.acquire('someone else', provider='capped')
+        try:
+            assert get_llm_provider().chat(MESSAGES) == 'from backup '
+            assert capped.calls == 0
+        finally:
+            holder.release()
+
+        assert get_llm_provider().chat(MESSAGES) == 'from capped '
+        stats = llm_scheduler.stats()
+        assert stats['capped']['limit'] == 1 and stats['capped']['active'] == 0
+        assert stats['backup']['active'] == 0
+    finally:
+        app.config.update(LLM_PROVIDERS='', LLM_CONCURRENCY='')
+        provider_registry.init_app(app)
+        llm_scheduler.init_app(app)
+        provider_registry.close()
@@ -1,4 +1,10 @@
 """Health endpoint tests."""
+import time
+from types import SimpleNamespace
+
+from app.services import CancelToken, admission, llm_scheduler, stream_jobs
+from app.services import scheduler as scheduler_module
+from app.services.admission import shed_requests
 
 
 def test_health_endpoint(client):
@@ -6,3 +12,61 @@ def test_health_endpoint(client):
     response = client.get('/api/health/')
     assert response.status_code == 200
     assert response.json['status'] == 'ok'
+
+
+def test_readiness_reports_worker_load(app, client):
+    """Test readiness returns the load report and is cached between probes."""
+    response = client.get('/api/health/ready/')
+    assert response.status_code == 200
+    report = response.get_json()
+    assert report['status'] == 'ready'
+    assert report['inflight'] == 1
+    assert set(report) >= {'streams', 'db_pool', 'llm', 'llm_latency'}
+
+    admission.max_streams = 1
+    stream_jobs._tokens['busy'] = CancelToken()
+    try:
+        assert client.get('/api/health/ready/').status_code == 200  # cached
+        admission._report = None
+        response = client.get('/api/health/ready/')
+        assert response.status_code == 503
+        assert response.get_json()['reasons'] == ['streams']
+        assert client.get('/api/health/').status_code == 200
+    finally:
+        stream_jobs._tokens.pop('busy')
+
+
+def test_saturated_worker_sheds_message_requests(app, auth_client, llm):
+    """Test message requests get 503 past a threshold while other routes still work."""
+    conversation_id = auth_client.post('/api/conversations/', json={}).get_json()['id']
+    url = f'/api/conversations/{conversation_id}/messages/'
+    shed = shed_requests.labels(reason='inflight').value
+
+    admission.max_inflight = 1
+    admission._inflight += 1  # another request in flight
+    try:
+        response = auth_client.post(url, json={'content': 'Hi'})
+        assert response.status_code == 503
+        assert response.headers['Retry-After'] == str(app.config['ADMISSION_RETRY_AFTER'])
+        assert response.get_json()['reasons'] == ['inflight']
+        assert shed_requests.labels(reason='inflight').value == shed + 1
+        assert auth_client.get(url).status_code == 200
+    finally:
+        admission._inflight -= 1
+
+    assert auth_client.post(url, json={'content': 'Hi'}).status_code == 201
+    assert admission.inflight == 0
+
+
+def test_llm_latency_counts_calls_still_running(app, monkeypatch):
+    """Test a hanging LLM call raises the estimate before it completes."""
+    ticket = llm_scheduler.acquire('someone', provider='hanging')
+    try:
+        assert admission.llm_latency() < admission.max_llm_latency
+        later = time.monotonic() + 120
+        monkeypatch.setattr(scheduler_module, 'time', SimpleNamespace(monotonic=lambda: later))
+        assert llm_scheduler.stats()['hanging']['inflight_hold'] >= 120
+        assert 'llm_latency' in admission.saturation(pool={'utilization': 0.0})
+    finally:
+        monkeypatch.undo()
+        ticket.release()
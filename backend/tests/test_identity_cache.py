@@ -0,0 +1,57 @@
+"""Identity cache tests."""
+from sqlalchemy import event
+
+from app.extensions import db
+from app.models import User
+from app.services import identity_cache
+from app.services.identity_cache import identity_lookups
+
+
+def _count_queries(fn):
+    statements = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', count)
+    try:
+        result = fn()
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', count)
+    return result, len(statements)
+
+
+def _user():
+    user = User(username='cached', email='cached@test.com')
+    user.set_password('x')
+    db.session.add(user)
+    db.session.commit()
+    return user.id
+
+
+def test_cached_user_needs_no_query(app):
+    """Test a second load is served without touching the users table."""
+    user_id = _user()
+    hits = identity_lookups.labels(result='hit').value
+    identity_cache.load(user_id)
+    db.session.remove()
+
+    user, queries = _count_queries(lambda: identity_cache.load(user_id))
+
+    assert user.username == 'cached'
+    assert queries == 0
+    assert identity_lookups.labels(result='hit').value == hits + 1
+    assert user.check_password('x')  # password hash is loaded on demand
+
+
+def test_deactivation_invalidates(app):
+    """Test updating a user drops the cached identity immediately."""
+    user_id = _user()
+    identity_cache.load(user_id)
+
+    user = db.session.get(User, user_id)
+    user.is_active = False
+    db.session.commit()
+    db.session.remove()
+
+    assert identity_cache.load(user_id) is None
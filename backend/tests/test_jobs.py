@@ -0,0 +1,179 @@
+"""Queued generation job tests."""
+import json
+import threading
+import time
+
+import pytest
+
+from app import create_app
+from app.config import TestingConfig
+from app.extensions import db
+from app.models import GenerationJob, Message
+from app.services import generation_queue
+from app.services.generation_queue import ThreadExecutor, run_generation
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    """Test application on a file database: jobs write from other threads."""
+    monkeypatch.setattr(TestingConfig, 'SQLALCHEMY_DATABASE_URI', f"sqlite:///{tmp_path / 'jobs.sqlite3'}")
+    app = create_app('testing')
+    with app.app_context():
+        db.create_all()
+        yield app
+        generation_queue.close()
+        db.drop_all()
+
+
+def _wait_finished(client, job_id, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while True:
+        job = client.get(f'/api/jobs/{job_id}/').json
+        if job['status'] in GenerationJob.FINAL_STATUSES:
+            return job
+        assert time.monotonic() < deadline, 'job did not finish'
+        time.sleep(0.02)
+
+
+def _send_async(client, conversation_id, content='Hi'):
+    response = client.post(
+        f'/api/conversations/{conversation_id}/messages/',
+        json={'content': content},
+        headers={'Prefer': 'respond-async'}
+    )
+    assert response.status_code == 202
+    assert response.headers['Location'].endswith(f"/api/jobs/{response.json['job']['id']}/")
+    return response.json
+
+
+def test_prefer_respond_async_queues_generation_on_thread_pool(app, auth_client, llm):
+    """Test 202 with a job id, then the reply is available by polling."""
+    conversation = auth_client.post('/api/conversations/', json={}).json
+    data = _send_async(auth_client, conversation['id'])
+    assert data['user_message']['content'] == 'Hi'
+    assert data['job']['status'] == 'queued'
+
+    job = _wait_finished(auth_client, data['job']['id'])
+    assert job['status'] == 'succeeded'
+    assert job['message']['content'] == llm.reply
+    assert Message.query.filter_by(conversation_id=conversation['id']).count() == 2
+
+
+def test_job_events_stream_until_final_status(app, auth_client, llm):
+    """Test the SSE endpoint ends with the finished job and a done event."""
+    app.config['GENERATION_POLL_INTERVAL'] = 0.01
+    conversation = auth_client.post('/api/conversations/', json={}).json
+    job_id = _send_async(auth_client, conversation['id'])['job']['id']
+
+    body = auth_client.get(f'/api/jobs/{job_id}/events/').get_data(as_text=True)
+    events = [
+        dict(line.split(': ', 1) for line in block.splitlines())
+        for block in body.strip().split('\n\n') if not block.startswith(':')
+    ]
+    assert events[-1]['event'] == 'done'
+    final = json.loads(events[-2]['data'])
+    assert final['status'] == 'succeeded' and final['message']['content'] == llm.reply
+
+
+def test_job_events_end_when_the_conversation_is_deleted(app, auth_client, llm):
+    """Test the SSE stream ends with done/deleted once the job row is gone."""
+    app.config['GENERATION_POLL_INTERVAL'] = 0.01
+    release = threading.Event()
+
+    def slow_chat(*args, **kwargs):
+        release.wait(5)
+        return llm.reply
+    llm.chat = slow_chat
+    conversation = auth_client.post('/api/conversations/', json={}).json
+    job_id = _send_async(auth_client, conversation['id'])['job']['id']
+
+    response = auth_client.get(f'/api/jobs/{job_id}/events/', buffered=False)
+    chunks = iter(response.response)
+    assert b'event: job' in next(chunks)
+    assert auth_client.delete(f"/api/conversations/{conversation['id']}/").status_code in (200, 204)
+    body = b''.join(chunks).decode()
+    release.set()
+    assert body.rstrip().endswith(f'data: {json.dumps({"status": "deleted"}, separators=(",", ":"))}')
+
+
+def test_job_deleted_before_it_runs_is_skipped(app, auth_client, llm, monkeypatch, caplog):
+    """Test the worker skips a job whose conversation was deleted while it was queued."""
+    queued = []
+    monkeypatch.setattr(generation_queue.executor, 'submit', lambda *args: queued.append(args))
+    conversation = auth_client.post('/api/conversations/', json={}).json
+    job_id = _send_async(auth_client, conversation['id'])['job']['id']
+    assert auth_client.delete(f"/api/conversations/{conversation['id']}/").status_code in (200, 204)
+    generation_queue.release()  # the reservation the monkeypatched submit never ran
+
+    with caplog.at_level('INFO', logger='app.services.generation_queue'):
+        run_generation(*queued[0])
+    assert queued[0][0] == job_id
+    assert llm.calls == 0
+    assert f'Generation job {job_id} was deleted' in caplog.text
+
+
+def test_full_queue_is_refused_before_anything_is_stored(app, auth_client, llm, monkeypatch):
+    """Test 503 with Retry-After when the thread pool's queue has no room."""
+    conversation = auth_client.post('/api/conversations/', json={}).json
+    monkeypatch.setattr(generation_queue.executor, 'reserve', lambda: False)
+    response = auth_client.post(
+        f"/api/conversations/{conversation['id']}/messages/",
+        json={'content': 'Hi'},
+        headers={'Prefer': 'respond-async'}
+    )
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == str(app.config['ADMISSION_RETRY_AFTER'])
+    assert Message.query.count() == 0 and GenerationJob.query.count() == 0
+
+
+def test_queue_reservations_are_bounded_and_given_back(app):
+    """Test the thread executor holds at most workers + queue jobs."""
+    executor = ThreadExecutor(app, max_workers=1, max_queue=1)
+    try:
+        assert executor.reserve() and executor.reserve()
+        assert not executor.reserve()
+        executor.release()
+        assert executor.reserve()
+    finally:
+        executor.close()
+
+
+def test_failed_generation_and_foreign_jobs(app, auth_client, client, llm):
+    """Test provider errors mark the job failed and other users get 404."""
+    def boom(*args, **kwargs):
+        raise RuntimeError('provider down')
+    llm.chat = boom
+    conversation = auth_client.post('/api/conversations/', json={}).json
+    job_id = _send_async(auth_client, conversation['id'])['job']['id']
+
+    job = _wait_finished(auth_client, job_id)
+    assert job['status'] == 'failed' and 'provider down' in job['error']
+    assert job['message'] is None
+
+    auth_client.post('/api/auth/logout/')
+    assert client.get(f'/api/jobs/{job_id}/').status_code in (401, 404)
+
+
+def test_celery_mode_with_in_memory_broker(app, auth_client, llm):
+    """Test the same flow through a Celery worker on the memory broker."""
+    pytest.importorskip('celery')
+    from celery.contrib.testing.worker import start_worker
+
+    app.config.update(
+        USE_CELERY=True,
+        ASYNC_GENERATION=True,
+        CELERY_BROKER_URL='memory://',
+        CELERY_RESULT_BACKEND='cache+memory://',
+    )
+    generation_queue.init_app(app)
+    conversation = auth_client.post('/api/conversations/', json={}).json
+
+    with start_worker(app.extensions['celery'], perform_ping_check=False, pool='solo'):
+        response = auth_client.post(
+            f"/api/conversations/{conversation['id']}/messages/", json={'content': 'Hi'}
+        )
+        assert response.status_code == 202
+        job = _wait_finished(auth_client, response.json['job']['id'])
+
+    assert job['status'] == 'succeeded'
+    assert job['message']['content'] == llm.reply
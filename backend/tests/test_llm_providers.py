@@ -0,0 +1,133 @@
+"""LLM provider tests."""
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+
+from app.services import (
+    CancelToken,
+    OllamaProvider,
+    ProviderRegistry,
+)
+from app.services.provider_registry import upstream_connections, upstream_requests
+
+MESSAGES = [
+    {'role': 'system', 'content': 'Be brief.'},
+    {'role': 'user', 'content': 'Hi'},
+]
+
+
+DONE = {
+    'done': True, 'total_duration': 900_000_000, 'load_duration': 1_000_000,
+    'prompt_eval_count': 12, 'prompt_eval_duration': 200_000_000,
+    'eval_count': 2, 'eval_duration': 600_000_000,
+}
+
+
+def _ollama_handler(request):
+    assert request.url.path == '/api/chat'
+    payload = json.loads(request.content)
+    if payload['stream']:
+        lines = [json.dumps({'message': {'role': 'assistant', 'content': token}, 'done': False})
+                 for token in ('Hel', 'lo')]
+        lines.append(json.dumps({'message': {'role': 'assistant', 'content': ''}, **DONE}))
+        return httpx.Response(200, text='\n'.join(lines))
+    return httpx.Response(200, json={'message': {'role': 'assistant', 'content': 'Hello'}, **DONE})
+
+
+def test_ollama_chat_payload_and_timings(monkeypatch):
+    """Test /api/chat gets the messages, keep_alive and images, and timings are kept."""
+    monkeypatch.setenv('OLLAMA_KEEP_ALIVE', '1h')
+    requests = []
+
+    def handler(request):
+        requests.append(json.loads(request.content))
+        return _ollama_handler(request)
+
+    provider = OllamaProvider(client=httpx.Client(transport=httpx.MockTransport(handler)))
+    assert provider.chat(MESSAGES, images=['aW1n']) == 'Hello'
+    assert ''.join(provider.chat_stream(MESSAGES)) == 'Hello'
+
+    payload = requests[0]
+    assert payload['keep_alive'] == '1h'
+    assert payload['messages'] == [
+        {'role': 'system', 'content': 'Be brief.'},
+        {'role': 'user', 'content': 'Hi', 'images': ['aW1n']},
+    ]
+    assert 'images' not in requests[1]['messages'][1]
+    assert provider.last_timings['prompt_eval_count'] == 12
+    assert provider.last_timings['prompt_eval_duration'] == 200_000_000
+
+
+class _OllamaStubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers['Content-Length']))
+        body = json.dumps({'message': {'role': 'assistant', 'content': 'Hello'}, **DONE}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def test_registry_reuses_provider_and_connections(monkeypatch):
+    """Test the registry builds providers once and keeps connections alive."""
+    server = ThreadingHTTPServer(('127.0.0.1', 0), _OllamaStubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setenv('OLLAMA_HOST', f'http://127.0.0.1:{server.server_port}')
+
+    registry = ProviderRegistry()
+    requests, connections = upstream_requests.labels().value, upstream_connections.labels().value
+    try:
+        provider = registry.get()
+        assert registry.get() is provider
+        assert provider.chat(MESSAGES) == 'Hello'
+        assert provider.chat(MESSAGES) == 'Hello'
+
+        stats = registry.stats()
+        assert stats['providers'] == ['ollama']
+        assert stats['requests'] == 2
+        assert stats['connections_opened'] == 1
+        assert stats['connections_reused'] == 1
+        assert upstream_requests.labels().value == requests + 2
+        assert upstream_connections.labels().value == connections + 1
+    finally:
+        registry.close()
+        server.shutdown()
+
+
+class _EndlessStream(httpx.SyncByteStream):
+    """Token stream that only ends when closed."""
+
+    def __init__(self):
+        self.closed = threading.Event()
+
+    def __iter__(self):
+        while not self.closed.is_set():
+            yield (json.dumps({'message': {'role': 'assistant', 'content': 'tok'}, 'done': False}) + '\n').encode()
+
+    def close(self):
+        self.closed.set()
+
+
+def test_ollama_stream_cancel_closes_upstream():
+    """Test cancelling a stream stops iteration and closes the response."""
+    upstream = _EndlessStream()
+    client = httpx.Client(transport=httpx.MockTransport(lambda request: httpx.Response(200, stream=upstream)))
+    provider = OllamaProvider(client=client)
+    cancel = CancelToken()
+
+    received = []
+    for chunk in provider.chat_stream(MESSAGES, cancel=cancel):
+        received.append(chunk)
+        if len(received) == 3:
+            cancel.cancel('stop')
+
+    assert received == ['tok'] * 3
+    assert upstream.closed.is_set()
@@ -0,0 +1,98 @@
+"""Metrics exposition and multi-process aggregation tests."""
+import json
+
+import httpx
+import pytest
+
+from app.services import OllamaProvider
+from app.services.llm_providers import (
+    llm_completion_tokens,
+    llm_errors,
+    llm_first_token,
+    llm_throughput,
+)
+from app.utils.metrics import MultiProcessStore, Registry, render
+
+MESSAGES = [{'role': 'user', 'content': 'Hi'}]
+
+
+def test_metrics_endpoint_exposes_requests_db_and_streams(app, auth_client, llm):
+    """Test /api/metrics/ renders route latency, DB per request and SSE gauges."""
+    conversation_id = auth_client.post('/api/conversations/', json={}).get_json()['id']
+    response = auth_client.post(f'/api/conversations/{conversation_id}/messages/stream/', json={'content': 'Hi'})
+    assert b'event: done' in response.data
+
+    response = auth_client.get('/api/metrics/')
+    assert response.status_code == 200
+    assert response.content_type.startswith('text/plain; version=0.0.4')
+    text = response.get_data(as_text=True)
+    assert '# TYPE http_request_duration_seconds histogram' in text
+    assert ('http_request_duration_seconds_count{method="POST",'
+            'endpoint="conversations.create_conversation",status="201"}') in text
+    assert 'db_queries_per_request_bucket{endpoint="conversations.send_message_stream",le="+Inf"}' in text
+    assert 'sse_streams_active{stream="reply"} 0' in text
+
+
+def test_metrics_token(app, client):
+    """Test METRICS_TOKEN protects the endpoint."""
+    app.config['METRICS_TOKEN'] = 's3cret'
+    assert client.get('/api/metrics/').status_code == 401
+    response = client.get('/api/metrics/', headers={'Authorization': 'Bearer s3cret'})
+    assert response.status_code == 200
+
+
+def _ollama(handler):
+    return OllamaProvider(client=httpx.Client(transport=httpx.MockTransport(handler)))
+
+
+def test_provider_latency_throughput_and_errors():
+    """Test provider calls record first token, tokens/s and errors by class name."""
+    def handler(request):
+        lines = [json.dumps({'message': {'content': 'palavra '}, 'done': False}) for _ in range(8)]
+        lines.append(json.dumps({'message': {'content': ''}, 'done': True}))
+        return httpx.Response(200, text='\n'.join(lines))
+
+    first_tokens = llm_first_token.labels(provider='OllamaProvider').count
+    throughput = llm_throughput.labels(provider='OllamaProvider').count
+    tokens = llm_completion_tokens.labels(provider='OllamaProvider').value
+    assert ''.join(_ollama(handler).chat_stream(MESSAGES)) == 'palavra ' * 8
+    assert llm_first_token.labels(provider='OllamaProvider').count == first_tokens + 1
+    assert llm_throughput.labels(provider='OllamaProvider').count == throughput + 1
+    assert llm_completion_tokens.labels(provider='OllamaProvider').value == tokens + 17
+
+    errors = llm_errors.labels(provider='OllamaProvider', error='HTTPStatusError').value
+    with pytest.raises(httpx.HTTPStatusError):
+        _ollama(lambda request: httpx.Response(500)).chat(MESSAGES)
+    assert llm_errors.labels(provider='OllamaProvider', error='HTTPStatusError').value == errors + 1
+
+
+def _worker_snapshot(requests, inflight, latency):
+    registry = Registry()
+    registry.counter('requests_total', 'Requests', ['route']).labels(route='a').inc(requests)
+    registry.gauge('inflight', 'In flight').set(inflight)
+    registry.gauge('healthy', 'Healthy', aggregate='min').set(1 if inflight < 5 else 0)
+    registry.histogram('latency_seconds', 'Latency', buckets=(0.1, 1.0)).observe(latency)
+    return registry.snapshot()
+
+
+def test_workers_are_aggregated_and_exited_workers_keep_counters(tmp_path):
+    """Test per-pid files are merged and child exit keeps totals monotonic."""
+    store = MultiProcessStore(str(tmp_path))
+    store.write(_worker_snapshot(3, 2, 0.05), pid=101)
+    store.write(_worker_snapshot(4, 7, 0.5), pid=102)
+
+    merged = store.collect()
+    assert merged['requests_total']['samples'] == [[['a'], 7]]
+    assert merged['inflight']['samples'] == [[[], 9]]
+    assert merged['healthy']['samples'] == [[[], 0]]
+    assert merged['latency_seconds']['samples'][0][1] == {'counts': [1, 1, 0], 'sum': 0.55, 'count': 2}
+    text = render(merged)
+    assert 'latency_seconds_bucket{le="1"} 2' in text
+    assert 'requests_total{route="a"} 7' in text
+
+    store.mark_dead(102)
+    store.write(_worker_snapshot(1, 1, 0.05), pid=103)
+    merged = store.collect()
+    assert not (tmp_path / 'metrics_102.json').exists()
+    assert merged['requests_total']['samples'] == [[['a'], 8]]
+    assert merged['inflight']['samples'] == [[[], 3]]
@@ -0,0 +1,136 @@
+"""Multi-node Ollama pool tests."""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+import pytest
+
+from app.services import OllamaPool, OllamaProvider
+
+MESSAGES = [
+    {'role': 'system', 'content': 'Be brief.'},
+    {'role': 'user', 'content': 'Hi'},
+]
+
+
+class _Node(BaseHTTPRequestHandler):
+    """Ollama stub; the server's ``delay`` slows every answer."""
+    protocol_version = 'HTTP/1.1'
+
+    def _reply(self, payload):
+        time.sleep(self.server.delay)
+        body = json.dumps(payload).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        self._reply({'version': '0.5.0'})
+
+    def do_POST(self):
+        payload = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        self.server.received.append(payload)
+        self._reply({'message': {'role': 'assistant', 'content': self.server.url}, 'done': True})
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def nodes():
+    servers = []
+    for _ in range(3):
+        server = ThreadingHTTPServer(('127.0.0.1', 0), _Node)
+        server.delay = 0
+        server.received = []
+        server.url = f'http://127.0.0.1:{server.server_port}'
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+    yield servers
+    for server in servers:
+        server.shutdown()
+
+
+def test_routes_to_least_outstanding_node(nodes):
+    """Test requests go to the node with the fewest in-flight requests."""
+    pool = OllamaPool([s.url for s in nodes], affinity=False)
+    with pool.acquire() as first, pool.acquire() as second:
+        with pool.acquire() as third:
+            assert len({first.url, second.url, third.url}) == 3
+        with pool.acquire() as again:
+            assert again is third
+    assert [n.outstanding for n in pool.nodes] == [0, 0, 0]
+
+
+def test_affinity_keeps_a_conversation_on_one_node(nodes):
+    """Test the same prompt prefix sticks to a node until it is too busy."""
+    pool = OllamaPool([s.url for s in nodes], affinity_slack=1)
+    provider = OllamaProvider(client=httpx.Client(), pool=pool)
+    answers = {provider.chat(MESSAGES + [{'role': 'user', 'content': str(i)}]) for i in range(5)}
+    assert len(answers) == 1
+
+    with pool.acquire(MESSAGES) as home, pool.acquire(MESSAGES) as busy:
+        assert busy is home
+        with pool.acquire(MESSAGES) as spill:
+            assert spill is not home
+
+
+def test_affinity_ignores_the_rolling_summary(nodes):
+    """Test a summary message inserted after the system prompt keeps the node."""
+    pool = OllamaPool([s.url for s in nodes], affinity_slack=0)
+    system, turns = MESSAGES[0], MESSAGES[1:]
+    key = pool.affinity_key(MESSAGES)
+    for refresh in range(5):
+        summary = {'role': 'system', 'content': f'Summary of the earlier conversation:\nv{refresh}'}
+        assert pool.affinity_key([system, summary] + turns) == key
+    assert pool.affinity_key([system, {'role': 'user', 'content': 'another chat'}]) != key
+
+    with pool.acquire(MESSAGES) as home:
+        pass
+    summary = {'role': 'system', 'content': 'Summary of the earlier conversation:\nnew'}
+    with pool.acquire([system, summary] + turns) as node:
+        assert node is home
+
+
+def test_probe_ejects_slow_and_down_nodes_then_readmits(nodes):
+    """Test health probes take slow or dead nodes out of rotation and back."""
+    slow, down, ok = nodes
+    pool = OllamaPool([s.url for s in nodes], affinity=False, slow_after=0.2)
+    slow.delay = 0.4
+    down.shutdown()
+    down.server_close()
+
+    with httpx.Client() as client:
+        pool.probe(client)
+        assert [n.healthy for n in pool.nodes] == [False, False, True]
+        for _ in range(3):
+            with pool.acquire() as node:
+                assert node.url == ok.url
+
+        slow.delay = 0
+        pool.probe(client)
+    assert [n.healthy for n in pool.nodes] == [True, False, True]
+
+
+def test_transport_error_ejects_node(nodes):
+    """Test a request that cannot reach its node ejects it."""
+    pool = OllamaPool([nodes[0].url, 'http://127.0.0.1:9'], affinity=False)
+    provider = OllamaProvider(client=httpx.Client(), pool=pool)
+    with pool.acquire():
+        with pytest.raises(httpx.TransportError):
+            provider.chat(MESSAGES)
+    assert not pool.nodes[1].healthy
+    assert provider.chat(MESSAGES) == nodes[0].url
+
+
+def test_warmup_loads_model_on_every_node(nodes):
+    """Test warmup sends an empty chat with keep_alive to each node."""
+    pool = OllamaPool([s.url for s in nodes])
+    with httpx.Client() as client:
+        pool.warmup(client, 'llama3.2', '30m')
+    for server in nodes:
+        assert server.received == [{'model': 'llama3.2', 'messages': [], 'keep_alive': '30m'}]
@@ -0,0 +1,102 @@
+"""Password hashing pool and login throttling tests."""
+import threading
+
+import pytest
+from werkzeug.security import generate_password_hash
+
+from app.extensions import db
+from app.models import User
+from app.services import (
+    PasswordHasher,
+    PasswordHasherBusy,
+    login_throttle,
+    password_hasher,
+)
+
+
+def _create_user(password_hash):
+    user = User(username='student', email='student@test.com', password_hash=password_hash)
+    db.session.add(user)
+    db.session.commit()
+    return user.id
+
+
+def test_login_rehashes_to_configured_method(app, client):
+    """Test a successful login upgrades a hash made with other parameters."""
+    user_id = _create_user(generate_password_hash('secret', method='pbkdf2:sha256:500'))
+
+    response = client.post('/api/auth/login/', json={'username': 'student', 'password': 'secret'})
+    assert response.status_code == 200
+
+    stored = db.session.get(User, user_id).password_hash
+    assert stored.startswith(app.config['PASSWORD_HASH_METHOD'] + '$')
+    assert not password_hasher.needs_rehash(stored)
+
+
+def test_failed_logins_are_throttled_per_user(app, client):
+    """Test repeated failures return 429 without reaching the hasher."""
+    _create_user(generate_password_hash('secret', method=app.config['PASSWORD_HASH_METHOD']))
+    for _ in range(app.config['LOGIN_THROTTLE_MAX_PER_USER']):
+        response = client.post('/api/auth/login/', json={'username': 'student', 'password': 'wrong'})
+        assert response.status_code == 401
+
+    response = client.post('/api/auth/login/', json={'username': 'student', 'password': 'secret'})
+    assert response.status_code == 429
+    assert int(response.headers['Retry-After']) > 0
+
+    login_throttle.clear_user('student')
+    response = client.post('/api/auth/login/', json={'username': 'student', 'password': 'secret'})
+    assert response.status_code == 200
+
+
+def test_ip_limit_counts_failures_for_every_username(app, client, monkeypatch):
+    """Test spraying known usernames from one IP is cut off before hashing."""
+    app.config['LOGIN_THROTTLE_MAX_PER_IP'] = 3
+    login_throttle.init_app(app)
+    method = app.config['PASSWORD_HASH_METHOD']
+    db.session.add_all([
+        User(username=f'student{i}', email=f's{i}@test.com', password_hash=generate_password_hash('secret', method=method))
+        for i in range(5)
+    ])
+    db.session.commit()
+
+    for name in ('student0', 'student1', 'ghost'):
+        response = client.post('/api/auth/login/', json={'username': name, 'password': 'typo'})
+        assert response.status_code == 401
+
+    def no_hashing(*args):
+        raise AssertionError('throttled logins must not reach the hasher')
+    monkeypatch.setattr(password_hasher, 'verify', no_hashing)
+    response = client.post('/api/auth/login/', json={'username': 'student2', 'password': 'secret'})
+    assert response.status_code == 429
+    assert int(response.headers['Retry-After']) > 0
+
+
+def test_login_returns_503_when_hash_queue_is_full(app, client):
+    """Test backpressure when every hashing slot is taken."""
+    _create_user(generate_password_hash('secret', method=app.config['PASSWORD_HASH_METHOD']))
+    password_hasher._slots = threading.BoundedSemaphore(1)
+    password_hasher.queue_timeout = 0.01
+    password_hasher._slots.acquire()
+
+    response = client.post('/api/auth/login/', json={'username': 'student', 'password': 'secret'})
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '1'
+
+
+def test_process_pool_verifies_and_hashes():
+    """Test hashing through a real process pool."""
+    hasher = PasswordHasher()
+    hasher.workers = 1
+    hasher.method = 'pbkdf2:sha256:1000'
+    try:
+        hashed = hasher.hash('secret')
+        assert hasher.verify(hashed, 'secret')
+        assert not hasher.verify(hashed, 'wrong')
+
+        hasher._slots.acquire()
+        hasher.queue_timeout = 0
+        with pytest.raises(PasswordHasherBusy):
+            hasher.verify(hashed, 'secret')
+    finally:
+        hasher.close()
@@ -0,0 +1,128 @@
+"""Per-user rate limit and token quota tests."""
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from app.models import Message
+from app.services import (
+    RateLimited,
+    SQLiteRateLimitBackend,
+    generation_queue,
+    llm_scheduler,
+    rate_limiter,
+)
+
+
+def _post(auth_client, conversation_id, stream=False):
+    url = f'/api/conversations/{conversation_id}/messages/{"stream/" if stream else ""}'
+    return auth_client.post(url, json={'content': 'Hi'})
+
+
+def test_message_rate_is_limited_before_anything_is_stored(app, auth_client, llm):
+    """Test requests past the burst get 429 with Retry-After and store nothing."""
+    app.config.update(RATE_LIMIT_PER_MINUTE=6, RATE_LIMIT_BURST=2)
+    rate_limiter.init_app(app)
+    conversation_id = auth_client.post('/api/conversations/', json={}).get_json()['id']
+
+    assert _post(auth_client, conversation_id).status_code == 201
+    assert _post(auth_client, conversation_id).status_code == 201
+    stored = Message.query.count()
+
+    for stream in (False, True):
+        response = _post(auth_client, conversation_id, stream=stream)
+        assert response.status_code == 429
+        assert response.get_json()['reason'] == 'rate'
+        assert 1 <= int(response.headers['Retry-After']) <= 10
+    assert Message.query.count() == stored
+
+
+def test_refused_admission_gives_the_request_back(app, auth_client, llm, monkeypatch):
+    """Test a 429 for no LLM slot or a 503 for a full queue does not use up the rate."""
+    app.config.update(
+        RATE_LIMIT_PER_MINUTE=1, RATE_LIMIT_BURST=1, LLM_CONCURRENCY_DEFAULT=1, LLM_QUEUE_TIMEOUT=0.01
+    )
+    rate_limiter.init_app(app)
+    llm_scheduler.init_app(app)
+    conversation_id = auth_client.post('/api/conversations/', json={}).get_json()['id']
+
+    holder = llm_scheduler.acquire('someone else')
+    try:
+        for stream in (False, True):
+            response = _post(auth_client, conversation_id, stream=stream)
+            assert response.status_code == 429
+            assert response.get_json()['reason'] != 'rate'
+    finally:
+        holder.release()
+
+    monkeypatch.setattr(generation_queue, 'reserve', lambda: False)
+    response = auth_client.post(
+        f'/api/conversations/{conversation_id}/messages/', json={'content': 'Hi'},
+        headers={'Prefer': 'respond-async'}
+    )
+    assert response.status_code == 503
+    assert _post(auth_client, conversation_id).status_code == 201
+
+
+def test_staff_have_their_own_limits(app):
+    """Test is_staff selects the staff limits."""
+    app.config.update(RATE_LIMIT_PER_MINUTE=60, RATE_LIMIT_BURST=1, RATE_LIMIT_STAFF_BURST=3)
+    rate_limiter.init_app(app)
+    student = SimpleNamespace(id=1, is_staff=False)
+    teacher = SimpleNamespace(id=2, is_staff=True)
+
+    rate_limiter.check(student)
+    with pytest.raises(RateLimited):
+        rate_limiter.check(student)
+    for _ in range(3):
+        rate_limiter.check(teacher)
+
+
+def test_daily_token_quota(app, auth_client, llm):
+    """Test completed turns count tokens and the quota refuses further messages."""
+    app.config.update(TOKEN_QUOTA_DAILY=1000)
+    rate_limiter.init_app(app)
+    user = SimpleNamespace(id=auth_client.get('/api/auth/me/').get_json()['id'], is_staff=False)
+    conversation_id = auth_client.post('/api/conversations/', json={}).get_json()['id']
+
+    assert _post(auth_client, conversation_id).status_code == 201
+    used = rate_limiter.usage(user)['tokens_used']
+    assert used > 0
+
+    rate_limiter.record(user.id, 1000 - used)
+    response = _post(auth_client, conversation_id)
+    assert response.status_code == 429
+    assert response.get_json()['reason'] == 'token_quota'
+    assert 0 < int(response.headers['Retry-After']) <= 86400
+
+
+def test_sqlite_backend_is_shared(tmp_path):
+    """Test two workers on one SQLite file share buckets and usage."""
+    path = tmp_path / 'limits.sqlite3'
+    first, second = SQLiteRateLimitBackend(path), SQLiteRateLimitBackend(path)
+    try:
+        assert first.take('user:1', rate=0.1, burst=1) == 0
+        assert second.take('user:1', rate=0.1, burst=1) > 0
+        first.give_back('user:1', burst=1)
+        assert second.take('user:1', rate=0.1, burst=1) == 0
+        first.add_usage(1, 40)
+        second.add_usage(1, 2)
+        used, resets_at = second.usage(1)
+        assert used == 42
+        assert time.time() < resets_at <= time.time() + 86400
+    finally:
+        first.close()
+        second.close()
+
+
+def test_check_costs_microseconds(app):
+    """Test the in-memory check stays well under a millisecond."""
+    app.config.update(RATE_LIMIT_PER_MINUTE=1e9, RATE_LIMIT_BURST=10**6)
+    rate_limiter.init_app(app)
+    user = SimpleNamespace(id=1, is_staff=False)
+    rate_limiter.record(user.id, 10)
+
+    started = time.perf_counter()
+    for _ in range(10000):
+        rate_limiter.check(user)
+    assert (time.perf_counter() - started) / 10000 < 100e-6
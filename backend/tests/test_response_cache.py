@@ -0,0 +1,105 @@
+"""LLM response cache tests."""
+import threading
+import time
+
+from app.services import (
+    MemoryCacheBackend,
+    ResponseCache,
+    SQLiteCacheBackend,
+    make_cache_key,
+)
+
+MESSAGES = [{'role': 'user', 'content': 'What is photosynthesis?'}]
+
+
+def test_cache_key_is_canonical():
+    """Test equal requests hash equally and any parameter change alters the key."""
+    key = make_cache_key('m', MESSAGES, 0.0, 500)
+    assert key == make_cache_key('m', [dict(reversed(list(MESSAGES[0].items())))], 0, 500)
+    assert key != make_cache_key('m', MESSAGES, 0.0, 400)
+    assert key != make_cache_key('other', MESSAGES, 0.0, 500)
+
+
+def test_memory_backend_lru_and_ttl():
+    """Test the memory backend evicts least recently used and expired entries."""
+    backend = MemoryCacheBackend(max_entries=2, ttl=60)
+    backend.set('a', '1')
+    backend.set('b', '2')
+    backend.get('a')
+    backend.set('c', '3')
+    assert backend.get('b') is None
+    assert backend.get('a') == '1'
+
+    expired = MemoryCacheBackend(ttl=0.01)
+    expired.set('a', '1')
+    time.sleep(0.02)
+    assert expired.get('a') is None
+
+
+def test_sqlite_backend_roundtrip(tmp_path):
+    """Test the SQLite backend is shared across instances and bounded."""
+    path = tmp_path / 'cache.sqlite3'
+    writer = SQLiteCacheBackend(path, max_entries=2)
+    writer.set('a', '1')
+    writer.set('b', '2')
+    writer.set('c', '3')
+    reader = SQLiteCacheBackend(path, max_entries=2)
+    assert reader.get('c') == '3'
+    assert len(reader) == 2
+    writer.close()
+    reader.close()
+
+
+def test_stream_replays_cached_answer(app, auth_client, llm):
+    """Test a cached answer is replayed through SSE chunk events."""
+    from app.services import response_cache
+    from app.services.response_cache import cache_lookups
+    hits, skipped = cache_lookups.labels(result='hit').value, cache_lookups.labels(result='skipped').value
+    # The default LLM_TEMPERATURE is above LLM_CACHE_MAX_TEMPERATURE
+    conversation = auth_client.post('/api/conversations/', json={}).json
+    auth_client.post(
+        f"/api/conversations/{conversation['id']}/messages/stream/", json={'content': 'Hey'}
+    ).get_data()
+    assert cache_lookups.labels(result='skipped').value == skipped + 1
+    llm.calls = 0
+
+    response_cache.max_temperature = app.config['LLM_TEMPERATURE']
+
+    conversation = auth_client.post('/api/conversations/', json={}).json
+    first = auth_client.post(
+        f"/api/conversations/{conversation['id']}/messages/stream/", json={'content': 'Hi'}
+    ).get_data(as_text=True)
+
+    other = auth_client.post('/api/conversations/', json={}).json
+    second = auth_client.post(
+        f"/api/conversations/{other['id']}/messages/stream/", json={'content': 'Hi'}
+    ).get_data(as_text=True)
+
+    assert llm.calls == 1
+    assert response_cache.hits == 1
+    assert cache_lookups.labels(result='hit').value == hits + 1
+    metrics = auth_client.get('/api/metrics/').get_data(as_text=True)
+    assert f'llm_cache_lookups_total{{result="hit"}} {hits + 1:g}' in metrics
+    assert 'event: chunk' in second
+    assert 'Hello from the stub' in second
+    assert 'event: done' in first and 'event: done' in second
+
+
+def test_hit_and_miss_counts_survive_concurrent_lookups():
+    """Test lookups from many threads are all counted."""
+    cache = ResponseCache()
+    cache.backend = MemoryCacheBackend()
+    cache.backend.set('cached', 'answer')
+
+    def lookups():
+        for _ in range(2000):
+            cache.lookup('cached')
+            cache.lookup('missing')
+
+    threads = [threading.Thread(target=lookups) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['hit_ratio']) == (16000, 16000, 0.5)
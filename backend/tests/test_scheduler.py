@@ -0,0 +1,116 @@
+"""Fair-share LLM scheduler tests."""
+import threading
+import time
+
+import pytest
+
+from app.models import Message
+from app.services import SchedulerFull, llm_scheduler, provider_registry
+from app.services.scheduler import queue_depth, rejected
+
+
+@pytest.fixture
+def scheduler(app):
+    app.config.update(LLM_CONCURRENCY='test:1', LLM_QUEUE_PER_USER=2, LLM_QUEUE_TIMEOUT=2)
+    llm_scheduler.init_app(app)
+    return llm_scheduler
+
+
+def _queue(scheduler, order, user_id, priority='default'):
+    """Queue a request that records its user id once granted."""
+    expected = scheduler._lane('test').queued + 1
+
+    def run():
+        with scheduler.acquire(user_id, priority, provider='test'):
+            order.append(user_id)
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    deadline = time.monotonic() + 2
+    while scheduler._lane('test').queued < expected and time.monotonic() < deadline:
+        time.sleep(0.005)
+    return thread
+
+
+def test_slots_go_round_robin_across_users(scheduler):
+    """Test a user with several queued requests does not starve another one."""
+    holder = scheduler.acquire('x', provider='test')
+    order = []
+    threads = [_queue(scheduler, order, user_id) for user_id in ('a', 'a', 'b')]
+    assert queue_depth.labels(provider='test', priority='default').value == 3
+
+    holder.release()
+    for thread in threads:
+        thread.join(2)
+    assert order == ['a', 'b', 'a']
+    stats = scheduler.stats()['test']
+    assert (stats['limit'], stats['active'], stats['queued']) == (1, 0, {'staff': 0, 'default': 0})
+
+
+def test_staff_are_served_first(scheduler):
+    """Test the staff class is granted before earlier default requests."""
+    holder = scheduler.acquire('x', provider='test')
+    order = []
+    threads = [
+        _queue(scheduler, order, 'student'),
+        _queue(scheduler, order, 'teacher', priority='staff'),
+    ]
+    holder.release()
+    for thread in threads:
+        thread.join(2)
+    assert order == ['teacher', 'student']
+
+
+def test_overflow_and_timeout_are_rejected(scheduler):
+    """Test a full per-user queue and a too-long wait raise SchedulerFull."""
+    scheduler.max_wait = 0.05
+    holder = scheduler.acquire('x', provider='test')
+    timeouts = rejected.labels(provider='test', reason='timeout').value
+    with pytest.raises(SchedulerFull) as info:
+        scheduler.acquire('a', provider='test')
+    assert info.value.reason == 'timeout'
+    assert info.value.retry_after >= 1
+    assert rejected.labels(provider='test', reason='timeout').value == timeouts + 1
+
+    scheduler.max_wait = 2
+    order = []
+    threads = [_queue(scheduler, order, 'a') for _ in range(2)]
+    with pytest.raises(SchedulerFull) as info:
+        scheduler.acquire('a', provider='test')
+    assert info.value.reason == 'user_queue_full'
+
+    holder.release()
+    for thread in threads:
+        thread.join(2)
+    assert order == ['a', 'a']
+
+
+def test_send_message_returns_429_before_storing_anything(app, auth_client, llm):
+    """Test a request that gets no slot is refused with Retry-After and no writes."""
+    app.config.update(LLM_CONCURRENCY_DEFAULT=1, LLM_QUEUE_TIMEOUT=0.05)
+    llm_scheduler.init_app(app)
+    conversation_id = auth_client.post('/api/conversations/', json={}).get_json()['id']
+
+    holder = llm_scheduler.acquire('someone else')
+    try:
+        response = auth_client.post(f'/api/conversations/{conversation_id}/messages/', json={'content': 'Hi'})
+        assert response.status_code == 429
+        assert int(response.headers['Retry-After']) >= 1
+        assert Message.query.count() == 0
+
+        response = auth_client.post(f'/api/conversations/{conversation_id}/messages/stream/', json={'content': 'Hi'})
+        assert response.status_code == 429
+        assert Message.query.count() == 0
+    finally:
+        holder.release()
+
+    response = auth_client.post(f'/api/conversations/{conversation_id}/messages/', json={'content': 'Hi'})
+    assert response.status_code == 201
+    assert llm_scheduler.stats()[provider_registry.default_name()]['active'] == 0
+
+    def boom(*args, **kwargs):
+        raise RuntimeError('provider down')
+    llm.chat = boom
+    response = auth_client.post(f'/api/conversations/{conversation_id}/messages/', json={'content': 'Hi'})
+    assert response.status_code == 500
+    assert llm_scheduler.stats()[provider_registry.default_name()]['active'] == 0
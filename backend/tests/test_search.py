@@ -0,0 +1,99 @@
+"""Full-text search tests."""
+import os
+
+from flask_migrate import upgrade
+from sqlalchemy import text
+
+from app import create_app
+from app.config import TestingConfig
+from app.extensions import db
+from app.models import Conversation, Message, User
+
+MIGRATIONS = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'migrations')
+
+
+def _seed(app):
+    owner = User.query.filter_by(username='testuser').first()
+    other = User(username='other', email='other@test.com')
+    other.set_password('x')
+    db.session.add(other)
+
+    photosynthesis = Conversation(user=owner, title='Biology')
+    db.session.add(Message(conversation=photosynthesis, role='user', content='Explain photosynthesis in plants'))
+    titled = Conversation(user=owner, title='Photosynthesis review')
+    unrelated = Conversation(user=owner, title='Algebra')
+    db.session.add(Message(conversation=unrelated, role='user', content='Solve x + 2 = 4'))
+    foreign = Conversation(user=other, title='Photosynthesis')
+    db.session.add_all([titled, foreign])
+    db.session.commit()
+    return photosynthesis, titled, unrelated
+
+
+def test_search_is_ranked_and_highlighted(app, auth_client):
+    """Test search returns only the user's matches, ranked with snippets."""
+    photosynthesis, titled, _ = _seed(app)
+
+    response = auth_client.get('/api/conversations/?q=photosynth')
+
+    assert response.status_code == 200
+    ids = [r['id'] for r in response.json['results']]
+    assert set(ids) == {photosynthesis.id, titled.id}
+    assert ids[0] == titled.id  # title matches rank higher
+    assert '<mark>' in response.json['results'][1]['snippet']
+    assert response.json['next_cursor'] is None
+
+
+def test_search_index_follows_writes(app, auth_client):
+    """Test new, edited and deleted messages are reflected in results."""
+    _, _, unrelated = _seed(app)
+    message = unrelated.messages.first()
+    message.content = 'Quadratic equations'
+    db.session.commit()
+    assert [r['id'] for r in auth_client.get('/api/conversations/?q=quadratic').json['results']] == [unrelated.id]
+
+    db.session.delete(message)
+    db.session.commit()
+    assert auth_client.get('/api/conversations/?q=quadratic').json['results'] == []
+
+
+def test_search_ignores_query_syntax(app, auth_client):
+    """Test FTS operators in user input do not raise."""
+    _seed(app)
+    response = auth_client.get('/api/conversations/?q="NEAR(* OR')
+    assert response.status_code == 200
+
+
+def test_snippets_are_escaped_and_pages_follow_the_cursor(app, auth_client):
+    """Test message HTML is escaped around the highlight and search pages by next_cursor."""
+    app.config['PAGE_SIZE'] = 2
+    owner = User.query.filter_by(username='testuser').first()
+    for i in range(3):
+        conversation = Conversation(user=owner, title=f'Chat {i}')
+        db.session.add(Message(conversation=conversation, role='user', content=f'<img src=x onerror=alert({i})> mitosis'))
+    db.session.commit()
+
+    first = auth_client.get('/api/conversations/?q=mitosis').json
+    assert len(first['results']) == 2
+    snippet = first['results'][0]['snippet']
+    assert '<img' not in snippet
+    assert '&lt;img' in snippet and '<mark>mitosis</mark>' in snippet
+
+    second = auth_client.get(f"/api/conversations/?q=mitosis&cursor={first['next_cursor']}").json
+    assert second['next_cursor'] is None
+    ids = [r['id'] for r in first['results'] + second['results']]
+    assert len(set(ids)) == 3
+
+
+def test_migrations_keep_every_search_trigger(tmp_path, monkeypatch):
+    """Test ``flask db upgrade`` leaves all six FTS triggers on SQLite."""
+    monkeypatch.setattr(TestingConfig, 'SQLALCHEMY_DATABASE_URI', f"sqlite:///{tmp_path / 'migrated.sqlite3'}")
+    app = create_app('testing')
+    with app.app_context():
+        upgrade(directory=MIGRATIONS)
+        triggers = {
+            row[0] for row in db.session.execute(text("SELECT name FROM sqlite_master WHERE type = 'trigger'"))
+        }
+        db.session.remove()
+    assert triggers == {
+        f'{table}_fts_{kind}' for table in ('messages', 'conversations') for kind in ('ai', 'ad', 'au')
+    }
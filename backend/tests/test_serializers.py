@@ -0,0 +1,86 @@
+"""Compiled serializer compatibility tests."""
+import json
+from datetime import datetime
+
+from flask.json.provider import DefaultJSONProvider
+
+from app.extensions import db
+from app.models import Conversation, Message, User
+from app.schemas import (
+    ConversationDetailSchema,
+    ConversationSchema,
+    MessageSchema,
+    UserSchema,
+    message_serializer,
+)
+
+
+def _sample_data(user):
+    user.first_name, user.last_name = 'Ana', 'Sá 😀'
+    titled = Conversation(user_id=user.id, title='Tópico: integrais "duplas"')
+    untitled = Conversation(user_id=user.id, title=None)
+    db.session.add_all([titled, untitled])
+    db.session.flush()
+    db.session.add_all([
+        Message(conversation_id=titled.id, role='user', content='Olá\nmundo ☃ <b>\x7f\u2028',
+                created_at=datetime(2024, 3, 1, 12, 30, 45, 123456)),
+        Message(conversation_id=titled.id, role='assistant', content='',
+                attachments=[{'name': 'ç.png', 'size': 10}, {}]),
+        Message(conversation_id=titled.id, role='assistant', content='x', attachments=None),
+    ])
+    db.session.commit()
+    return [titled, untitled]
+
+
+def _reference_body(app, payload) -> bytes:
+    """Body Flask's stdlib provider writes for ``payload`` (the pre-orjson path)."""
+    return DefaultJSONProvider(app).response(payload).get_data()
+
+
+def test_hot_endpoints_match_marshmallow_and_stdlib_byte_for_byte(app, auth_client):
+    """Test response bodies equal Schema.dump encoded by Flask's default provider."""
+    user = User.query.filter_by(username='testuser').one()
+    titled, untitled = _sample_data(user)
+
+    response = auth_client.get('/api/auth/me/')
+    assert response.data == _reference_body(app, UserSchema().dump(user))
+
+    response = auth_client.get('/api/conversations/')
+    listed = Conversation.query.order_by(Conversation.updated_at.desc(), Conversation.id.desc()).all()
+    expected = {'results': ConversationSchema(many=True).dump(listed), 'next_cursor': None}
+    assert response.data == _reference_body(app, expected)
+
+    for conversation in (titled, untitled):
+        response = auth_client.get(f'/api/conversations/{conversation.id}/')
+        assert response.data == _reference_body(app, ConversationDetailSchema().dump(conversation))
+
+    response = auth_client.get(f'/api/conversations/{titled.id}/messages/')
+    page = response.get_json()
+    messages = Message.query.order_by(Message.created_at.desc(), Message.id.desc()).all()
+    expected = {
+        'results': MessageSchema(many=True).dump(messages),
+        'before': page['before'], 'after': page['after'], 'has_more': False,
+    }
+    assert response.data == _reference_body(app, expected)
+    assert b'\\u00e7' in response.data  # escaped like the stdlib does
+
+
+def test_compiled_serializer_handles_mappings_and_missing_attributes(app):
+    """Test dict inputs and absent attributes follow marshmallow's rules."""
+    row = {'id': 1, 'role': 'user', 'content': 'hi'}
+    assert message_serializer.dump(row) == MessageSchema().dump(row)
+
+    class Partial:
+        id = '7'
+        role = b'user'
+
+    assert message_serializer.dump(Partial()) == MessageSchema().dump(Partial())
+
+
+def test_fast_json_provider_round_trips(app, client):
+    """Test jsonify output decodes to the same values as the stdlib encoder."""
+    payload = {'b': [1, 2.5, None], 'a': 'ação ☃', 'when': datetime(2024, 1, 2, 3, 4, 5)}
+    with app.test_request_context():
+        body = app.json.response(payload).get_data(as_text=True)
+    assert json.loads(body) == json.loads(json.dumps(payload, default=app.json.default))
+    assert body.index('"a"') < body.index('"b"')
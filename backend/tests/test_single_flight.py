@@ -0,0 +1,97 @@
+"""Single-flight coalescing tests."""
+import threading
+import time
+
+from app.services import CancelToken, response_cache, single_flight
+from app.services.single_flight import flight_requests
+
+MESSAGES = [{'role': 'user', 'content': 'O que é um átomo?'}]
+
+
+def _gated(llm):
+    """Make the stub block until the returned event is set."""
+    release = threading.Event()
+    chat, chat_stream = llm.chat, llm.chat_stream
+
+    def gated_chat(*args, **kwargs):
+        release.wait(5)
+        return chat(*args, **kwargs)
+
+    def gated_stream(*args, **kwargs):
+        release.wait(5)
+        yield from chat_stream(*args, **kwargs)
+
+    llm.chat, llm.chat_stream = gated_chat, gated_stream
+    return release
+
+
+def _wait_followers(mode, before, count, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while flight_requests.labels(mode=mode, role='follower').value < before + count:
+        assert time.monotonic() < deadline, 'followers did not join'
+        time.sleep(0.005)
+
+
+def test_concurrent_identical_chats_share_one_call(app, llm):
+    """Test waiters get the leader's answer and upstream is called once."""
+    release = _gated(llm)
+    followers = flight_requests.labels(mode='chat', role='follower').value
+    results = []
+
+    def ask():
+        results.append(response_cache.chat(llm, MESSAGES, temperature=0.7, max_tokens=100))
+
+    threads = [threading.Thread(target=ask) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    _wait_followers('chat', followers, 4)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert results == [llm.reply] * 5
+    assert llm.calls == 1
+
+
+def test_stream_fan_out_survives_a_cancelled_subscriber(app, llm):
+    """Test each subscriber gets every chunk and one leaving keeps the upstream."""
+    llm.reply = ' '.join(f'w{i}' for i in range(50))
+    release = _gated(llm)
+    followers = flight_requests.labels(mode='stream', role='follower').value
+    first_token = CancelToken()
+    first = response_cache.chat_stream(llm, MESSAGES, temperature=0.7, max_tokens=100, cancel=first_token)
+    second = response_cache.chat_stream(llm, MESSAGES, temperature=0.7, max_tokens=100)
+    results = {}
+
+    def read_first():
+        results['first'] = [next(first)]
+        first_token.cancel('stopped')
+        results['first'] += list(first)
+
+    reader = threading.Thread(target=read_first)
+    reader.start()
+    collector = threading.Thread(target=lambda: results.setdefault('second', list(second)))
+    collector.start()
+    _wait_followers('stream', followers, 1)
+    release.set()
+    reader.join(5)
+    collector.join(5)
+
+    assert results['first'] == ['w0 ']
+    assert ''.join(results['second']) == llm.reply + ' '
+    assert llm.calls == 1
+
+
+def test_abandoned_flight_cancels_upstream_and_is_not_reused(app, llm):
+    """Test the shared stream stops when its last subscriber leaves."""
+    llm.reply = ' '.join(['x'] * 1000)
+    token = CancelToken()
+    stream = response_cache.chat_stream(llm, MESSAGES, temperature=0.7, max_tokens=100, cancel=token)
+    next(stream)
+    token.cancel('gone')
+    assert list(stream) == []
+    assert not single_flight._streams
+
+    assert ''.join(response_cache.chat_stream(llm, MESSAGES, temperature=0.7, max_tokens=100)) == llm.reply + ' '
+    assert llm.calls == 2
+
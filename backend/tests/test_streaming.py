@@ -0,0 +1,178 @@
+"""SSE chunk coalescing and resumable stream tests."""
+import json
+import time
+
+import pytest
+
+from app.models import Message
+from app.services import (
+    ChunkCoalescer,
+    JobConflict,
+    MemoryStreamBackend,
+    SQLiteStreamBackend,
+    rate_limiter,
+    stream_jobs,
+)
+from app.services.stream_jobs import tokens_saved
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def _timed(clock, chunks):
+    for delay, chunk in chunks:
+        clock.now += delay
+        yield chunk
+
+
+def test_first_chunk_is_sent_immediately_then_coalesced_by_window():
+    """Test TTFB is not delayed and later chunks are merged per window."""
+    clock = FakeClock()
+    stream = ChunkCoalescer(max_bytes=1000, max_delay=0.015, started_at=0.0, clock=clock)
+    chunks = [(0.2, 'Olá'), (0.01, ' mu'), (0.01, 'ndo'), (0.01, ','), (0.01, ' tudo'), (0.01, ' bem?')]
+
+    frames = list(stream.feed(_timed(clock, chunks)))
+
+    assert frames == ['Olá', ' mundo,', ' tudo bem?']
+    assert stream.text == 'Olá mundo, tudo bem?'
+    assert stream.ttfb == 0.2
+    assert (stream.chunks_in, stream.frames_out) == (6, 3)
+
+
+def test_size_limit_flushes_and_zero_window_passes_through():
+    """Test byte-size flushing and the pass-through setting."""
+    clock = FakeClock()
+    sized = ChunkCoalescer(max_bytes=4, max_delay=10, clock=clock)
+    assert list(sized.feed(['a', 'b', 'c', 'dé', 'f'])) == ['a', 'bcdé', 'f']
+
+    passthrough = ChunkCoalescer(max_bytes=4, max_delay=0, clock=clock)
+    assert list(passthrough.feed(['a', '', 'b'])) == ['a', 'b']
+
+
+def _events(body):
+    """Parse an SSE body into (id, event, data) tuples."""
+    events = []
+    for block in body.strip().split('\n\n'):
+        fields = dict(line.split(': ', 1) for line in block.splitlines() if not line.startswith(':'))
+        if fields:
+            events.append((int(fields['id']), fields['event'], json.loads(fields['data'])))
+    return events
+
+
+def test_stream_resumes_from_last_event_id(app, auth_client, llm):
+    """Test a reconnect replays only the events after Last-Event-ID."""
+    conversation = auth_client.post('/api/conversations/', json={}).json
+    url = f"/api/conversations/{conversation['id']}/messages/stream/"
+
+    first = _events(auth_client.post(url, json={'content': 'Hi'}).get_data(as_text=True))
+    assert [e[1] for e in first][0] == 'user_message'
+    assert [e[1] for e in first][-2:] == ['assistant_message', 'done']
+
+    resumed = _events(auth_client.get(url, headers={'Last-Event-ID': '2'}).get_data(as_text=True))
+    assert resumed == [e for e in first if e[0] > 2]
+    assert llm.calls == 1
+
+
+def test_attach_requires_a_job_and_post_conflicts_with_running_job(app, auth_client, llm):
+    """Test 404 without a job and 409 while one is running, without using up the rate."""
+    app.config.update(RATE_LIMIT_PER_MINUTE=1, RATE_LIMIT_BURST=1)
+    rate_limiter.init_app(app)
+    conversation = auth_client.post('/api/conversations/', json={}).json
+    url = f"/api/conversations/{conversation['id']}/messages/stream/"
+    assert auth_client.get(url).status_code == 404
+
+    job_id = stream_jobs.reserve(conversation['id'], 1)
+    for _ in range(2):
+        response = auth_client.post(url, json={'content': 'Hi'})
+        assert response.status_code == 409
+        assert response.json['job_id'] == job_id
+    stream_jobs.backend.finish(job_id)
+
+    response = auth_client.post(url, json={'content': 'Hi'})
+    assert response.status_code == 200
+    assert b'event: done' in response.data
+
+
+@pytest.mark.parametrize('kind', ['memory', 'sqlite'])
+def test_evicted_events_are_replaced_by_a_snapshot(tmp_path, kind):
+    """Test a reader behind the bounded buffer gets the evicted text first."""
+    if kind == 'memory':
+        backend = MemoryStreamBackend(buffer_size=3)
+    else:
+        backend = SQLiteStreamBackend(tmp_path / 'jobs.sqlite3', buffer_size=3)
+    backend.create('job', conversation_id=1, user_id=1)
+    with pytest.raises(JobConflict):
+        backend.create('other', conversation_id=1, user_id=1)
+
+    backend.publish('job', 'user_message', {'content': 'q'})
+    for word in ['a', 'b', 'c', 'd', 'e']:
+        backend.publish('job', 'chunk', {'content': word})
+    backend.finish('job')
+
+    result = backend.read('job', 0, timeout=0)
+    assert result.done
+    assert result.snapshot.id == 3 and result.snapshot.data == {'content': 'ab'}
+    assert [e.data['content'] for e in result.events] == ['c', 'd', 'e']
+    assert backend.read('job', 5, timeout=0).snapshot is None
+    backend.close()
+
+
+def _slow(chat_stream, delay=0.005):
+    def slow_stream(*args, **kwargs):
+        for chunk in chat_stream(*args, **kwargs):
+            time.sleep(delay)
+            yield chunk
+    return slow_stream
+
+
+def _wait_done(job_id, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not stream_jobs.backend.info(job_id).done:
+        assert time.monotonic() < deadline, 'job did not finish'
+        time.sleep(0.01)
+
+
+def test_disconnect_cancels_generation_and_keeps_truncated_reply(app, auth_client, llm):
+    """Test closing the last reader stops upstream and stores the partial text."""
+    app.config['SSE_COALESCE_WINDOW'] = 0
+    stream_jobs.cancel_grace = 0
+    llm.reply = ' '.join(['palavra'] * 400)
+    llm.chat_stream = _slow(llm.chat_stream)
+    saved = tokens_saved.labels(provider='StubProvider').value
+    conversation = auth_client.post('/api/conversations/', json={}).json
+
+    response = auth_client.post(
+        f"/api/conversations/{conversation['id']}/messages/stream/", json={'content': 'Hi'}, buffered=False
+    )
+    job_id = response.headers['X-Stream-Job']
+    body = iter(response.response)
+    assert b'user_message' in next(body)
+    assert b'chunk' in next(body)
+    response.close()
+    _wait_done(job_id)
+
+    message = Message.query.filter_by(conversation_id=conversation['id'], role='assistant').one()
+    assert message.is_truncated
+    assert 0 < len(message.content) < len(llm.reply)
+    assert tokens_saved.labels(provider='StubProvider').value > saved
+
+
+def test_stop_endpoint_cancels_running_job(app, auth_client, llm):
+    """Test DELETE stops the job that is generating for the conversation."""
+    conversation = auth_client.post('/api/conversations/', json={}).json
+    url = f"/api/conversations/{conversation['id']}/messages/stream/"
+    assert auth_client.delete(url).status_code == 404
+
+    llm.chat_stream = _slow(llm.chat_stream, delay=0.05)
+    response = auth_client.post(url, json={'content': 'Hi'}, buffered=False)
+    job_id = response.headers['X-Stream-Job']
+
+    assert auth_client.delete(url).status_code == 202
+    events = _events(response.get_data(as_text=True))
+    assert events[-1][1:] == ('done', {'status': 'cancelled'})
+    assert stream_jobs.backend.info(job_id).done
@@ -16,6 +16,8 @@ export default function ChatPage() {
   const [inputValue, setInputValue] = useState('')
   const [sending, setSending] = useState(false)
   const [loadingConversations, setLoadingConversations] = useState(true)
+  const [nextCursor, setNextCursor] = useState<string | null>(null)
+  const [loadingMore, setLoadingMore] = useState(false)
   const [streamingContent, setStreamingContent] = useState('')
   const [searchQuery, setSearchQuery] = useState('')
   const messagesEndRef = useRef<HTMLDivElement>(null)
@@ -38,8 +40,9 @@ export default function ChatPage() {
 
   const loadConversations = async (search?: string) => {
     try {
-      const data = await conversationsApi.list(search)
-      setConversations(data)
+      const page = await conversationsApi.list(search)
+      setConversations(page.results)
+      setNextCursor(page.next_cursor)
     } catch (error) {
       console.error('Failed to load conversations:', error)
     } finally {
@@ -47,6 +50,23 @@ export default function ChatPage() {
     }
   }
 
+  const loadMoreConversations = async () => {
+    if (!nextCursor || loadingMore) return
+    setLoadingMore(true)
+    try {
+      const page = await conversationsApi.list(searchQuery || undefined, nextCursor)
+      setConversations(prev => [
+        ...prev,
+        ...page.results.filter(conv => !prev.some(c => c.id === conv.id)),
+      ])
+      setNextCursor(page.next_cursor)
+    } catch (error) {
+      console.error('Failed to load more conversations:', error)
+    } finally {
+      setLoadingMore(false)
+    }
+  }
+
   // Debounced search
   useEffect(() => {
     const timer = setTimeout(() => {
@@ -111,6 +131,9 @@ export default function ChatPage() {
           onChunk: (chunk) => {
             setStreamingContent(prev => prev + chunk)
           },
+          onSnapshot: (content) => {
+            setStreamingContent(content)
+          },
           onAssistantMessage: (assistantMsg) => {
             setStreamingContent('')
             setMessages(prev => {
@@ -262,6 +285,15 @@ export default function ChatPage() {
                     </div>
                   </div>
                 ))}
+                {nextCursor && (
+                  <button
+                    onClick={loadMoreConversations}
+                    disabled={loadingMore}
+                    className="btn w-full text-xs mt-1"
+                  >
+                    {loadingMore ? 'LOADING...' : 'LOAD MORE'}
+                  </button>
+                )}
               </div>
             )}
           </div>
@@ -106,6 +106,7 @@ export interface Message {
   role: 'user' | 'assistant' | 'system';
   content: string;
   created_at: string;
+  is_truncated?: boolean;
   citations?: Array<{
     document_title: string;
     chunk_content: string;
@@ -124,6 +125,11 @@ export interface Conversation {
   messages?: Message[];
 }
 
+export interface ConversationPage {
+  results: Conversation[];
+  next_cursor: string | null;
+}
+
 export interface SendMessageResponse {
   user_message: Message;
   assistant_message: Message;
@@ -221,16 +227,97 @@ export interface StreamCallbacks {
   onAssistantMessage?: (message: Message) => void;
   onError?: (error: string) => void;
   onDone?: () => void;
+  /** Replaces the streamed text when the server could not replay every chunk. */
+  onSnapshot?: (content: string) => void;
 }
 
-export const conversations = {
-  async list(search?: string) {
-    let endpoint = '/api/conversations/';
-    if (search) {
-      endpoint += `?q=${encodeURIComponent(search)}`;
+interface StreamState {
+  lastEventId: number;
+  finished: boolean;
+}
+
+const STREAM_MAX_RECONNECTS = 3;
+
+async function readEventStream(
+  response: Response,
+  callbacks: StreamCallbacks,
+  state: StreamState
+): Promise<void> {
+  const reader = response.body?.getReader();
+  if (!reader) throw new Error('No response body');
+
+  const decoder = new TextDecoder();
+  let buffer = '';
+  let eventId = '';
+  let eventType = '';
+
+  while (true) {
+    const { done, value } = await reader.read();
+    if (done) break;
+
+    buffer += decoder.decode(value, { stream: true });
+
+    // Process complete SSE lines
+    const lines = buffer.split('\n');
+    buffer = lines.pop() || '';
+
+    for (const line of lines) {
+      if (line.startsWith('id: ')) {
+        eventId = line.slice(4);
+      } else if (line.startsWith('event: ')) {
+        eventType = line.slice(7);
+      } else if (line.startsWith('data: ') && eventType) {
+        try {
+          const data = JSON.parse(line.slice(6));
+
+          switch (eventType) {
+            case 'user_message':
+              callbacks.onUserMessage?.(data);
+              break;
+            case 'snapshot':
+              callbacks.onSnapshot?.(data.content);
+              break;
+            case 'chunk':
+              callbacks.onChunk?.(data.content);
+              break;
+            case 'assistant_message':
+              callbacks.onAssistantMessage?.(data);
+              break;
+            case 'error':
+              state.finished = true;
+              callbacks.onError?.(data.error);
+              break;
+            case 'done':
+              state.finished = true;
+              callbacks.onDone?.();
+              break;
+          }
+        } catch (e) {
+          console.error('Failed to parse SSE data:', e);
+        }
+        if (eventId) state.lastEventId = Number(eventId);
+
+        eventId = '';
+        eventType = '';
+      }
     }
-    const response = await apiRequest<{ results: Conversation[] }>(endpoint);
-    return response.results || [];
+  }
+}
+
+export const conversations = {
+  /**
+   * Fetch one page of conversations; pass the previous page's
+   * next_cursor to continue (null when there are no more).
+   */
+  async list(search?: string, cursor?: string | null): Promise<ConversationPage> {
+    const params = new URLSearchParams();
+    if (search) params.set('q', search);
+    if (cursor) params.set('cursor', cursor);
+    const query = params.toString();
+    const response = await apiRequest<ConversationPage>(
+      `/api/conversations/${query ? `?${query}` : ''}`
+    );
+    return { results: response.results || [], next_cursor: response.next_cursor ?? null };
   },
 
   async get(id: number) {
@@ -302,7 +389,7 @@ export const conversations = {
     const url = `${API_BASE_URL}/api/conversations/${conversationId}/messages/stream/`;
     const csrfToken = getCsrfToken();
 
-    const response = await fetch(url, {
+    let response = await fetch(url, {
       method: 'POST',
       credentials: 'include',
       headers: {
@@ -312,70 +399,36 @@ export const conversations = {
       body: JSON.stringify({ content }),
     });
 
-    if (response.status === 401) {
-      throw new Error('Unauthorized');
-    }
-
-    if (!response.ok) {
-      const errorData = await response.json().catch(() => ({ error: 'Request failed' }));
-      throw new Error(errorData.error || `Request failed with status ${response.status}`);
-    }
+    const state: StreamState = { lastEventId: 0, finished: false };
+    for (let attempt = 0; ; attempt++) {
+      if (response.status === 401) {
+        throw new Error('Unauthorized');
+      }
 
-    const reader = response.body?.getReader();
-    if (!reader) throw new Error('No response body');
-
-    const decoder = new TextDecoder();
-    let buffer = '';
-
-    while (true) {
-      const { done, value } = await reader.read();
-      if (done) break;
-
-      buffer += decoder.decode(value, { stream: true });
-
-      // Process complete SSE events
-      const lines = buffer.split('\n');
-      buffer = lines.pop() || '';
-
-      let eventType = '';
-      let eventData = '';
-
-      for (const line of lines) {
-        if (line.startsWith('event: ')) {
-          eventType = line.slice(7);
-        } else if (line.startsWith('data: ')) {
-          eventData = line.slice(6);
-
-          if (eventType && eventData) {
-            try {
-              const data = JSON.parse(eventData);
-
-              switch (eventType) {
-                case 'user_message':
-                  callbacks.onUserMessage?.(data);
-                  break;
-                case 'chunk':
-                  callbacks.onChunk?.(data.content);
-                  break;
-                case 'assistant_message':
-                  callbacks.onAssistantMessage?.(data);
-                  break;
-                case 'error':
-                  callbacks.onError?.(data.error);
-                  break;
-                case 'done':
-                  callbacks.onDone?.();
-                  break;
-              }
-            } catch (e) {
-              console.error('Failed to parse SSE data:', e);
-            }
-          }
+      if (!response.ok) {
+        const errorData = await response.json().catch(() => ({ error: 'Request failed' }));
+        throw new Error(errorData.error || `Request failed with status ${response.status}`);
+      }
 
-          eventType = '';
-          eventData = '';
-        }
+      try {
+        await readEventStream(response, callbacks, state);
+      } catch (e) {
+        console.warn('Stream interrupted:', e);
       }
+      if (state.finished || attempt >= STREAM_MAX_RECONNECTS) break;
+
+      // The generation keeps running server-side; resume where we stopped
+      await new Promise((resolve) => setTimeout(resolve, 500 * (attempt + 1)));
+      response = await fetch(url, {
+        credentials: 'include',
+        headers: { 'Last-Event-ID': String(state.lastEventId) },
+      });
     }
   },
+
+  async stopMessageStream(conversationId: number): Promise<void> {
+    await apiRequest(`/api/conversations/${conversationId}/messages/stream/`, {
+      method: 'DELETE',
+    });
+  },
 };
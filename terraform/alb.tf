@@ -22,6 +22,9 @@ resource "aws_lb_target_group" "backend" {
   vpc_id      = aws_vpc.main.id
   target_type = "ip"
 
+  # Liveness, as the ECS container check: an unhealthy target is replaced, and
+  # a merely saturated task must keep serving (it sheds message requests with
+  # 503 itself). /api/health/ready/ is for monitoring and routing decisions only.
   health_check {
     enabled             = true
     healthy_threshold   = 2
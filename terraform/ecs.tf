@@ -51,6 +51,10 @@ resource "aws_ecs_task_definition" "main" {
         {
           name  = "CORS_ALLOWED_ORIGINS"
           value = "*"
+        },
+        {
+          name  = "METRICS_DIR"
+          value = "/tmp/chatgepeto-metrics"
         }
       ]
 